@@ -0,0 +1,98 @@
+"""Script decoding of the spys.one and proxynova pages: a check of the decoded proxies and the parse rate.
+
+Parses generated pages (see `benchmarks/synthetic.py`) whose ports (spys.one) or IPs (proxynova)
+are written by scripts, with a row of empty cells added, and exits 1 unless every proxy is decoded
+and the empty row is left to `ProxyValidationMiddleware` to drop. No network is needed:
+
+    python -m benchmarks.deobfuscate --rows 500 --runs 5
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from collections.abc import Callable
+
+from scrapy.http import HtmlResponse, Request
+
+from benchmarks.synthetic import proxy, proxynova_page, spysone_page
+from scraper.base import BaseSpider
+from scraper.deobfuscate import decode_scripts
+from scraper.items import is_valid_proxy
+from scraper.spiders.proxynova import ProxyNovaSpider
+from scraper.spiders.spysone import ProxyScrapeSpider as SpysOneSpider
+
+URL = "https://example.com/"  # the spiders parse any
+EMPTY_ROWS = {  # spider -> a row of empty cells, inserted as the first row of the page's list
+    "spysone": b"<tr class='spy1x'><td colspan='1'><font class='spy14'></font></td><td></td><td></td><td></td></tr>",
+    "proxynova": b"<tr><td align='left'></td><td align='left'></td><td></td><td></td><td></td><td></td></tr>",
+}
+SOURCES: dict[str, tuple[type[BaseSpider], Callable[[int], bytes], int]] = {  # spider -> (class, page, source)
+    "spysone": (SpysOneSpider, spysone_page, 3),
+    "proxynova": (ProxyNovaSpider, proxynova_page, 4),
+}
+# a script repeated once the variable it writes changed, it must not be answered from the first run
+REASSIGNED = (
+    b"<html><body><script>a='1'</script><script>document.write(a)</script>"
+    b"<script>a='2'</script><script>document.write(a)</script></body></html>"
+)
+
+
+def with_empty_row(name: str, body: bytes) -> bytes:
+    head, rows = body.split(b"</tr>", 1) if name == "spysone" else body.split(b"<tbody>", 1)
+    return head + (b"</tr>" if name == "spysone" else b"<tbody>") + EMPTY_ROWS[name] + rows
+
+
+def check(spider: BaseSpider, response: HtmlResponse, source: int, rows: int) -> list[str]:
+    """Return what is wrong with the proxies `spider` parses from `response`."""
+    items = list(spider.parse(response))
+    valid = {(item["ip"], item["port"]) for item in items if is_valid_proxy(item)}
+    expected = {proxy(source, i) for i in range(rows)}
+    failures = []
+    if len(items) != rows + 1:
+        failures.append(f"{spider.name}: {len(items)} items instead of {rows + 1}")
+    if valid != expected:
+        failures.append(f"{spider.name}: {len(expected - valid)} proxies missing, {len(valid - expected)} unexpected")
+    return failures
+
+
+def rate(spider: BaseSpider, response: HtmlResponse, rows: int, runs: int) -> tuple[float, float]:
+    """Return the median rows per second of decoding the scripts of `response`, and of parsing it."""
+    decodes, parses = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        decode_scripts(response)
+        decodes.append(rows / (time.perf_counter() - start))
+        start = time.perf_counter()
+        for _ in spider.parse(response):
+            pass
+        parses.append(rows / (time.perf_counter() - start))
+    return statistics.median(decodes), statistics.median(parses)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    failures = []
+    decoded, _ = decode_scripts(HtmlResponse(URL, body=REASSIGNED, encoding="utf-8"))
+    if (written := decoded.xpath("string(//body)").get()) != "12":
+        failures.append(f"reassigned variable: {written!r} written instead of '12'")
+
+    print(f"{'spider':<12}{'decode rows/s':>15}{'parse rows/s':>14}")
+    for name, (spidercls, page, source) in SOURCES.items():
+        spider = spidercls()
+        body = with_empty_row(name, page(args.rows))
+        response = HtmlResponse(URL, body=body, encoding="utf-8", request=Request(URL))
+        failures += check(spider, response, source, args.rows)
+        decode, parse = rate(spider, response, args.rows, args.runs)
+        print(f"{name:<12}{decode:>15.0f}{parse:>14.0f}")
+    if failures:
+        sys.exit("Failures:\n" + "\n".join(failures))
+    print(f"Every proxy decoded, the empty rows left to validation ({args.rows} rows per page)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Table row extraction rate: the compiled `FieldExtractor`s against the `parse_*` methods and their hooks.
+
+Parses generated pages of the table spiders (see `benchmarks/synthetic.py`) three ways, the items
+of each being compared to the compiled ones:
+
+    selector   the extraction before the paths were compiled: the `parse_*` methods of every field
+               over `get_data` and `match_data` building a `Selector` and a regex per call
+    hooks      the `parse_*` methods of every field over the cached `get_data` and `match_data`,
+               what a spider overriding one of `EXTRACTION_HOOKS` gets
+    compiled   the spider as it is, `FieldExtractor`s for the fields it does not override
+
+    python -m benchmarks.extraction --rows 500 --runs 5
+"""
+
+import argparse
+import re
+import statistics
+import sys
+import time
+from collections.abc import Callable
+from typing import Any
+
+from scrapy import Selector
+from scrapy.http import HtmlResponse, Request, TextResponse
+
+from benchmarks.synthetic import freeproxylist_page, geonode_table, proxynova_page, spysone_page
+from scraper.base import BaseSpider
+from scraper.deobfuscate import decode_scripts
+from scraper.spiders.freeproxylist import ProxyScrapeSpider as FreeProxyListSpider
+from scraper.spiders.geonode import ProxyScrapeSpider as GeonodeSpider
+from scraper.spiders.proxynova import ProxyNovaSpider
+from scraper.spiders.spysone import ProxyScrapeSpider as SpysOneSpider
+
+URL = "https://example.com/"  # the spiders parse any
+PAGES: dict[str, tuple[type[BaseSpider], Callable[[int], bytes]]] = {
+    "freeproxylist": (FreeProxyListSpider, freeproxylist_page),
+    "geonode": (GeonodeSpider, geonode_table),
+    "proxynova": (ProxyNovaSpider, proxynova_page),
+    "spysone": (SpysOneSpider, spysone_page),
+}
+
+
+class SelectorHooks:
+    """`get_data` and `match_data` as they were, a `Selector` and a regex compiled per call, eager logging."""
+
+    logger: Any
+
+    def get_data(self, row: Selector, xpath: str, many: bool = False) -> str | list[str]:
+        selector = row.xpath(xpath)
+        data: str | list[str] = selector.getall() if many else selector.get(default="")
+        self.logger.debug(f"[{xpath=}] {selector=} {data=}")
+        return data
+
+    def match_data(self, data: str, pattern: str) -> str:
+        regex = re.compile(pattern)
+        if match := regex.search(data):
+            return match.group(0)
+        return ""
+
+
+class CachedHooks:
+    """`get_data` overridden as is, the spider extracts with its `parse_*` methods."""
+
+    def get_data(self, row: Selector, xpath: str, many: bool = False) -> str | list[str]:
+        data: str | list[str] = super().get_data(row, xpath, many=many)  # type: ignore[misc]
+        return data
+
+
+def variant(spidercls: type[BaseSpider], hooks: type) -> BaseSpider:
+    return type(f"{hooks.__name__}{spidercls.__name__}", (hooks, spidercls), {})()  # type: ignore[no-any-return]
+
+
+def rate(spider: BaseSpider, response: TextResponse, runs: int) -> tuple[float, list[Any]]:
+    """Return the median rows per second of `extract_rows` over `response`, and its items."""
+    rates, items = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        items = list(spider.extract_rows(response))
+        rates.append(len(items) / (time.perf_counter() - start))
+    return statistics.median(rates), items
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("spiders", nargs="*", help=f"default: {', '.join(PAGES)}")
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'spider':<16}{'selector':>10}{'hooks':>10}{'compiled':>10}  rows/s")
+    for name in args.spiders or PAGES:
+        spidercls, page = PAGES[name]
+        response = HtmlResponse(URL, body=page(args.rows), encoding="utf-8", request=Request(URL))
+        if spidercls.deobfuscate:  # decoded once, only the extraction is timed
+            response, _ = decode_scripts(response)
+        compiled, expected = rate(spidercls(), response, args.runs)
+        rates = []
+        for hooks in (SelectorHooks, CachedHooks):
+            rows_per_second, items = rate(variant(spidercls, hooks), response, args.runs)
+            rates.append(rows_per_second)
+            if items != expected:
+                failures.append(f"{name}: the {hooks.__name__} items differ from the compiled ones")
+        print(f"{name:<16}{rates[0]:>10.0f}{rates[1]:>10.0f}{compiled:>10.0f}")
+    if failures:
+        sys.exit("Failures:\n" + "\n".join(failures))
+
+
+if __name__ == "__main__":
+    main()
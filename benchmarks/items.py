@@ -0,0 +1,115 @@
+"""Item representation: per-item memory and pipeline throughput of `ProxyRecord` against `ProxyItem`.
+
+Items are built from freshly decoded strings, as the extractors produce them, then run through
+validation, `DedupPipeline` (exact set) and the store row, and separately the JSON lines exporter. Offline:
+
+    python -m benchmarks.items --items 200000 --runs 3
+"""
+
+import argparse
+import gc
+import io
+import statistics
+import time
+import tracemalloc
+from collections.abc import Callable
+from typing import Any
+
+from scrapy import Spider
+from scrapy.exporters import JsonLinesItemExporter
+from scrapy.utils.test import get_crawler
+
+from scraper.items import ProxyItem, ProxyRecord, is_valid_proxy
+from scraper.pipelines import DedupPipeline
+from scraper.store import to_row
+
+PROTOCOLS = (b"http", b"https", b"socks4", b"socks5")
+ANONYMITIES = (b"elite", b"anonymous", b"transparent")
+COUNTRIES = (b"US", b"DE", b"BR", b"ID", b"RU", b"CN", b"FR", b"IN")
+
+
+def rows(count: int) -> list[tuple[bytes, int, bytes, bytes, bytes]]:
+    return [
+        (
+            f"{10 + i % 200}.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}".encode(),
+            1024 + i % 60000,
+            PROTOCOLS[i % 4],
+            ANONYMITIES[i % 3],
+            COUNTRIES[i % 8],
+        )
+        for i in range(count)
+    ]
+
+
+def build(item_class: Callable[..., Any], data: list[tuple[bytes, int, bytes, bytes, bytes]]) -> list[Any]:
+    # decoded per item, like extracted text, so equal values are distinct strings unless interned
+    return [
+        item_class(
+            ip=ip.decode(),
+            port=port,
+            protocol=protocol.decode(),
+            country=country.decode(),
+            anonymity=anonymity.decode(),
+            source="bench",
+        )
+        for ip, port, protocol, anonymity, country in data
+    ]
+
+
+def item_memory(item_class: Callable[..., Any], data: list[tuple[bytes, int, bytes, bytes, bytes]]) -> float:
+    """Return the bytes allocated per item to hold `data` as `item_class` items."""
+    gc.collect()
+    tracemalloc.start()
+    items = build(item_class, data)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size / len(items)
+
+
+def throughput(item_class: Callable[..., Any], data: list[tuple[bytes, int, bytes, bytes, bytes]], runs: int) -> float:
+    """Return the median items per second built, validated, deduplicated and turned into store rows."""
+    crawler = get_crawler(Spider, {"DEDUP_ENABLED": True, "DEDUP_BACKEND": "set"})
+    spider = Spider("bench")
+    rates = []
+    for _ in range(runs):
+        pipeline = DedupPipeline.from_crawler(crawler)
+        pipeline.open_spider(spider)
+        start = time.perf_counter()
+        for item in build(item_class, data):
+            if is_valid_proxy(item):
+                to_row(pipeline.process_item(item, spider), seen=1)
+        rates.append(len(data) / (time.perf_counter() - start))
+        pipeline.close_spider(spider)
+    return statistics.median(rates)
+
+
+def export_rate(item_class: Callable[..., Any], data: list[tuple[bytes, int, bytes, bytes, bytes]], runs: int) -> float:
+    """Return the median items per second written by the JSON lines feed exporter."""
+    items = build(item_class, data)
+    rates = []
+    for _ in range(runs):
+        exporter = JsonLinesItemExporter(io.BytesIO())
+        start = time.perf_counter()
+        for item in items:
+            exporter.export_item(item)
+        rates.append(len(items) / (time.perf_counter() - start))
+    return statistics.median(rates)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=200_000)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    data = rows(args.items)
+    print(f"{'item':<14}{'bytes/item':>12}{'pipeline/s':>12}{'export/s':>12}")
+    for item_class in (ProxyItem, ProxyRecord):
+        memory = item_memory(item_class, data)
+        pipeline = throughput(item_class, data, args.runs)
+        export = export_rate(item_class, data, args.runs)
+        print(f"{item_class.__name__:<14}{memory:>12.0f}{pipeline:>12.0f}{export:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Job launch benchmark: seconds from scheduling a job to its first request, cold against prewarmed.
+
+A scheduled job is spawned the way scrapyd's launcher does: cold as `python -m scrapyd.runner crawl
+<spider> ...`, or handed to an idle `python -m scraper.prewarm` process (see `PrewarmedLauncher`).
+The spider crawls a local page, so no network is needed:
+
+    python -m benchmarks.launch freeproxylist --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+FIRST_REQUESTS: dict[str, float] = {}  # path -> when it was first requested
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # noqa: N802
+        FIRST_REQUESTS.setdefault(self.path, time.perf_counter())
+        body = b"<html><body><table><tbody></tbody></table></body></html>"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+def job(spider: str, url: str) -> tuple[list[str], dict[str, str]]:
+    """Return the args and environment scrapyd spawns a job of `spider` with."""
+    args = [sys.executable, "-m", "scrapyd.runner", "crawl", spider, "-a", f"start_urls={url}"]
+    args += ["-s", "ROBOTSTXT_OBEY=False", "-s", "HTTPCACHE_ENABLED=False", "-s", "ITEM_PIPELINES={}"]
+    # what activating the project's egg sets, there is none here
+    env = {**os.environ, "SCRAPY_PROJECT": "scraper", "SCRAPY_SETTINGS_MODULE": "scraper.settings"}
+    return args, env
+
+
+def wait_first_request(path: str, process: subprocess.Popen[bytes]) -> float:
+    while path not in FIRST_REQUESTS:
+        if process.poll() is not None:
+            raise RuntimeError(f"The job exited with {process.returncode} before requesting {path}")
+        time.sleep(0.001)
+    return FIRST_REQUESTS[path]
+
+
+def run_cold(spider: str, url: str) -> float:
+    args, env = job(spider, url)
+    start = time.perf_counter()
+    process = subprocess.Popen(args, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    first = wait_first_request(urlsplit(url).path, process)
+    process.wait()
+    return first - start
+
+
+def run_prewarmed(spider: str, url: str) -> float:
+    args, env = job(spider, url)
+    worker = [sys.executable, "-m", "scraper.prewarm"]
+    process = subprocess.Popen(
+        worker, cwd=ROOT, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    assert process.stdin is not None
+    assert process.stdout is not None
+    if not process.stdout.readline().startswith(b"ready"):  # warmed up while scrapyd was idle
+        raise RuntimeError("The worker did not warm up")
+    start = time.perf_counter()
+    process.stdin.write(json.dumps({"args": args, "env": env}).encode() + b"\n")
+    process.stdin.close()
+    first = wait_first_request(urlsplit(url).path, process)
+    process.wait()
+    return first - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("spiders", nargs="+", help="spiders accepting a `start_urls` argument")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    print(f"{'spider':<16}{'cold s':>10}{'prewarmed s':>14}")
+    for spider in args.spiders:
+        results: dict[str, list[float]] = {"cold": [], "prewarmed": []}
+        for i in range(args.runs):  # alternated, so both see the same machine load
+            results["cold"].append(run_cold(spider, f"{base}/{spider}/cold/{i}"))
+            results["prewarmed"].append(run_prewarmed(spider, f"{base}/{spider}/prewarmed/{i}"))
+        cold, prewarmed = (statistics.median(results[mode]) for mode in ("cold", "prewarmed"))
+        print(f"{spider:<16}{cold:>10.3f}{prewarmed:>14.3f}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Row extraction on the event loop against `PARSE_EXECUTOR` pools: total time and loop stalls.
+
+Parses generated free-proxy-list pages offline, several at once, while a ticker on the loop stands
+for the downloads and callbacks the reactor services meanwhile. On the loop, the output is taken
+an item at a time as Scrapy's cooperator does, the rows of a page are still selected in one go:
+
+    python -m benchmarks.offload --rows 5000 --pages 8 --workers 4
+"""
+
+import argparse
+import asyncio
+import time
+
+from scrapy.http import HtmlResponse, Request
+
+from scraper.offload import ParseExecutor
+from scraper.spiders.freeproxylist import ProxyScrapeSpider as FreeProxyListSpider
+
+URL = "https://free-proxy-list.net/"
+TICK = 0.001
+
+
+def page(rows: int) -> bytes:
+    cells = "<td>{}</td><td>{}</td><td>US</td><td>United States</td><td>elite proxy</td><td>no</td><td>yes</td>"
+    trs = "".join(f"<tr>{cells.format(f'10.0.{i // 256 % 256}.{i % 256}', 1024 + i)}</tr>" for i in range(rows))
+    return f"<html><body><section id='list'><table><tbody>{trs}</tbody></table></section></body></html>".encode()
+
+
+async def ticker(stalls: list[float], stop: asyncio.Event) -> None:
+    """Record the longest the loop took to come back to a `TICK` sleep."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        stalls.append(time.perf_counter() - start - TICK)
+
+
+async def consume(spider: FreeProxyListSpider, body: bytes, executor: ParseExecutor | None) -> int:
+    response = HtmlResponse(URL, body=body, encoding="utf-8", request=Request(URL))
+    count = 0
+    if executor is None:
+        for _ in spider.parse(response):
+            count += 1
+            await asyncio.sleep(0)
+    else:
+        async for _ in executor.stream(spider, "extract_rows", response):
+            count += 1
+            await asyncio.sleep(0)
+    return count
+
+
+async def run(mode: str, body: bytes, pages: int, workers: int, chunk_size: int) -> tuple[float, float, int]:
+    """Return (seconds, longest stall, items) of parsing `pages` copies of `body` at once."""
+    spider = FreeProxyListSpider()
+    executor = None if mode == "loop" else ParseExecutor(mode, workers, chunk_size)
+    if executor is not None:  # the pool is started before the crawl's pages arrive
+        await consume(spider, page(1), executor)
+    stalls: list[float] = []
+    stop = asyncio.Event()
+    tick = asyncio.create_task(ticker(stalls, stop))
+    start = time.perf_counter()
+    counts = await asyncio.gather(*(consume(spider, body, executor) for _ in range(pages)))
+    seconds = time.perf_counter() - start
+    stop.set()
+    await tick
+    if executor is not None:
+        executor.close()
+    return seconds, max(stalls, default=0), sum(counts)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--pages", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=0, help="0 for the CPUs available")
+    parser.add_argument("--chunk-size", type=int, default=100)
+    args = parser.parse_args()
+
+    body = page(args.rows)
+    print(f"{'mode':<10}{'seconds':>10}{'max stall ms':>14}{'items':>10}")
+    for mode in ("loop", "thread", "process"):
+        seconds, stall, items = asyncio.run(run(mode, body, args.pages, args.workers, args.chunk_size))
+        print(f"{mode:<10}{seconds:>10.3f}{stall * 1000:>14.1f}{items:>10}")
+
+
+if __name__ == "__main__":
+    main()
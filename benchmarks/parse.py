@@ -0,0 +1,157 @@
+"""Offline parse benchmark: replays captured fixtures through the spider callbacks.
+
+Capture fixtures once (needs network, or a warm HTTP cache), then benchmark without network:
+
+    scrapy crawl geonode -s FIXTURES_CAPTURE_DIR=benchmarks/fixtures
+    python -m benchmarks.parse --save-baseline      # before a change
+    python -m benchmarks.parse                      # after it, exits 1 on a regression
+
+Without captured fixtures (or with `--synthetic ROWS`), generated pages of every spider are
+parsed instead, see `benchmarks/synthetic.py`, with a baseline of their own.
+
+Reports per spider the rows parsed per second, time per page, the peak memory and the memory
+blocks still allocated per page (tracemalloc), and the items and requests produced. A spider
+regresses when its rows/s drop more than `--tolerance` below the baseline, or when it produces a
+different number of items from the same fixtures.
+"""
+
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+from typing import Any
+
+from scrapy import Request, Spider
+from scrapy.spiderloader import SpiderLoader
+from scrapy.utils.project import get_project_settings
+
+from benchmarks.synthetic import load_or_generate
+from scraper.fixtures import Fixture
+
+ROOT = Path(__file__).resolve().parent.parent
+FIXTURES_DIR = ROOT / "benchmarks" / "fixtures"
+
+
+def replay(spider: Spider, fixture: Fixture) -> tuple[int, int]:
+    """Run the callback of `fixture` to the end, return (items, requests)."""
+    items = requests = 0
+    for output in getattr(spider, fixture.callback)(fixture.response, **fixture.cb_kwargs) or ():
+        if isinstance(output, Request):
+            requests += 1
+        else:
+            items += 1
+    return items, requests
+
+
+def count_rows(spider: Spider, fixture: Fixture, items: int) -> int:
+    """Return the table rows of a page parsed by `parse`, for other pages (e.g. text lists) the items."""
+    if fixture.callback == "parse" and getattr(spider, "paths", {}).get("rows"):
+        return len(spider.get_rows(fixture.response))
+    return items
+
+
+def allocations(spider: Spider, fixture: Fixture) -> tuple[int, int]:
+    """Return (peak bytes, blocks still allocated) of a replay of `fixture`, keeping its output alive."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    output = list(getattr(spider, fixture.callback)(fixture.response, **fixture.cb_kwargs) or ())
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    del output
+    return peak, blocks
+
+
+def bench(spider: Spider, fixtures: list[Fixture], runs: int) -> dict[str, float]:
+    rows = items = requests = 0
+    for fixture in fixtures:  # warm up, e.g. compiled XPaths and regexes, and count the output
+        i, q = replay(spider, fixture)
+        rows, items, requests = rows + count_rows(spider, fixture, i), items + i, requests + q
+    seconds = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        for fixture in fixtures:
+            replay(spider, fixture)
+        seconds.append(time.perf_counter() - start)
+    elapsed = statistics.median(seconds)
+    peaks, blocks = zip(*(allocations(spider, fixture) for fixture in fixtures), strict=True)
+    return {
+        "pages": len(fixtures),
+        "rows": rows,
+        "items": items,
+        "requests": requests,
+        "rows_per_second": rows / elapsed if elapsed else 0.0,
+        "ms_per_page": elapsed * 1000 / len(fixtures),
+        "peak_kb": max(peaks) / 1024,
+        "blocks_per_page": sum(blocks) / len(fixtures),
+    }
+
+
+def regressions(results: dict[str, dict[str, float]], baseline: dict[str, Any], tolerance: float) -> list[str]:
+    failures = []
+    for name, result in results.items():
+        if (base := baseline.get(name)) is None:
+            continue
+        if result["items"] != base["items"]:
+            failures.append(f"{name}: {result['items']} items instead of {base['items']}")
+        if result["rows_per_second"] < base["rows_per_second"] * (1 - tolerance):
+            change = result["rows_per_second"] / base["rows_per_second"] - 1
+            failures.append(f"{name}: {result['rows_per_second']:.0f} rows/s, {change:+.0%} against the baseline")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("spiders", nargs="*", help="only these spiders (default: all with fixtures)")
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES_DIR)
+    parser.add_argument("--baseline", type=Path, help="default: baseline.json in the fixtures directory")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed rows/s drop (default: 0.15)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--synthetic", type=int, default=0, metavar="ROWS", help="parse generated pages of ROWS proxies"
+    )
+    args = parser.parse_args()
+
+    os.environ.setdefault("SCRAPY_SETTINGS_MODULE", "scraper.settings")
+    loader = SpiderLoader.from_settings(get_project_settings())
+    by_spider: defaultdict[str, list[Fixture]] = defaultdict(list)
+    fixtures, synthetic = load_or_generate(args.fixtures, args.spiders, args.synthetic)
+    for fixture in fixtures:
+        by_spider[fixture.spider].append(fixture)
+    if not by_spider:
+        sys.exit(f"No fixtures of {', '.join(args.spiders)} in {args.fixtures}")
+
+    results = {}
+    print(f"{'spider':<16}{'pages':>6}{'rows/s':>10}{'ms/page':>9}{'peak KB':>9}{'blocks/page':>12}{'items':>7}")
+    for name, fixtures in sorted(by_spider.items()):
+        result = results[name] = bench(loader.load(name)(), fixtures, args.runs)
+        print(
+            f"{name:<16}{result['pages']:>6}{result['rows_per_second']:>10.0f}{result['ms_per_page']:>9.2f}"
+            f"{result['peak_kb']:>9.0f}{result['blocks_per_page']:>12.0f}{result['items']:>7}"
+        )
+
+    baseline_path = args.baseline or args.fixtures / ("synthetic-baseline.json" if synthetic else "baseline.json")
+    if args.save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline saved to {baseline_path}")
+        return
+    if not baseline_path.exists():
+        print(f"No baseline in {baseline_path}, save one with --save-baseline")
+        return
+    if failures := regressions(results, json.loads(baseline_path.read_text()), args.tolerance):
+        sys.exit("Regressions:\n" + "\n".join(failures))
+    print(f"No regression against {baseline_path} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Proxy checks against a local stand-in judge: a check of the outcomes and the checks per second.
+
+Checks `--proxies` proxies on loopback addresses, most of them a local server answering plain http
+proxy requests as a judge would (echoing the request), the others refusing connections or accepting
+them but answering after `--timeout`. Exits 1 unless the working proxies are alive over http only,
+the refused ones are unreachable with their other protocols skipped, and the slow ones are dead
+without being taken for unreachable. No network is needed:
+
+    python -m benchmarks.proxycheck --proxies 2000 --concurrency 100
+"""
+
+import argparse
+import asyncio
+import socket
+import sys
+import time
+
+from scrapy import Spider
+from scrapy.exceptions import DropItem
+from scrapy.utils.test import get_crawler
+
+from scraper import settings as project
+from scraper.items import ProxyItem
+from scraper.pipelines import ProxyCheckPipeline
+
+KINDS = ("alive", "refused", "slow")
+SLOW_EVERY, REFUSED_EVERY = 10, 7  # every n-th proxy is slow, else refuses connections
+
+
+async def judge(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Answer a GET (absolute-form through the "proxy", or direct) with the request, refuse anything else."""
+    try:
+        request = await reader.readuntil(b"\r\n\r\n")
+        if request.startswith(b"GET "):
+            address = writer.get_extra_info("sockname")[0]
+            body = b'{"origin": "%s", "request": "%s"}' % (address.encode(), request.split(b"\r\n")[0])
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+        else:  # CONNECT, or the socks handshakes
+            writer.write(b"HTTP/1.1 403 Forbidden\r\n\r\n")
+        await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def stall(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Accept the connection and never answer, until the client gives up."""
+    await reader.read()
+    writer.close()
+
+
+def free_port() -> int:
+    """Return a port nothing listens on, connections to it are refused."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return int(s.getsockname()[1])
+
+
+def proxy(i: int, ports: dict[str, int]) -> tuple[str, str, int]:
+    """Return the kind, ip and port of the `i`-th proxy, each on its own loopback address."""
+    kind = "slow" if i % SLOW_EVERY == 0 else "refused" if i % REFUSED_EVERY == 0 else "alive"
+    return kind, f"127.{1 + i // 65536 % 254}.{i // 256 % 256}.{i % 256 or 1}", ports[kind]
+
+
+async def run(args: argparse.Namespace) -> list[str]:
+    alive_server = await asyncio.start_server(judge, "0.0.0.0", 0, backlog=4096)
+    slow_server = await asyncio.start_server(stall, "0.0.0.0", 0, backlog=4096)
+    ports = {
+        "alive": alive_server.sockets[0].getsockname()[1],
+        "slow": slow_server.sockets[0].getsockname()[1],
+        "refused": free_port(),
+    }
+    judge_url = f"http://127.0.0.1:{ports['alive']}/get"
+    crawler = get_crawler(
+        Spider,
+        {
+            "PROXY_CHECK_ENABLED": True,
+            "PROXY_CHECK_PROTOCOLS": project.PROXY_CHECK_PROTOCOLS,
+            "PROXY_CHECK_JUDGE_URL": judge_url,
+            "PROXY_CHECK_JUDGE_URL_HTTPS": judge_url.replace("http:", "https:"),
+            "PROXY_CHECK_CONCURRENCY": args.concurrency,
+            "PROXY_CHECK_TIMEOUT": args.timeout,
+        },
+    )
+    spider = crawler._create_spider("proxycheck")
+    crawler.stats.open_spider(spider)
+    pipeline = ProxyCheckPipeline.from_crawler(crawler)
+    await pipeline._open(spider)
+
+    async def check(i: int) -> tuple[str, ProxyItem | None]:
+        kind, ip, port = proxy(i, ports)
+        try:
+            return kind, await pipeline.process_item(ProxyItem(ip=ip, port=port, protocol="http"), spider)
+        except DropItem:
+            return kind, None
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(check(i) for i in range(args.proxies)))
+    seconds = time.perf_counter() - start
+    alive_server.close()
+    slow_server.close()
+
+    failures = []
+    counts = {kind: sum(k == kind for k, _ in results) for kind in KINDS}
+    if bad := sum(k == "alive" and (item is None or item["protocols"] != ["http"]) for k, item in results):
+        failures.append(f"{bad} working proxies not alive over http only")
+    if bad := sum(k != "alive" and item is not None for k, item in results):
+        failures.append(f"{bad} refused or slow proxies kept")
+    stats = crawler.stats.get_stats()
+    if (unreachable := stats.get("proxy_check/unreachable", 0)) != counts["refused"]:
+        failures.append(f"{unreachable} proxies unreachable instead of the {counts['refused']} refusing connections")
+    print(f"{args.proxies} proxies ({', '.join(f'{n} {kind}' for kind, n in counts.items())}) in {seconds:.2f} s")
+    print(f"{args.proxies / seconds:.0f} checks/s, protocols skipped: {stats.get('proxy_check/skipped', 0)}")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--proxies", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=0.5, help="seconds before a slow proxy counts as dead")
+    args = parser.parse_args()
+    if failures := asyncio.run(run(args)):
+        sys.exit("Failures:\n" + "\n".join(failures))
+    print("Every proxy checked as expected")
+
+
+if __name__ == "__main__":
+    main()
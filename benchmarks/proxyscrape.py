@@ -0,0 +1,53 @@
+"""Requests, bytes and crawl time of the coalesced proxyscrape lists against one list per filter.
+
+Answers the queries of both modes from the same generated proxies (see `proxyscrape_list` in
+`benchmarks/synthetic.py`: the ssl and anonymity filters only apply to http, transparent http
+proxies are only in the unfiltered list), parses them and reports what each mode downloads. The
+proxyscrape requests share one download slot, so the crawl time is that of serial requests,
+`DOWNLOAD_DELAY` apart (AutoThrottle keeps at least that delay). No network is needed:
+
+    python -m benchmarks.proxyscrape --rows 2000 --latency 0.5
+"""
+
+import argparse
+
+from scrapy.http import Request, TextResponse
+
+from benchmarks.synthetic import proxyscrape_list
+from scraper import settings as project
+from scraper.spiders.proxyscrape import ProxyScrapeSpider
+
+MODES = {"coalesced": True, "per filter": False}
+
+
+def crawl(rows: int, coalesce: bool) -> tuple[int, int, set[tuple[str, int]], int]:
+    """Return the requests, bytes, proxies and proxies with an anonymity of a run of the spider."""
+    spider = ProxyScrapeSpider(coalesce=coalesce)
+    requests = size = anonymous = 0
+    proxies = set()
+    for query in spider.build_queries():
+        url = spider.build_url(query)
+        body = proxyscrape_list(rows, query)
+        requests, size = requests + 1, size + len(body)
+        response = TextResponse(url, body=body, encoding="utf-8", request=Request(url))
+        for item in spider.parse(response, **spider.queries[url]):
+            proxies.add((item["ip"], item["port"]))
+            anonymous += bool(item["anonymity"])
+    return requests, size, proxies, anonymous
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000, help="proxies per protocol")
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per response")
+    args = parser.parse_args()
+
+    delay = max(project.DOWNLOAD_DELAY, args.latency)
+    print(f"{'mode':<12}{'requests':>10}{'bytes':>10}{'crawl s':>9}{'proxies':>9}{'anonymity':>11}")
+    for mode, coalesce in MODES.items():
+        requests, size, proxies, anonymous = crawl(args.rows, coalesce)
+        print(f"{mode:<12}{requests:>10}{size:>10}{requests * delay:>9.1f}{len(proxies):>9}{anonymous:>11}")
+
+
+if __name__ == "__main__":
+    main()
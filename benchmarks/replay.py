@@ -0,0 +1,128 @@
+"""End-to-end load test: the whole crawl stack against `scraper.replay` serving captured fixtures.
+
+Runs the `all` spider over the spiders with fixtures (or the given ones) with `REPLAY_URL` set, so
+scheduling, throttling, middlewares, pipelines and the feed export are real and nothing leaves the
+machine. Reports items per second and, with `--profile`, where the time went (the profiler slows
+the crawl down, compare items per second without it):
+
+    python -m benchmarks.replay --latency 0.05 --error-rate 0.02 --amplify 50
+    python -m benchmarks.replay freeproxylist --profile -s DOWNLOAD_DELAY=0 -s AUTOTHROTTLE_ENABLED=False
+
+The proxy check connects to the scraped proxies themselves, it is off unless `--check` is given.
+Without captured fixtures (or with `--synthetic ROWS`), generated pages are served instead, see
+`benchmarks/synthetic.py`.
+"""
+
+import argparse
+import cProfile
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+
+from benchmarks.synthetic import load_or_generate
+from scraper.replay import ReplayServer
+
+ROOT = Path(__file__).resolve().parent.parent
+FIXTURES_DIR = ROOT / "benchmarks" / "fixtures"
+IDLE = "<method 'poll' of 'select.epoll' objects>"  # the reactor waiting for the network or a timer
+STAGES = {  # stage -> (file path fragment, functions), their cumulative time is the stage's
+    "spider callbacks": (("/scraper/spiders/", "/scraper/base.py"), ("parse", "prepare")),
+    "item pipelines": (("/scraper/pipelines.py",), ("process_item",)),
+    "feed export": (("/scrapy/extensions/feedexport.py",), ("item_scraped",)),
+}
+
+
+def breakdown(profile: cProfile.Profile, total: float) -> list[tuple[str, float]]:
+    """Return the seconds spent per stage, the rest being Scrapy and Twisted themselves."""
+    stats: dict[tuple[str, int, str], tuple[Any, ...]] = pstats.Stats(profile).stats  # type: ignore[attr-defined]
+    times = dict.fromkeys(STAGES, 0.0)
+    idle = 0.0
+    for (filename, _, function), (_, _, own, cumulative, _) in stats.items():
+        if function == IDLE:
+            idle += own
+        for stage, (paths, functions) in STAGES.items():
+            if function in functions and any(path in filename for path in paths):
+                times[stage] += cumulative
+    rows = [("waiting (network, latency, delays)", idle), *times.items()]
+    return [*rows, ("scrapy and twisted", max(0.0, total - sum(seconds for _, seconds in rows)))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("spiders", nargs="*", help="default: the spiders with fixtures")
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES_DIR)
+    parser.add_argument("--latency", type=float, default=0.0, help="mean seconds before each response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 503")
+    parser.add_argument("--amplify", type=int, default=1, help="serve every proxy row this many times")
+    parser.add_argument("--check", action="store_true", help="keep the proxy check pipeline on")
+    parser.add_argument("--profile", action="store_true", help="profile the crawl to break its time down")
+    parser.add_argument(
+        "--synthetic", type=int, default=0, metavar="ROWS", help="serve generated pages of ROWS proxies"
+    )
+    parser.add_argument("-s", "--set", action="append", default=[], metavar="NAME=VALUE", help="a Scrapy setting")
+    args = parser.parse_args()
+
+    fixtures, _ = load_or_generate(args.fixtures, args.spiders, args.synthetic)
+    if not fixtures:
+        sys.exit(f"No fixtures of {', '.join(args.spiders)} in {args.fixtures}")
+    server = ReplayServer(("127.0.0.1", 0), fixtures, args.latency, args.error_rate, args.amplify, seed=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    os.environ.setdefault("SCRAPY_SETTINGS_MODULE", "scraper.settings")
+    directory = Path(tempfile.mkdtemp(prefix="replay-"))
+    settings = get_project_settings()
+    settings.setdict(
+        {
+            "REPLAY_URL": server.url,
+            "FLARESOLVERR_URL": f"{server.url}/v1",
+            "FLARESOLVERR_CACHE_FILE": None,
+            "HTTPCACHE_ENABLED": False,
+            "DEDUP_PERSIST_FILE": None,
+            "PROXY_CHECK_ENABLED": args.check,
+            "STORE_ENABLED": True,  # in a crawl as deployed
+            "STORE_FILE": str(directory / "proxies.db"),
+            "FEEDS": {str(directory / "items.jl"): {"format": "jsonlines"}},
+            "LOG_LEVEL": "ERROR",  # not a warning per dropped item
+        },
+        priority="cmdline",
+    )
+    for setting in args.set:
+        name, value = setting.split("=", 1)
+        settings.set(name, value, priority="cmdline")
+
+    spiders = sorted({fixture.spider for fixture in fixtures})
+    process = CrawlerProcess(settings)
+    crawler = process.create_crawler("all")
+    process.crawl(crawler, spiders=",".join(spiders))
+    profile = cProfile.Profile()
+    start = time.perf_counter()
+    if args.profile:
+        profile.enable()
+    process.start()
+    profile.disable()
+    total = time.perf_counter() - start
+    server.shutdown()
+
+    stats = crawler.stats.get_stats()
+    items = stats.get("item_scraped_count", 0)
+    print(f"spiders: {', '.join(spiders)}  fixtures: {len(fixtures)}  output: {directory}")
+    print(f"server: {dict(server.counts)}")
+    print(f"responses: {stats.get('downloader/response_count', 0)}  items: {items}  ", end="")
+    print(f"dropped: {stats.get('item_dropped_count', 0)}  retries: {stats.get('retry/count', 0)}")
+    print(f"{items / total:.0f} items/s in {total:.2f} s{' (profiled)' if args.profile else ''}")
+    if args.profile:
+        print(f"\n{'where the time went':<40}{'seconds':>10}{'share':>8}")
+        for stage, seconds in breakdown(profile, total):
+            print(f"{stage:<40}{seconds:>10.2f}{seconds / total:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
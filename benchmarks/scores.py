@@ -0,0 +1,72 @@
+"""Proxy scores: seconds to add a job's observations to `ScoreBook`, and to read the best proxies.
+
+The book is filled with `--history` jobs of `--items` proxies each, half of every job's proxies
+seen before and a third of them (`--alive`) checked alive. Offline:
+
+    python -m benchmarks.scores --items 50000 --history 5
+"""
+
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from scraper.scores import Observations, ScoreBook
+
+PROTOCOLS = ("http", "https", "socks4", "socks5")
+COUNTRIES = ("US", "DE", "BR", "ID", "RU", "CN", "FR", "IN")
+SOURCES = ("freeproxylist", "geonode", "proxyscrape", "proxynova", "spysone")
+
+
+def job(items: int, first: int, rng: random.Random, alive_share: float) -> Observations:
+    """Observations of `items` proxies numbered from `first`, checked like `ProxyCheckPipeline` does."""
+    observations = Observations()
+    for i in range(first, first + items):
+        alive = rng.random() < alive_share
+        item = {
+            "ip": f"{10 + i % 200}.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}",
+            "port": 1024 + i % 60000,
+            "protocol": PROTOCOLS[i % 4],
+            "country": COUNTRIES[i % 8],
+            "source": SOURCES[i % 5],
+            "latency": round(rng.uniform(0.05, 5), 3) if alive else None,
+            "protocols": [PROTOCOLS[i % 4]] if alive else [],
+        }
+        observations.add(item)
+    return observations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=50_000, help="proxies per job")
+    parser.add_argument("--history", type=int, default=5, help="jobs added before the timed one")
+    parser.add_argument("--alive", type=float, default=0.33, help="share of the proxies checked alive")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    rng = random.Random(42)
+
+    with tempfile.TemporaryDirectory() as directory, ScoreBook(Path(directory) / "scores.db") as book:
+        jobs = [job(args.items, n * args.items // 2, rng, args.alive) for n in range(args.history + 1)]
+        for observations in jobs[:-1]:
+            book.update(observations)
+        assert book.connection is not None
+        rows = book.connection.execute("SELECT count(*) FROM proxy_scores").fetchone()[0]
+        start = time.perf_counter()
+        book.update(jobs[-1])
+        update = time.perf_counter() - start
+        print(f"update of {len(jobs[-1])} proxies into {rows}: {update:.3f}s")
+
+        for protocol, country in (("", ""), ("socks5", ""), ("", "US"), ("http", "US")):
+            times = []
+            for _ in range(args.queries):
+                start = time.perf_counter()
+                best = book.best(50, protocol, country)
+                times.append(time.perf_counter() - start)
+            label = f"best 50 protocol={protocol or '*'} country={country or '*'}"
+            print(f"{label:<40}{statistics.median(times) * 1000:>8.3f} ms  (top score {best[0]['score']:.3f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Job startup benchmark: wall time and peak RSS (whole process tree) of `scrapy crawl <spider>`.
+
+Each spider is crawled against a local page, so no network is needed:
+
+    python -m benchmarks.startup freeproxylist geonode --runs 3
+
+With `--all`, the spiders are also crawled together by the `all` spider, against running them as
+one job each after another (scrapyd with `max_proc_per_cpu = 1` on a single CPU).
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # noqa: N802
+        body = b"<html><body><table><tbody></tbody></table></body></html>"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+def tree_rss(pid: int) -> int:
+    """Sum of VmRSS (kB) for `pid` and all of its descendants, from /proc."""
+    children: dict[int, list[int]] = {}
+    for stat in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            fields = stat.read_text().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        children.setdefault(int(fields[1]), []).append(int(stat.parent.name))
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        stack.extend(children.get(current, []))
+        try:
+            for line in Path(f"/proc/{current}/status").read_text().splitlines():
+                if line.startswith("VmRSS:"):
+                    total += int(line.split()[1])
+        except OSError:
+            continue
+    return total
+
+
+def run(spider: str, url: str, *arguments: str) -> tuple[float, int]:
+    """Return (seconds, peak kB) for one crawl of `spider`."""
+    command = [sys.executable, "-m", "scrapy", "crawl", spider, "-a", f"start_urls={url}", "-a", f"api_url={url}"]
+    command += arguments
+    command += ["-s", "ROBOTSTXT_OBEY=False", "-s", "HTTPCACHE_ENABLED=False", "-s", "ITEM_PIPELINES={}"]
+    # the sources are different sites, only one local one here, so no per-site download delay
+    command += ["-s", "DOWNLOAD_DELAY=0", "-s", "AUTOTHROTTLE_ENABLED=False"]
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    peak = 0
+    while process.poll() is None:
+        peak = max(peak, tree_rss(process.pid))
+        time.sleep(0.02)
+    return time.perf_counter() - start, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("spiders", nargs="+", help="spiders accepting a `start_urls` argument")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--all", action="store_true", help="also crawl the spiders in a single `all` job")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/"
+    os.environ.setdefault("SCRAPY_SETTINGS_MODULE", "scraper.settings")
+
+    print(f"{'spider':<16}{'seconds':>10}{'peak MB':>10}")
+    total, total_peak = 0.0, 0.0
+    for spider in args.spiders:
+        results = [run(spider, url) for _ in range(args.runs)]
+        seconds = statistics.median(r[0] for r in results)
+        peak = statistics.median(r[1] for r in results) / 1024
+        total, total_peak = total + seconds, max(total_peak, peak)
+        print(f"{spider:<16}{seconds:>10.2f}{peak:>10.1f}")
+    if args.all:
+        results = [run("all", url, "-a", f"spiders={','.join(args.spiders)}") for _ in range(args.runs)]
+        seconds = statistics.median(r[0] for r in results)
+        peak = statistics.median(r[1] for r in results) / 1024
+        print(f"{'one job each':<16}{total:>10.2f}{total_peak:>10.1f}")
+        print(f"{'all':<16}{seconds:>10.2f}{peak:>10.1f}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""Synthetic fixtures: generated pages of every source, for the benchmarks on a checkout without captures.
+
+The pages follow the markup the spiders parse (see their docstrings), with made-up proxies, so
+`benchmarks/parse.py` and `benchmarks/replay.py` run without network when `benchmarks/fixtures` is
+empty. They measure the parsers, not how the real pages change, capture fixtures for that. The
+spys.one ports and proxynova IPs are written by scripts, as on the sites, for `scraper.deobfuscate`:
+
+    python -m benchmarks.synthetic benchmarks/fixtures --rows 200
+"""
+
+import argparse
+import base64
+import json
+import re
+import tempfile
+from pathlib import Path
+
+from scrapy import FormRequest, Request
+from scrapy.http import HtmlResponse, TextResponse
+
+from scraper.fixtures import Fixture, load_fixtures, save_fixture
+from scraper.spiders.freeproxylist import ProxyScrapeSpider as FreeProxyListSpider
+from scraper.spiders.geonode import ProxyScrapeSpider as GeonodeSpider
+from scraper.spiders.proxynova import ProxyNovaSpider
+from scraper.spiders.proxyscrape import ProxyScrapeSpider
+from scraper.spiders.spysone import ProxyScrapeSpider as SpysOneSpider
+
+ROWS = 200
+HTML = {"Content-Type": "text/html; charset=utf-8"}
+TEXT = {"Content-Type": "text/plain"}
+JSON = {"Content-Type": "application/json"}
+XX0 = "597a786904c5603a4d7954dfdb397baf"  # the form token of the spys.one page
+PROTOCOLS = ("http", "https", "socks4", "socks5")
+COUNTRIES = ("US", "DE", "BR", "ID", "RU")
+SPYS_ANONYMITY = ("HIA", "ANM", "NOA")
+
+
+def proxy(source: int, i: int) -> tuple[str, int]:
+    """Return the `i`-th (ip, port) of a source, distinct across the sources."""
+    return f"{10 + source}.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}", 1024 + i % 60000
+
+
+def html(body: str) -> bytes:
+    return f"<html><body>{body}</body></html>".encode()
+
+
+def pack(code: str) -> str:
+    """Return `code` packed the way Dean Edwards' packer does, the inverse of `scraper.deobfuscate.unpack`."""
+    words = list(dict.fromkeys(re.findall(r"\b\w+\b", code)))
+    index = {word: base36(i) for i, word in enumerate(words)}
+    payload = re.sub(r"\b\w+\b", lambda match: index[match.group(0)], code)
+    return (
+        "eval(function(p,a,c,k,e,d){e=function(c){return c.toString(36)};while(c--)if(k[c])"
+        "p=p.replace(new RegExp('\\\\b'+e(c)+'\\\\b','g'),k[c]);return p}"
+        f"('{payload}',36,{len(words)},'{'|'.join(words)}'.split('|'),0,{{}}))"
+    )
+
+
+def base36(number: int) -> str:
+    digits = ""
+    while True:
+        number, digit = divmod(number, 36)
+        digits = "0123456789abcdefghijklmnopqrstuvwxyz"[digit] + digits
+        if not number:
+            return digits
+
+
+def freeproxylist_page(rows: int) -> bytes:
+    trs = []
+    for i in range(rows):
+        ip, port = proxy(0, i)
+        https = "yes" if i % 2 else "no"
+        trs.append(
+            f"<tr><td>{ip}</td><td>{port}</td><td>{COUNTRIES[i % 5]}</td><td class='hm'>Somewhere</td>"
+            f"<td>elite proxy</td><td class='hm'>no</td><td class='hx'>{https}</td><td class='hm'>1 min ago</td></tr>"
+        )
+    return html(f"<section id='list'><table><tbody>{''.join(trs)}</tbody></table></section>")
+
+
+def proxyscrape_list(rows: int, query: dict[str, str]) -> bytes:
+    """Return the list of `query` from `rows` proxies per protocol, the http ones of every ssl and anonymity."""
+    offset = ("http", "socks4", "socks5").index(query["protocol"]) * rows
+    lines = []
+    for i in range(rows):
+        ssl, anonymity = ("yes", "no")[i % 2], ("elite", "anonymous", "transparent")[i % 3]
+        if query["protocol"] == "http" and (
+            query["ssl"] not in ("all", ssl) or query["anonymity"] not in ("all", anonymity)
+        ):
+            continue  # the ssl and anonymity filters only apply to http
+        lines.append("{}:{}".format(*proxy(1, offset + i)))
+    return "\r\n".join(lines).encode()
+
+
+def geonode_page(rows: int) -> bytes:
+    data = []
+    for i in range(rows):
+        ip, port = proxy(2, i)
+        protocols = [PROTOCOLS[i % 4]] if i % 3 else list(PROTOCOLS[2:])
+        data.append(
+            {
+                "ip": ip,
+                "port": str(port),
+                "protocols": protocols,
+                "country": COUNTRIES[i % 5],
+                "anonymityLevel": "elite",
+            }
+        )
+    return json.dumps({"data": data, "total": rows, "page": 1, "limit": GeonodeSpider.page_size}).encode()
+
+
+def geonode_table(rows: int) -> bytes:
+    """Return the rendered list page (`-a api=false`), not among the fixtures as it is rendered by Playwright."""
+    trs = []
+    for i in range(rows):
+        ip, port = proxy(2, i)
+        trs.append(
+            f"<tr><td class='p-2'><span>{ip}</span></td><td class='p-2'><span>{port}</span></td>"
+            f"<td><div><span><svg></svg></span><span class='uppercase'>{COUNTRIES[i % 5]}</span></div></td>"
+            f"<td><div><span class='uppercase'>{PROTOCOLS[i % 4]}</span></div></td>"
+            "<td><div>elite (HIA)</div></td><td><div>1 min ago</div></td></tr>"
+        )
+    return html(f"<table><tbody>{''.join(trs)}</tbody></table>")
+
+
+def spysone_form() -> bytes:
+    return html(
+        "<form method='post' action='/en/anonymous-proxy-list/'>"
+        f"<input type='hidden' name='xx0' value='{XX0}'></form>"
+    )
+
+
+def spysone_page(rows: int) -> bytes:
+    """Return a list page whose ports are written from the digits of a packed script's XOR'd variables."""
+    keys = [(7919 * (digit + 3)) % 65521 for digit in range(10)]
+    names = [(f"v{digit}x", f"k{digit}y") for digit in range(10)]
+    code = "".join(f"{key}={keys[digit]};" for digit, (_, key) in enumerate(names))
+    code += "".join(f"{value}={digit}^{key};" for digit, (value, key) in enumerate(names))
+    trs = ["<tr class='spy1x'><td>Proxy address:port</td><td>Proxy type</td></tr>"]
+    for i in range(rows):
+        ip, port = proxy(3, i)
+        digits = "+".join("({}^{})".format(*names[int(digit)]) for digit in str(port))
+        protocol, anonymity, country = PROTOCOLS[i % 4].upper(), SPYS_ANONYMITY[i % 3], COUNTRIES[i % 5]
+        trs.append(
+            f"<tr class='{'spy1xx' if i % 2 else 'spy1x'}'>"
+            f"<td colspan='1'><font class='spy14'>{ip}<script type='text/javascript'>"
+            f'document.write("<font class=spy2>:<\\/font>"+{digits})</script></font></td>'
+            f"<td colspan='1'><a href='/en/http-proxy-list/'><font class='spy1'>{protocol}</font></a></td>"
+            f"<td colspan='1'><a href='/en/anonymous-proxy-list/'><font class='spy1'>{anonymity}</font></a></td>"
+            f"<td colspan='1'><a href='/free-proxy-list/{country}/'><font class='spy14'>Somewhere</font></a></td>"
+            "</tr>"
+        )
+    script = f"<script type='text/javascript'>{pack(code)}</script>"
+    return html(f"{script}<table><tbody>{''.join(trs)}</tbody></table>")
+
+
+def proxynova_page(rows: int) -> bytes:
+    """Return a list page whose IPs are written by scripts, reversed or base64 encoded, in an <abbr> or not."""
+    trs = []
+    for i in range(rows):
+        ip, port = proxy(4, i)
+        if i % 2:
+            script = f'document.write("{ip[::-1]}".split("").reverse().join(""))'
+        else:
+            script = f'document.write(atob("{base64.b64encode(b"xx" + ip.encode()).decode()}").substr(2))'
+        address = f"<script>{script}</script>"
+        cell = f"<abbr title='{i}'>{address}</abbr>" if i % 3 else address
+        port_cell = f"<a href='/proxy-server-list/port-{port}/' title='Port {port}'>{port}</a>" if i % 4 else port
+        country = COUNTRIES[i % 5].lower()
+        trs.append(
+            f"<tr><td align='left'>{cell}</td><td align='left'>{port_cell}</td><td>1 min ago</td><td>500 ms</td>"
+            f"<td>90%</td><td align='left'><img src='/flags/{country}.png' alt='{country}' />"
+            f"<a href='/proxy-server-list/country-{country}/'>Somewhere</a></td><td>Elite</td></tr>"
+        )
+    return html(f"<table id='tbl_proxy_list'><tbody>{''.join(trs)}</tbody></table>")
+
+
+def write_fixtures(directory: str | Path, rows: int = 200) -> list[Path]:
+    """Save a fixture of every page the spiders parse, pages of `rows` proxies, under `directory`."""
+    responses = []
+    spider = FreeProxyListSpider()
+    request = Request(spider.start_urls[0], callback=spider.parse)
+    responses.append(
+        (spider.name, HtmlResponse(request.url, body=freeproxylist_page(rows), headers=HTML, request=request))
+    )
+
+    spider = ProxyScrapeSpider()
+    for query in spider.build_queries():
+        url = spider.build_url(query)
+        request = Request(url, callback=spider.parse, cb_kwargs=spider.queries[url])
+        body = proxyscrape_list(rows, query)
+        responses.append((spider.name, TextResponse(url, body=body, headers=TEXT, request=request)))
+
+    spider = GeonodeSpider()
+    request = spider.api_request(1, callback=spider.parse_first_page)
+    responses.append((spider.name, TextResponse(request.url, body=geonode_page(rows), headers=JSON, request=request)))
+
+    spider = SpysOneSpider()
+    request = Request(spider.start_urls[0], callback=spider.prepare)
+    responses.append((spider.name, HtmlResponse(request.url, body=spysone_form(), headers=HTML, request=request)))
+    request = FormRequest(request.url, formdata={"xx0": XX0, "xpp": "5"}, callback=spider.parse)
+    responses.append((spider.name, HtmlResponse(request.url, body=spysone_page(rows), headers=HTML, request=request)))
+
+    spider = ProxyNovaSpider()
+    request = Request(spider.start_urls[0], callback=spider.parse)
+    responses.append((spider.name, HtmlResponse(request.url, body=proxynova_page(rows), headers=HTML, request=request)))
+    return [save_fixture(directory, name, response) for name, response in responses]
+
+
+def load_or_generate(directory: Path, spiders: list[str], rows: int = 0) -> tuple[list[Fixture], bool]:
+    """Return the fixtures of `spiders` under `directory`, or synthetic ones if there are none or `rows` is given.
+
+    The second value tells whether they are synthetic, pages of `rows` (or `ROWS`) proxies.
+    """
+    if not rows and (fixtures := list(load_fixtures(directory, spiders))):
+        return fixtures, False
+    with tempfile.TemporaryDirectory(prefix="synthetic-") as generated:
+        write_fixtures(generated, rows or ROWS)
+        fixtures = list(load_fixtures(generated, spiders))  # the bodies are read, the files are no longer needed
+    reason = "" if rows else f"No fixtures in {directory}, "
+    print(
+        f"{reason}{'u' if reason else 'U'}sing synthetic pages of {rows or ROWS} proxies, see benchmarks/synthetic.py"
+    )
+    return fixtures, True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--rows", type=int, default=ROWS, help="proxies per page")
+    args = parser.parse_args()
+    paths = write_fixtures(args.directory, args.rows)
+    print(f"{len(paths)} fixtures written to {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Plain-text proxy list parse rate: the streaming bytes parser against the previous line-splitting one.
+
+Both are timed scanning `(ip, port)` pairs only and building the item of each line.
+Parses a generated `ip:port` list offline, no network is needed:
+
+    python -m benchmarks.textlist --lines 50000 --runs 5
+"""
+
+import argparse
+import statistics
+import time
+from collections.abc import Callable, Iterator
+from typing import Any
+
+from scrapy.http import Request, TextResponse
+
+from scraper.extraction import iter_proxy_lines
+from scraper.items import ProxyItem
+from scraper.spiders.proxyscrape import ProxyScrapeSpider
+
+URL = "https://api.proxyscrape.com/v2/?request=displayproxies&protocol=http&ssl=no&anonymity=elite"
+
+
+def splitlines_parse(spider: ProxyScrapeSpider, response: TextResponse) -> Iterator[ProxyItem]:
+    """The parser `ProxyScrapeSpider.parse` used before, decoding and splitting the whole body."""
+    for line in response.text.splitlines():
+        ip, port = line.split(":")
+        ip = spider.match_data(ip, spider.get_pattern("ip"))
+        port = spider.match_data(port, spider.get_pattern("port"))
+        yield ProxyItem(
+            ip=ip, port=int(port) if port else 0, protocol="http", country="", anonymity="elite", source=spider.name
+        )
+
+
+def splitlines_scan(spider: ProxyScrapeSpider, response: TextResponse) -> Iterator[tuple[str, int]]:
+    for line in response.text.splitlines():
+        ip, port = line.split(":")
+        ip = spider.match_data(ip, spider.get_pattern("ip"))
+        port = spider.match_data(port, spider.get_pattern("port"))
+        yield ip, int(port) if port else 0
+
+
+def text_list(lines: int) -> bytes:
+    return "\r\n".join(
+        f"{10 + i % 200}.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}:{1024 + i % 60000}" for i in range(lines)
+    ).encode()
+
+
+def rate(parse: Callable[[TextResponse], Iterator[Any]], body: bytes, runs: int) -> tuple[float, int]:
+    """Return (median lines per second, items) of `parse`, on a fresh response every run."""
+    rates, count = [], 0
+    for _ in range(runs):
+        response = TextResponse(URL, body=body, encoding="utf-8", request=Request(URL))
+        start = time.perf_counter()
+        count = sum(1 for _ in parse(response))
+        rates.append(count / (time.perf_counter() - start))
+    return statistics.median(rates), count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=50_000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    spider = ProxyScrapeSpider()
+    body = text_list(args.lines)
+    print(f"{'parser':<24}{'lines/s':>12}{'items':>10}")
+    for name, parse in (
+        ("splitlines (ip, port)", lambda response: splitlines_scan(spider, response)),
+        ("streaming (ip, port)", lambda response: iter_proxy_lines(response.body)),
+        ("splitlines ProxyItem", lambda response: splitlines_parse(spider, response)),
+        ("streaming ProxyRecord", spider.parse),
+    ):
+        lines_per_second, count = rate(parse, body, args.runs)
+        print(f"{name:<24}{lines_per_second:>12.0f}{count:>10}")
+
+
+if __name__ == "__main__":
+    main()
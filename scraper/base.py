@@ -1,41 +1,94 @@
+import logging
 import random
-import re
-from collections.abc import Callable, Generator
+import time
+from collections.abc import AsyncGenerator, Callable, Generator
 from pathlib import Path
-from typing import Any, Literal, overload
+from typing import TYPE_CHECKING, Any, Literal, Protocol, Self, overload
+from urllib.parse import urlsplit
 
-import requests
 import scrapy
 from scrapy import Request, Selector
-from scrapy.http import TextResponse
+from scrapy.crawler import Crawler
+from scrapy.http import Response, TextResponse
 from scrapy.selector import SelectorList
+from scrapy.settings import Settings
 
 from scraper.agents import USER_AGENTS
-from scraper.items import ProxyItem
-from scraper.types import ElementPathsTypedDict, FlareSolverrResponseTypedDict, RequestMetaTypedDict
+from scraper.extraction import PATTERNS, FieldExtractor, compile_pattern, compile_xpath, iter_proxy_lines, xpath_data
+from scraper.handlers import set_download_handlers
+from scraper.items import ProxyRecord
+from scraper.types import ElementPathsTypedDict, RequestMetaTypedDict
+
+if TYPE_CHECKING:
+    from playwright.async_api import Page, Route
+    from playwright.async_api import Request as PlaywrightRequest
+
+    from scraper.offload import ParseExecutor
+
+# item field -> the `BaseSpider` method that parses it from a row
+FIELD_PARSERS = {
+    "ip": "parse_ip_address",
+    "port": "parse_port",
+    "protocol": "parse_protocol",
+    "country": "parse_country",
+    "anonymity": "parse_anonymity",
+}
+# the `BaseSpider` methods the `parse_*` methods extract with, a `FieldExtractor` inlines them
+EXTRACTION_HOOKS = ("get_data", "get_pattern", "match_data")
+Extractors = dict[str, Callable[[Selector], Any]]
+
+
+class ExtractionObserver(Protocol):
+    """Told about the pages `BaseSpider.extract_rows` parses, set as a spider's `extraction_observer`."""
+
+    def rows_selected(self, spider: "BaseSpider", rows: int, seconds: float) -> None:
+        """`rows` were selected from a page in `seconds`."""
+
+    def page_extractors(self, spider: "BaseSpider", extractors: Extractors) -> Extractors:
+        """Return the field extractors to parse the rows of the page with, e.g. timed `extractors`."""
 
 
 class BaseSpider(scrapy.Spider):  # type: ignore
     start_urls: list[str] | None = None  # must be set in subclass
+    item_class: Callable[..., Any] = ProxyRecord  # or the dict-backed `ProxyItem`
     render_to_file = False  # for debugging
-    use_flaresolverr = False  # for cloudflare challenge
+    use_flaresolverr = False  # for cloudflare challenge, see `FlareSolverrMiddleware`
     use_playwright = False  # for JS rendering
+    deobfuscate = False  # evaluate the inline scripts writing the rows instead, rendering only when that fails
+    lean_render = True  # only load what is needed to read the rows when rendering
+    render_blocked_resource_types = frozenset({"image", "media", "font", "stylesheet", "texttrack", "manifest"})
+    render_allowed_hosts: tuple[str, ...] = ()  # third-party hosts the page needs, besides `allowed_domains`
+    extraction_observer: ExtractionObserver | None = None  # e.g. `MetricsExtension`, timing the extraction
 
     def __init__(self, name: str = None, **kwargs: Any) -> None:  # type: ignore[assignment]
         super().__init__(name=name, **kwargs)
         self.paths: ElementPathsTypedDict = self.set_element_paths()
+        self.fields: dict[str, FieldExtractor] = {field: self.compile_field(field) for field in FIELD_PARSERS}
+        self.extractors: Extractors = self.compile_extractors()
         self.ua: str = kwargs.get("ua", None)
         self.headers: dict[str, Any] = kwargs.get("headers", None)
         self.meta: RequestMetaTypedDict = kwargs.get("meta", None)
         self.cookies: dict[str, str] | list[dict[str, str]] = kwargs.get("cookies", None)
+        self.arguments: dict[str, Any] = {}  # see `from_crawler`
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler, *args: Any, **kwargs: Any) -> Self:
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.arguments = kwargs  # the spider arguments, to create the spider of a `PARSE_EXECUTOR` process
+        if spider.use_playwright and not cls.use_playwright:  # turned on by an argument, settings are not frozen yet
+            set_download_handlers(crawler.settings, True)
+        return spider  # type: ignore[no-any-return]
+
+    @classmethod
+    def update_settings(cls, settings: Settings) -> None:
+        super().update_settings(settings)
+        set_download_handlers(settings, cls.use_playwright or cls.deobfuscate)
 
     def start_requests(self) -> Generator[scrapy.Request, Any, None]:
         if not self.start_urls:
             raise AttributeError("Crawling could not start: 'start_urls' not found or empty.")
         if isinstance(self.start_urls, str):
             self.start_urls = [self.start_urls]
-        if self.use_flaresolverr:
-            self.solve_challenge(self.start_urls[0])  # solve the challenge before crawling
 
         callback, cb_kwargs = self.get_callback()
         for url in self.start_urls:
@@ -49,35 +102,22 @@ class BaseSpider(scrapy.Spider):  # type: ignore
                 cb_kwargs=cb_kwargs,
             )
 
-    def solve_challenge(self, url: str, **kwargs: Any) -> dict[str, str] | list[dict[str, str]] | None:
-        if "FLARESOLVERR_URL" not in self.settings:
-            self.log("FLARESOLVERR_URL not found in settings.py")
-            return None
-
-        response = requests.post(
-            self.settings["FLARESOLVERR_URL"],
-            json={"cmd": "request.get", "url": url},
-            allow_redirects=True,
-            **kwargs,
-        )
-        if not response.ok:
-            self.log(f"FlareSolverr error: {response.text}")
-            return None
+    def get_callback(self) -> tuple[Callable, dict[str, Any] | None]:  # type: ignore[type-arg]
+        """Return a tuple of callback function and callback keyword arguments."""
+        return self.get_parse_callback(), None
 
-        data: FlareSolverrResponseTypedDict = response.json()
-        if solution := data.get("solution"):
-            if "userAgent" in solution:
-                self.ua = solution["userAgent"]
-            if "cookies" in solution:
-                self.cookies = data["solution"]["cookies"]
-                return self.cookies
+    def get_parse_callback(self) -> Callable:  # type: ignore[type-arg]
+        """Return the callback of the pages with rows, `parse_offloaded` with a `parse_executor`."""
+        return self.parse if self.parse_executor is None else self.parse_offloaded
 
-        self.log(f"FlareSolverr error: either solution or cookies not found: {data}")
-        return None
+    @property
+    def parse_executor(self) -> "ParseExecutor | None":
+        """The pool extracting the rows off the reactor, None to extract them in `parse` (`PARSE_EXECUTOR`)."""
+        if (crawler := getattr(self, "crawler", None)) is None:
+            return None
+        from scraper.offload import ParseExecutor
 
-    def get_callback(self) -> tuple[Callable, dict[str, Any] | None]:  # type: ignore[type-arg]
-        """Return a tuple of callback function and callback keyword arguments."""
-        return self.parse, None
+        return ParseExecutor.from_crawler(crawler)
 
     def get_cookies(self) -> dict[str, str] | list[dict[str, str]] | None:
         return self.cookies
@@ -95,9 +135,45 @@ class BaseSpider(scrapy.Spider):  # type: ignore
     def get_meta(self, **kwargs: Any) -> RequestMetaTypedDict:
         """Return a `RequestMetaTypedDict` of meta data for the request."""
         if not self.meta:
-            self.meta = {"playwright": self.use_playwright, **kwargs}
+            render_meta = self.get_render_meta() if self.use_playwright else {}
+            self.meta = {"playwright": self.use_playwright, **render_meta, **kwargs}
         return self.meta
 
+    def get_render_meta(self) -> dict[str, Any]:
+        """Return the scrapy-playwright meta of the lean rendering profile.
+
+        Pages stop waiting at DOMContentLoaded and then only wait for the rows to be attached,
+        while `init_render_page` aborts resources that are not needed to read them.
+        """
+        if not self.lean_render:
+            return {}
+        from scrapy_playwright.page import PageMethod
+
+        methods = [PageMethod("wait_for_selector", f"xpath={self.paths['rows']}", state="attached")]
+        return {
+            "playwright_page_init_callback": self.init_render_page,
+            "playwright_page_goto_kwargs": {"wait_until": "domcontentloaded"},
+            "playwright_page_methods": methods if self.paths.get("rows") else [],
+        }
+
+    async def init_render_page(self, page: "Page", request: Request) -> None:
+        await page.route("**/*", self.route_render_request)
+
+    async def route_render_request(self, route: "Route", request: "PlaywrightRequest") -> None:
+        """Abort blocked resource types and third-party requests, hand the rest to scrapy-playwright."""
+        if not request.is_navigation_request() and self.is_blocked_resource(request.resource_type, request.url):
+            self.crawler.stats.inc_value("playwright/request_count/blocked")
+            await route.abort()
+        else:
+            await route.fallback()
+
+    def is_blocked_resource(self, resource_type: str, url: str) -> bool:
+        if resource_type in self.render_blocked_resource_types:
+            return True
+        host = urlsplit(url).hostname or ""
+        first_party = (*(self.allowed_domains or ()), *self.render_allowed_hosts)
+        return bool(first_party) and not any(host == domain or host.endswith(f".{domain}") for domain in first_party)
+
     def set_element_paths(self) -> ElementPathsTypedDict:
         """Return a `ElementPathsTypedDict` of path elements for selectors.
 
@@ -117,23 +193,113 @@ class BaseSpider(scrapy.Spider):  # type: ignore
         # write the response to a file for debugging
         Path(f"{self.name}.html").write_bytes(response.body)
 
-    def parse(self, response: TextResponse, **kwargs: Any) -> Generator[dict[str, Any], Any, None]:
-        """Parse the response and return a generator of ProxyItem."""
+    def compile_extractors(self) -> Extractors:
+        """Return a mapping of item field -> row extractor, compiled once per spider.
+
+        Fields whose `parse_*` method is overridden in a subclass use the bound method,
+        all other fields use the precompiled `FieldExtractor` from `self.fields`. A subclass
+        overriding one of the `EXTRACTION_HOOKS` gets the bound methods for every field, which
+        call the hooks for every row as the `FieldExtractor` does not.
+        """
+        cls = type(self)
+        hooked = any(getattr(cls, hook) is not getattr(BaseSpider, hook) for hook in EXTRACTION_HOOKS)
+        extractors: Extractors = {}
+        for field, method in FIELD_PARSERS.items():
+            if hooked or getattr(cls, method) is not getattr(BaseSpider, method):
+                extractors[field] = getattr(self, method)
+            else:
+                extractors[field] = self.fields[field]
+        return extractors
+
+    def compile_field(self, field: str) -> FieldExtractor:
+        """Return a `FieldExtractor` for `field` using its path from `self.paths`."""
+        xpath: str = self.paths.get(field, "")  # type: ignore[assignment]
+        pattern = self.get_pattern(field)
+        match field:
+            case "port":
+                return FieldExtractor(xpath, pattern, convert=int, default=0)  # 0 if no port is found
+            case "country":
+                return FieldExtractor(xpath, pattern, normalize=str.upper)
+            case "protocol" | "anonymity":
+                return FieldExtractor(xpath, pattern, normalize=str.lower)
+            case _:
+                return FieldExtractor(xpath, pattern)
+
+    def parse(self, response: TextResponse, **kwargs: Any) -> Generator[dict[str, Any] | Request, Any, None]:
+        """Parse the response and return a generator of `item_class` items.
+
+        With `deobfuscate`, a page that was not rendered is parsed once its scripts are decoded,
+        or rendered if they could not be, see `render_instead`.
+        """
+        prepared = self.prepare_response(response)
+        if isinstance(prepared, Request):
+            yield prepared
+        elif prepared is not None:
+            yield from self.extract_rows(prepared, **kwargs)
+
+    async def parse_offloaded(self, response: TextResponse, **kwargs: Any) -> AsyncGenerator[Any, None]:
+        """`parse` with the rows extracted in the `PARSE_EXECUTOR` pool, streamed back in chunks."""
+        prepared = self.prepare_response(response)
+        if isinstance(prepared, Request):
+            yield prepared
+        elif prepared is not None:
+            async for item in self.parse_executor.stream(self, "extract_rows", prepared, **kwargs):  # type: ignore[union-attr]
+                yield item
+
+    def prepare_response(self, response: TextResponse) -> TextResponse | Request | None:
+        """Return the response to extract the rows from, its request to render instead, or None to skip it."""
+        if self.deobfuscate and not response.meta.get("playwright"):
+            from scraper.deobfuscate import DeobfuscationError, decode_scripts
+
+            try:
+                response, decoded = decode_scripts(response)
+            except DeobfuscationError as e:
+                return self.render_instead(response, str(e))
+            if not decoded:
+                return self.render_instead(response, "no script writes to the page")
+
         if self.render_to_file:
             self.write_to_file(response)
-            return
-
-        rows = self.get_rows(response, self.paths["rows"])
+            return None
+        return response
+
+    def extract_rows(self, response: TextResponse, **kwargs: Any) -> Generator[Any, Any, None]:
+        """Return a generator of the `item_class` items of the rows of `response`."""
+        if (observer := self.extraction_observer) is None:
+            rows = self.get_rows(response, self.paths["rows"])
+            extractors = tuple(self.extractors.items())
+        else:
+            start = time.perf_counter()
+            rows = self.get_rows(response, self.paths["rows"])
+            observer.rows_selected(self, len(rows), time.perf_counter() - start)
+            extractors = tuple(observer.page_extractors(self, self.extractors).items())
+        item_class = self.item_class
+        debug = self.logger.isEnabledFor(logging.DEBUG)
 
         for r in rows:
-            yield ProxyItem(
-                ip=self.parse_ip_address(r),
-                port=self.parse_port(r),
-                protocol=self.parse_protocol(r),
-                country=self.parse_country(r),
-                anonymity=self.parse_anonymity(r),
-                source=self.name,
-            )
+            item = item_class(**{field: extract(r) for field, extract in extractors}, source=self.name)
+            if debug:
+                self.logger.debug("Extracted %r", item)
+            yield item
+
+    def render_instead(self, response: TextResponse, reason: str) -> Request:
+        """Return the request of `response` to be rendered by Playwright, its scripts could not be decoded."""
+        self.logger.warning("Rendering %s, its scripts could not be decoded: %s", response, reason)
+        if crawler := getattr(self, "crawler", None):
+            crawler.stats.inc_value("deobfuscate/rendered")
+        request = response.request or Request(response.url, callback=self.get_parse_callback())
+        meta = {**request.meta, **self.get_render_meta(), "playwright": True}  # cached apart from the plain page
+        return request.replace(meta=meta, dont_filter=True)
+
+    def parse_text_list(self, response: Response, **fields: Any) -> Generator[dict[str, Any], Any, None]:
+        """Parse a plain-text `ip:port` list and return a generator of `item_class` items.
+
+        The raw body is scanned as bytes, blank and malformed lines are skipped.
+        `fields` (e.g. protocol, anonymity) are set on every item.
+        """
+        item_class = self.item_class
+        for ip, port in iter_proxy_lines(response.body):
+            yield item_class(ip=ip, port=port, **fields, source=self.name)
 
     def get_rows(self, response: TextResponse, xpath: str | None = None) -> SelectorList[Selector]:
         return response.xpath(xpath or self.paths["rows"])
@@ -145,24 +311,15 @@ class BaseSpider(scrapy.Spider):  # type: ignore
     def get_data(self, row: Selector, xpath: str, many: Literal[True]) -> list[str]: ...
 
     def get_data(self, row: Selector, xpath: str, many: bool = False) -> str | list[str]:
-        selector = row.xpath(xpath)
-        data = selector.getall() if many else selector.get(default="")
-        self.logger.debug(f"[{xpath=}] {selector=} {data=}")
-        return data  # type: ignore[no-any-return]
+        data = xpath_data(row, compile_xpath(xpath), many=many)
+        self.logger.debug("[xpath=%r] data=%r", xpath, data)
+        return data
 
     def get_pattern(self, pattern_for: str) -> str:
-        patterns = {
-            "ip": r"\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}",
-            "port": r"\d{1,5}",
-            "protocol": r"http|https|socks4|socks5",
-            "country": r"[A-Z]{2}",
-            "anonymity": r"anonymous|elite|transparent",
-        }
-        return patterns.get(pattern_for, r"")
+        return PATTERNS.get(pattern_for, r"")
 
     def match_data(self, data: str, pattern: str) -> str:
-        regex = re.compile(pattern)
-        if match := regex.search(data):
+        if match := compile_pattern(pattern).search(data):
             return match.group(0)
         return ""
 
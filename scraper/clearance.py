@@ -0,0 +1,119 @@
+import contextlib
+import fcntl
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, TypedDict
+
+from scrapy.http import Response
+from twisted.internet.defer import Deferred
+from twisted.internet.threads import deferToThread
+
+from scraper.types import FlareSolverrSolutionTypedDict
+
+CHALLENGE_STATUSES = {403, 429, 503}
+CHALLENGE_MARKERS = (b"/cdn-cgi/challenge-platform/", b"<title>Just a moment...</title>")
+
+
+class ClearanceTypedDict(TypedDict):
+    """TypedDict for a cached FlareSolverr clearance of a domain."""
+
+    cookies: list[dict[str, Any]]
+    user_agent: str
+    solved_at: float
+    expires: float
+
+
+def is_challenge(response: Response) -> bool:
+    """Return True if `response` is a Cloudflare challenge page instead of the requested content."""
+    if response.status not in CHALLENGE_STATUSES:
+        return False
+    if response.headers.get(b"cf-mitigated") == b"challenge":
+        return True
+    head = response.body[:16384]
+    return any(marker in head for marker in CHALLENGE_MARKERS)
+
+
+def to_clearance(solution: FlareSolverrSolutionTypedDict, ttl: float) -> ClearanceTypedDict:
+    """Return the clearance of a FlareSolverr `solution`, valid for `ttl` seconds or until a cookie expires."""
+    cookies = solution["cookies"]
+    if isinstance(cookies, dict):
+        cookies = [{"name": name, "value": value} for name, value in cookies.items()]
+    now = time.time()
+    expiries = [float(c["expiry"]) for c in cookies if c.get("expiry")]  # session cookies have no expiry
+    return {
+        "cookies": cookies,
+        "user_agent": solution["userAgent"],
+        "solved_at": now,
+        "expires": min([now + ttl, *expiries]),
+    }
+
+
+def cookie_header(cookies: list[dict[str, Any]]) -> str:
+    return "; ".join(f"{c['name']}={c['value']}" for c in cookies)
+
+
+class ClearanceCache:
+    """Clearances keyed by domain in a JSON file, shared by the spiders and processes using the same file.
+
+    The file is read when the cache is created and again, in a thread, before a new clearance is
+    solved (see `refresh`), so looking up a clearance never touches the disk. Changes are written
+    in a thread, under a lock on the file shared with the other processes.
+    """
+
+    def __init__(self, path: str | Path | None = None) -> None:
+        self.path = Path(path) if path else None
+        self.entries: dict[str, ClearanceTypedDict] = self.load()
+
+    def get(self, domain: str) -> ClearanceTypedDict | None:
+        """Return the clearance of `domain` if it did not expire."""
+        entry = self.entries.get(domain)
+        return entry if entry is not None and entry["expires"] > time.time() else None
+
+    def refresh(self) -> Deferred[None]:
+        """Add the clearances solved elsewhere since the file was read, read in a thread."""
+
+        def update(entries: dict[str, ClearanceTypedDict]) -> None:
+            for domain, entry in entries.items():
+                if domain not in self.entries or self.entries[domain]["solved_at"] < entry["solved_at"]:
+                    self.entries[domain] = entry
+
+        return deferToThread(self.load).addCallback(update)  # type: ignore[no-untyped-call,no-any-return]
+
+    def set(self, domain: str, clearance: ClearanceTypedDict) -> Deferred[None]:
+        self.entries[domain] = clearance
+        return deferToThread(self.save, domain, clearance)  # type: ignore[no-untyped-call,no-any-return]
+
+    def delete(self, domain: str, solved_at: float | None = None) -> Deferred[None]:
+        """Forget the clearance of `domain`, only if it is the one solved at `solved_at` when given."""
+        entry = self.entries.get(domain)
+        if entry is not None and solved_at in (None, entry["solved_at"]):
+            del self.entries[domain]
+        return deferToThread(self.save, domain, None, solved_at)  # type: ignore[no-untyped-call,no-any-return]
+
+    def load(self) -> dict[str, ClearanceTypedDict]:
+        if self.path is None:
+            return {}
+        with contextlib.suppress(OSError, ValueError):
+            entries: dict[str, ClearanceTypedDict] = json.loads(self.path.read_bytes())
+            now = time.time()
+            return {domain: entry for domain, entry in entries.items() if entry["expires"] > now}
+        return {}
+
+    def save(self, domain: str, clearance: ClearanceTypedDict | None, solved_at: float | None = None) -> None:
+        """Update `domain` in what other processes saved to the file meanwhile, then replace it atomically."""
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_suffix(self.path.suffix + ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            entries = self.load()
+            if clearance is not None:
+                entries[domain] = clearance
+            elif domain in entries and solved_at in (None, entries[domain]["solved_at"]):
+                del entries[domain]
+            tmp = self.path.with_suffix(f"{self.path.suffix}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps(entries))
+            tmp.replace(self.path)
@@ -0,0 +1,20 @@
+from argparse import Namespace
+
+from scrapy.commands.crawl import Command as CrawlCommand
+
+from scraper.spiders.all import AllSpider
+
+
+class Command(CrawlCommand):  # type: ignore[misc]
+    """`scrapy crawlall [spider ...]`, the same as `scrapy crawl all [-a spiders=...]`."""
+
+    def syntax(self) -> str:
+        return "[options] [spider ...]"
+
+    def short_desc(self) -> str:
+        return "Run all spiders (or the given ones) in a single crawl with merged items"
+
+    def run(self, args: list[str], opts: Namespace) -> None:
+        if args:
+            opts.spargs["spiders"] = ",".join(args)
+        super().run([AllSpider.name], opts)
@@ -0,0 +1,330 @@
+"""Evaluate the inline scripts that hide proxies from the static HTML, without a browser or a JS engine.
+
+Proxy sites write the IP (proxynova) or the port (spys.one) with `document.write`, from string
+tricks (`atob`, `substr`, `split("").reverse().join("")`, ...) or from variables XOR'd together,
+which a script in the page defines (packed with Dean Edwards' packer on spys.one, see `unpack`).
+`decode_scripts` replaces every such script with what it
+writes, so the page reads like the rendered one. Only a tiny, side-effect free subset of JS is
+understood: number and string literals, variables, `+ - ^`, parentheses, a few string methods
+and functions, assignments and `document.write`. Anything else raises `DeobfuscationError`.
+"""
+
+import base64
+import re
+from collections.abc import Callable
+from typing import Any
+
+from scrapy.http import TextResponse
+
+Value = int | str | list[str]
+
+TOKEN = re.compile(
+    r"""(?P<number>0[xX][0-9a-fA-F]+|\d+)
+    |(?P<string>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')
+    |(?P<name>[A-Za-z_$][\w$]*)
+    |(?P<punct>[-+^=(),.;\[\]])
+    |(?P<error>\S)""",
+    re.VERBOSE,
+)
+ESCAPE = re.compile(r"\\(x[0-9a-fA-F]{2}|u[0-9a-fA-F]{4}|.)", re.DOTALL)
+ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f", "v": "\v", "0": "\0"}
+SCRIPT = re.compile(r"<script\b([^>]*)>(.*?)</script\s*>", re.DOTALL | re.IGNORECASE)
+ASSIGNMENT = re.compile(r"\s*[A-Za-z_$][\w$]*\s*=[^=]")  # a script starting like `a1b2=...`
+# Dean Edwards' packer, `eval(function(p,a,c,k,e,d){...}('payload',radix,count,'words'.split('|'),0,{}))`
+PACKED = re.compile(
+    r"""^eval\(function\(p,\w,\w,\w,\w,\w\).*?\}\s*\(\s*'((?:[^'\\]|\\.)*)'\s*,\s*(\d+)\s*,\s*\d+\s*,"""
+    r"""\s*'((?:[^'\\]|\\.)*)'\.split\(\s*'((?:[^'\\]|\\.)*)'\s*\)""",
+    re.DOTALL,
+)
+PACKER_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+MAX_SCRIPT_SIZE = 64 * 1024  # larger inline scripts are libraries, not obfuscation
+MAX_REPEAT = 1024
+MAX_DEPTH = 100  # nested operands of an expression, far below Python's recursion limit
+
+
+class DeobfuscationError(ValueError):
+    """A script is not (only) made of what `Interpreter.run` understands."""
+
+
+def unescape(literal: str) -> str:
+    def replace(match: re.Match[str]) -> str:
+        escape = match.group(1)
+        if escape[0] in "xu" and len(escape) > 1:
+            return chr(int(escape[1:], 16))
+        return ESCAPES.get(escape, escape)
+
+    return ESCAPE.sub(replace, literal[1:-1])
+
+
+def tokenize(script: str) -> list[tuple[str, str]]:
+    """Return the `(kind, text)` tokens of `script`, kind being number, string, name or punct."""
+    tokens = [(match.lastgroup or "", match.group()) for match in TOKEN.finditer(script)]
+    for kind, text in tokens:
+        if kind == "error":
+            raise DeobfuscationError(f"Unexpected {text!r}")
+    return tokens
+
+
+def unpack(script: str) -> str:
+    """Return the code of a `PACKED` script, its words replaced back the way the packer's `eval` would."""
+    if (match := PACKED.match(script)) is None:
+        raise DeobfuscationError("Not a packed script")
+    payload, radix, words, separator = match.group(1), int(match.group(2)), *match.group(3, 4)
+    keywords = unescape(f"'{words}'").split(unescape(f"'{separator}'"))
+    if not 2 <= radix <= len(PACKER_DIGITS):
+        raise DeobfuscationError(f"Unsupported packer radix {radix}")
+
+    def lookup(match: re.Match[str]) -> str:
+        word, index = match.group(0), 0
+        for digit in word:
+            if (value := PACKER_DIGITS.find(digit)) < 0 or value >= radix:
+                return word
+            index = index * radix + value
+        return keywords[index] if index < len(keywords) and keywords[index] else word
+
+    return re.sub(r"\b\w+\b", lookup, unescape(f"'{payload}'"))
+
+
+def to_int32(value: Value) -> int:
+    if isinstance(value, list):
+        raise DeobfuscationError("Not a number: an array")
+    try:
+        number = int(value) if isinstance(value, int) else int(value.strip() or 0)
+    except ValueError as e:
+        raise DeobfuscationError(f"Not a number: {value!r}") from e
+    number &= 0xFFFFFFFF
+    return number - (1 << 32) if number >= 1 << 31 else number
+
+
+def to_str(value: Value) -> str:
+    return ",".join(value) if isinstance(value, list) else str(value)
+
+
+def substr(text: str, start: int, length: int | None = None) -> str:
+    start = max(len(text) + start, 0) if start < 0 else start
+    return text[start:] if length is None else text[start : start + max(length, 0)]
+
+
+def substring(text: str, start: int, end: int | None = None) -> str:
+    start, end = max(start, 0), len(text) if end is None else max(end, 0)
+    return text[min(start, end) : max(start, end)]
+
+
+def atob(text: str) -> str:
+    try:
+        return base64.b64decode(text, validate=True).decode("latin-1")
+    except ValueError as e:
+        raise DeobfuscationError(f"Not base64: {text!r}") from e
+
+
+def repeat(text: str, count: int) -> str:
+    if not 0 <= count <= MAX_REPEAT:
+        raise DeobfuscationError(f"Repeat count out of range: {count}")
+    return text * count
+
+
+STRING_METHODS: dict[str, Callable[..., Value]] = {
+    "charAt": lambda text, index=0: text[index] if 0 <= index < len(text) else "",
+    "concat": lambda text, *others: text + "".join(to_str(other) for other in others),
+    "repeat": repeat,
+    "replace": lambda text, old, new: text.replace(str(old), str(new), 1),
+    "slice": lambda text, start=0, end=None: text[start:end],
+    "split": lambda text, separator=None: (
+        [text] if separator is None else list(text) if separator == "" else text.split(str(separator))
+    ),
+    "substr": substr,
+    "substring": substring,
+    "toLowerCase": str.lower,
+    "toString": str,
+    "toUpperCase": str.upper,
+    "trim": str.strip,
+}
+LIST_METHODS: dict[str, Callable[..., Value]] = {
+    "join": lambda items, separator=",": str(separator).join(items),
+    "reverse": lambda items: items[::-1],
+}
+FUNCTIONS: dict[str, Callable[..., Value]] = {
+    "atob": atob,
+    "parseInt": lambda text, base=10: int(str(text).strip(), base),
+    "String.fromCharCode": lambda *codes: "".join(chr(to_int32(code) & 0xFFFF) for code in codes),
+}
+
+
+class Interpreter:
+    """Runs `ident = expression;` and `document.write(expression);` statements over `variables`."""
+
+    def __init__(self, variables: dict[str, Value] | None = None) -> None:
+        self.variables: dict[str, Value] = variables if variables is not None else {}
+        self.tokens: list[tuple[str, str]] = []
+        self.position = 0
+        self.depth = 0
+        self.assignments = 0
+
+    def run(self, script: str) -> str:
+        """Run `script` and return what it writes, the variables it assigns are kept for the next ones."""
+        try:
+            return self.statements(script)
+        except DeobfuscationError:
+            raise
+        except (ValueError, RecursionError) as e:  # not raised by a rule of its own
+            raise DeobfuscationError(f"Cannot run the script: {e!r}") from e
+
+    def statements(self, script: str) -> str:
+        self.tokens, self.position, self.depth = tokenize(script), 0, 0
+        written = []
+        while self.peek():
+            if self.accept(";"):
+                continue
+            kind, text = self.next()
+            if kind != "name":
+                raise DeobfuscationError(f"Unexpected {text!r}")
+            if text == "document":
+                self.expect(".")
+                self.expect("write")
+                self.expect("(")
+                written.append(to_str(self.expression()))
+                self.expect(")")
+            elif self.accept("="):
+                self.variables[text] = self.expression()
+                self.assignments += 1
+            else:
+                raise DeobfuscationError(f"Unexpected statement {text!r}")
+            if self.peek() and not self.accept(";"):
+                raise DeobfuscationError(f"Unexpected {self.peek()!r}")
+        return "".join(written)
+
+    def expression(self) -> Value:
+        value = self.additive()
+        while self.accept("^"):
+            value = to_int32(value) ^ to_int32(self.additive())
+        return value
+
+    def additive(self) -> Value:
+        value = self.postfix()
+        while (operator := self.peek()) in ("+", "-"):
+            self.next()
+            other = self.postfix()
+            if operator == "+" and not (isinstance(value, int) and isinstance(other, int)):
+                value = to_str(value) + to_str(other)
+            else:
+                value = to_int32(value) + to_int32(other) if operator == "+" else to_int32(value) - to_int32(other)
+        return value
+
+    def postfix(self) -> Value:
+        value = self.primary()
+        while True:
+            if self.accept("."):
+                kind, method = self.next()
+                methods = LIST_METHODS if isinstance(value, list) else STRING_METHODS
+                if kind != "name" or method not in methods:
+                    raise DeobfuscationError(f"Unknown method {method!r}")
+                value = self.call(methods[method], to_str(value) if isinstance(value, int) else value)
+            elif self.accept("["):
+                index = to_int32(self.expression())
+                self.expect("]")
+                sequence = to_str(value) if isinstance(value, int) else value
+                value = sequence[index] if 0 <= index < len(sequence) else ""
+            else:
+                return value
+
+    def primary(self) -> Value:
+        if self.depth >= MAX_DEPTH:
+            raise DeobfuscationError(f"Expression nested deeper than {MAX_DEPTH}")
+        self.depth += 1
+        try:
+            return self.operand()
+        finally:
+            self.depth -= 1
+
+    def operand(self) -> Value:
+        kind, text = self.next()
+        if kind == "number":  # decimal, even with leading zeros, or hexadecimal
+            return int(text[2:], 16) if text[:2] in ("0x", "0X") else int(text, 10)
+        if kind == "string":
+            return unescape(text)
+        if text == "-":
+            return -to_int32(self.postfix())
+        if text == "(":
+            value = self.expression()
+            self.expect(")")
+            return value
+        if kind == "name":
+            if text == "String" and self.accept("."):
+                text = f"String.{self.next()[1]}"
+            if text in FUNCTIONS:
+                return self.call(FUNCTIONS[text])
+            if text in self.variables:
+                return self.variables[text]
+            raise DeobfuscationError(f"Undefined {text!r}")
+        raise DeobfuscationError(f"Unexpected {text!r}")
+
+    def call(self, function: Callable[..., Value], *args: Any) -> Value:
+        self.expect("(")
+        arguments = list(args)
+        while not self.accept(")"):
+            if len(arguments) > len(args) and not self.accept(","):
+                raise DeobfuscationError(f"Unexpected {self.peek()!r}")
+            arguments.append(self.expression())
+        try:
+            return function(*arguments)
+        except (TypeError, ValueError, IndexError) as e:
+            raise DeobfuscationError(f"Bad call: {e}") from e
+
+    def peek(self) -> str:
+        return self.tokens[self.position][1] if self.position < len(self.tokens) else ""
+
+    def next(self) -> tuple[str, str]:
+        if self.position >= len(self.tokens):
+            raise DeobfuscationError("Unexpected end of script")
+        self.position += 1
+        return self.tokens[self.position - 1]
+
+    def accept(self, text: str) -> bool:
+        if self.peek() == text:
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, text: str) -> None:
+        if not self.accept(text):
+            raise DeobfuscationError(f"Expected {text!r} instead of {self.peek()!r}")
+
+
+def decode_scripts(response: TextResponse) -> tuple[TextResponse, int]:
+    """Return `response` with its inline scripts replaced by what they write, and how many wrote something.
+
+    Scripts are run in page order sharing their variables. Scripts that are not understood are
+    kept as they are, unless they write to the document, which raises `DeobfuscationError`.
+    """
+    interpreter = Interpreter()
+    decoded = 0
+    # (assignments run so far, script) -> what it wrote, the rows repeat the same scripts. The count
+    # stands for the variables, a script writes the same again as long as nothing was assigned since
+    outputs: dict[tuple[int, str], str] = {}
+
+    def replace(match: re.Match[str]) -> str:
+        nonlocal decoded
+        attributes, script = match.groups()
+        script = script.strip().removeprefix("<!--").removesuffix("-->")
+        if "src=" in attributes.lower() or len(script) > MAX_SCRIPT_SIZE:
+            return match.group(0)
+        packed = script.startswith("eval(function(p,")
+        if not packed and "document.write" not in script and not ASSIGNMENT.match(script):
+            return match.group(0)
+        assignments = interpreter.assignments
+        if (written := outputs.get((assignments, script))) is not None:
+            decoded += bool(written)
+            return written
+        try:
+            written = interpreter.run(unpack(script) if packed else script)
+        except (ValueError, RecursionError) as e:  # `DeobfuscationError` included
+            if packed or "document.write" in script:
+                raise e if isinstance(e, DeobfuscationError) else DeobfuscationError(f"Cannot unpack: {e!r}") from e
+            return match.group(0)  # not an obfuscation script, e.g. analytics
+        if interpreter.assignments == assignments:  # a script assigning something may not write the same again
+            outputs[assignments, script] = written
+        decoded += bool(written)
+        return written
+
+    text = SCRIPT.sub(replace, response.text)
+    return response.replace(body=text.encode(response.encoding)), decoded
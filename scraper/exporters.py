@@ -0,0 +1,76 @@
+import os
+import struct
+from pathlib import Path
+from typing import IO, Any
+
+from itemadapter import ItemAdapter
+from scrapy import Spider
+from scrapy.exporters import BaseItemExporter
+from scrapy.extensions.feedexport import FileFeedStorage
+
+MAX_NAME_BYTES = 255  # of a file name, on most filesystems
+
+
+class SnapshotItemExporter(BaseItemExporter):  # type: ignore[misc]
+    """Feed exporter of packed binary proxy snapshots (format `proxysnap`), see `scraper.snapshot`.
+
+    The snapshot is written when the feed is closed, proxies without an IPv4 address are skipped.
+    """
+
+    def __init__(self, file: IO[bytes], **kwargs: Any) -> None:
+        from scraper.snapshot import SnapshotWriter  # Scrapy loads every exporter, this one is seldom used
+
+        super().__init__(dont_fail=True, **kwargs)
+        self.file = file
+        self.writer = SnapshotWriter()
+
+    def export_item(self, item: Any) -> None:
+        adapter = ItemAdapter(item)
+        try:
+            self.writer.add(
+                adapter.get("ip") or "",
+                adapter.get("port") or 0,
+                protocol=adapter.get("protocol") or "",
+                anonymity=adapter.get("anonymity") or "",
+                country=adapter.get("country") or "",
+                source=adapter.get("source") or "",
+                latency=adapter.get("latency"),
+            )
+        except (OSError, struct.error):
+            pass
+
+    def finish_exporting(self) -> None:
+        self.file.write(self.writer.to_bytes())
+
+
+def temporary_path(path: Path) -> Path:
+    """Return the temporary file next to `path`, its name cut on a character to fit `MAX_NAME_BYTES`."""
+    suffix = f".{os.getpid()}.tmp"
+    name = path.name.encode()[: MAX_NAME_BYTES - len(suffix)].decode(errors="ignore")
+    return path.with_name(name + suffix)
+
+
+class AtomicFileFeedStorage(FileFeedStorage):  # type: ignore[misc]
+    """Local file feed storage of the `atomic` URI scheme, e.g. `atomic:///var/lib/proxies.bin` or `atomic:proxies.bin`.
+
+    The feed is written to a temporary file next to it and renamed over it once complete, so readers
+    (e.g. a memory-mapped `scraper.snapshot.ProxySnapshot`) never see a partly written feed. It is
+    always overwritten.
+    """
+
+    def __init__(self, uri: str, *, feed_options: dict[str, Any] | None = None) -> None:
+        path = uri.split(":", 1)[1]
+        super().__init__(f"file:{path}" if path.startswith("//") else path, feed_options=feed_options)
+
+    def open(self, spider: Spider) -> IO[Any]:
+        path = Path(self.path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return temporary_path(path).open("wb")
+
+    def store(self, file: IO[Any]) -> None:
+        file.close()
+        try:
+            os.replace(file.name, self.path)
+        except OSError:
+            Path(file.name).unlink(missing_ok=True)
+            raise
@@ -0,0 +1,280 @@
+import json
+import os
+import random
+import socket
+import time
+from collections.abc import Callable, Mapping
+from pathlib import Path
+from typing import Any, Self
+
+from scrapy import Item, Request, Spider, signals
+from scrapy.crawler import Crawler
+from scrapy.exceptions import NotConfigured
+from scrapy.extensions.throttle import AutoThrottle
+from scrapy.http import Response
+from twisted.internet.defer import Deferred
+from twisted.internet.task import LoopingCall
+from twisted.internet.threads import deferToThread
+
+from scraper.base import FIELD_PARSERS, BaseSpider, Extractors
+from scraper.metrics import Histogram, Metrics, close_job, save_metrics
+from scraper.middlewares import proxy_invalid
+from scraper.scores import Observations, update_scores
+
+
+def timed(histogram: Histogram, function: Callable[..., Any]) -> Callable[..., Any]:
+    """Return `function` observing the seconds of every call that returns in `histogram`."""
+    clock = time.perf_counter
+
+    def call(*args: Any, **kwargs: Any) -> Any:
+        start = clock()
+        result = function(*args, **kwargs)
+        histogram.observe(clock() - start)
+        return result
+
+    return call
+
+
+def job_id(spider: Spider) -> str:
+    """Return the scrapyd job of the crawl, or the process id and start time when not run by scrapyd."""
+    return os.getenv("SCRAPYD_JOB") or getattr(spider, "_job", None) or f"{os.getpid()}-{int(time.time())}"
+
+
+class MetricsExtension:
+    """Per-spider timing histograms and counters of the crawl's hot paths, for the scrapyd `/metrics` resource.
+
+    Records the download time and response size per handler (http, playwright, flaresolverr), the
+    time to select the rows of a page and to parse every field of a row (as the spiders'
+    `extraction_observer`), the time items spend in the item pipelines from `MetricsPipeline` to
+    the item signals, and the rows, items, drops and items per second, see `scraper.metrics`.
+    Spiders of an `all` crawl are recorded as themselves. The metrics are written to
+    `METRICS_DIR/<job>.json` every `METRICS_FLUSH_INTERVAL` seconds and added to the totals of the
+    directory on close. Without `METRICS_DIR` nothing is observed or connected.
+    """
+
+    def __init__(self, crawler: Crawler, directory: str, interval: float = 15, field_sample_rate: float = 1.0) -> None:
+        self.crawler = crawler
+        self.directory = Path(directory)
+        self.path = self.directory / f"{os.getenv('SCRAPYD_JOB') or os.getpid()}.json"  # see `spider_opened`
+        self.interval = interval
+        self.field_sample_rate = field_sample_rate
+        self.metrics = Metrics()
+        self.flaresolverr_url = crawler.settings.get("FLARESOLVERR_URL") or ""
+        self.flusher = LoopingCall(self.flush)
+        self.flushed: tuple[float, dict[str, float]] = (time.monotonic(), {})  # when, items per spider
+        self.timed_extractors: dict[str, Extractors] = {}  # spider -> its extractors observing their calls
+        self.entered: dict[int, float] = {}  # id of an item in the item pipelines -> when it entered them
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler) -> Self:
+        settings = crawler.settings
+        if not (directory := settings.get("METRICS_DIR")):
+            raise NotConfigured("METRICS_DIR is not set")
+        extension = cls(
+            crawler,
+            directory,
+            interval=settings.getfloat("METRICS_FLUSH_INTERVAL", 15),
+            field_sample_rate=settings.getfloat("METRICS_FIELD_SAMPLE_RATE", 1.0),
+        )
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(extension.response_received, signal=signals.response_received)
+        crawler.signals.connect(extension.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(extension.item_dropped, signal=signals.item_dropped)
+        crawler.signals.connect(extension.item_error, signal=signals.item_error)
+        crawler.signals.connect(extension.proxy_invalid, signal=proxy_invalid)
+        return extension
+
+    def spider_opened(self, spider: Spider) -> None:
+        self.path = self.directory / f"{job_id(spider)}.json"
+        for member in getattr(spider, "spiders", None) or [spider]:  # the spiders of an `all` crawl
+            if isinstance(member, BaseSpider):
+                member.extraction_observer = self
+        self.flusher.start(self.interval, now=False)
+
+    def spider_closed(self, spider: Spider) -> Deferred[None]:
+        if self.flusher.running:
+            self.flusher.stop()
+        self.metrics.gauges.clear()
+        # waits for the lock of the totals, held while /metrics or other jobs update them
+        return deferToThread(close_job, self.path, self.metrics)  # type: ignore[no-untyped-call,no-any-return]
+
+    def flush(self) -> None:
+        now = time.monotonic()
+        since, before = self.flushed
+        items = {spider: v for (name, spider, _), v in self.metrics.counters.items() if name == "scraper_items_total"}
+        for spider, count in items.items():
+            self.metrics.set("scraper_items_per_second", spider, value=(count - before.get(spider, 0)) / (now - since))
+        self.flushed = (now, items)
+        save_metrics(self.path, self.metrics)
+
+    def rows_selected(self, spider: BaseSpider, rows: int, seconds: float) -> None:
+        self.metrics.histogram("scraper_extract_seconds", spider.name, "rows").observe(seconds)
+        self.metrics.inc("scraper_rows_total", spider.name, value=rows)
+
+    def page_extractors(self, spider: BaseSpider, extractors: Extractors) -> Extractors:
+        """Return `extractors` timed on a `METRICS_FIELD_SAMPLE_RATE` share of the pages, as is on the others.
+
+        Timing every call costs a few percent of the parsing.
+        """
+        if random.random() >= self.field_sample_rate:
+            return extractors
+        if (timed_extractors := self.timed_extractors.get(spider.name)) is None:
+            timed_extractors = self.timed_extractors[spider.name] = {
+                field: timed(self.metrics.histogram("scraper_extract_seconds", spider.name, FIELD_PARSERS[field]), f)
+                for field, f in extractors.items()
+            }
+        return timed_extractors
+
+    def item_entered(self, item: Any) -> None:
+        """Called by `MetricsPipeline`, the first item pipeline."""
+        self.entered[id(item)] = time.perf_counter()
+
+    def item_left(self, item: Any, spider: str, outcome: str) -> None:
+        if (start := self.entered.pop(id(item), None)) is not None:
+            self.metrics.histogram("scraper_pipeline_seconds", spider, outcome).observe(time.perf_counter() - start)
+
+    def item_scraped(self, item: Any, spider: Spider) -> None:
+        source = self.spider_of(item, spider)
+        self.metrics.inc("scraper_items_total", source)
+        self.item_left(item, source, "passed")
+
+    def item_dropped(self, item: Any, exception: BaseException, spider: Spider) -> None:
+        source = self.spider_of(item, spider)
+        reason = str(exception).split(":", 1)[0].lower() or "dropped"  # without the proxy
+        self.metrics.inc("scraper_items_dropped_total", source, reason)
+        self.item_left(item, source, reason)
+
+    def item_error(self, item: Any, spider: Spider) -> None:
+        source = self.spider_of(item, spider)
+        self.metrics.inc("scraper_items_dropped_total", source, "error")
+        self.item_left(item, source, "error")
+
+    def response_received(self, response: Response, request: Request, spider: Spider) -> None:
+        if self.flaresolverr_url and request.url.startswith(self.flaresolverr_url):
+            kind = "flaresolverr"
+        else:
+            kind = "playwright" if request.meta.get("playwright") else "http"
+        name = getattr(getattr(request.callback, "__self__", spider), "name", spider.name)
+        if (latency := request.meta.get("download_latency")) is not None:  # not for cached responses
+            self.metrics.histogram("scraper_download_seconds", name, kind).observe(latency)
+        self.metrics.histogram("scraper_response_bytes", name, kind).observe(len(response.body))
+
+    def proxy_invalid(self, item: Any, spider: Spider) -> None:
+        self.metrics.inc("scraper_items_dropped_total", self.spider_of(item, spider), "invalid proxy")
+
+    @staticmethod
+    def spider_of(item: Any, spider: Spider) -> str:
+        """Return the name of the spider that scraped `item`, its source rather than the `all` spider."""
+        source = getattr(item, "source", None)  # a `ProxyRecord`, faster than `get`
+        if source is None and isinstance(item, Mapping | Item):
+            source = item.get("source")
+        return source or spider.name  # type: ignore[no-any-return]
+
+
+class SlotAutoThrottle(AutoThrottle):  # type: ignore[misc]
+    """AutoThrottle keeping the "delay" and "concurrency" of the `DOWNLOAD_SLOTS` it throttles.
+
+    Scrapy's AutoThrottle holds every slot at `DOWNLOAD_DELAY` or more and aims at
+    `AUTOTHROTTLE_TARGET_CONCURRENCY`, so a slot given more concurrency and a shorter delay is
+    serial again after its first response. Such a slot is throttled between its own delay and
+    `AUTOTHROTTLE_MAX_DELAY`, aiming at its own concurrency.
+    """
+
+    def __init__(self, crawler: Crawler) -> None:
+        super().__init__(crawler)
+        self.slot_settings: dict[str, dict[str, Any]] = crawler.settings.getdict("DOWNLOAD_SLOTS")
+
+    def _spider_opened(self, spider: Spider) -> None:
+        super()._spider_opened(spider)
+        self.defaults: tuple[float, float] = self.mindelay, self.target_concurrency
+
+    def _response_downloaded(self, response: Response, request: Request, spider: Spider) -> None:
+        slot = self.slot_settings.get(request.meta.get("download_slot"), {})
+        self.mindelay = slot.get("delay", self.defaults[0])
+        self.target_concurrency = slot.get("concurrency", self.defaults[1])
+        super()._response_downloaded(response, request, spider)
+
+
+class ProxyScoreExtension:
+    """Proxy quality across jobs in `SCORES_FILE`, see `scraper.scores`.
+
+    The proxies passed on by the pipelines are observed as the proxy check left them, those it
+    dropped as dead. The job's observations are added to the file in a thread when the spider
+    closes. A persisted `DedupPipeline` index drops the proxies of earlier runs, so they are only
+    scored again with `DEDUP_PASS_SEEN`.
+    """
+
+    def __init__(self, path: str, alpha: float = 0.3) -> None:
+        self.path = path
+        self.alpha = alpha
+        self.observations = Observations()
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler) -> Self:
+        settings = crawler.settings
+        if not (path := settings.get("SCORES_FILE")):
+            raise NotConfigured("SCORES_FILE is not set")
+        extension = cls(path, alpha=settings.getfloat("SCORES_EWMA_ALPHA", 0.3))
+        crawler.signals.connect(extension.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(extension.item_dropped, signal=signals.item_dropped)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        return extension
+
+    def item_scraped(self, item: Any, spider: Spider) -> None:
+        self.observations.add(item)
+
+    def item_dropped(self, item: Any, exception: BaseException, spider: Spider) -> None:
+        if str(exception).startswith("Dead proxy"):  # see `ProxyCheckPipeline.process_item`
+            self.observations.add(item, alive=False)
+
+    def spider_closed(self, spider: Spider) -> Deferred[int]:
+        observations, self.observations = self.observations, Observations()
+        start = time.perf_counter()
+        d: Deferred[int] = deferToThread(update_scores, self.path, observations, self.alpha)  # type: ignore[no-untyped-call]
+        d.addCallback(self.updated, spider, start)
+        return d
+
+    def updated(self, count: int, spider: Spider, start: float) -> int:
+        spider.logger.info("Updated the scores of %d proxies in %.2fs", count, time.perf_counter() - start)
+        return count
+
+
+class LiveFeedExtension:
+    """Sends the proxies passed on by the pipelines to the scrapyd `/live` feed as they are scraped, see `LiveFeed`.
+
+    Each item is one JSON datagram to `LIVE_FEED_ADDRESS` (host:port, the `live_feed_port` of
+    scrapyd.conf) over UDP from a non-blocking socket. A send that would block or fails, e.g. while
+    scrapyd restarts, is counted as `live_feed/dropped` and not retried: the crawl never waits on
+    the feed or its subscribers.
+    """
+
+    fields = ("ip", "port", "protocol", "protocols", "country", "anonymity", "latency", "source")
+
+    def __init__(self, crawler: Crawler, address: str) -> None:
+        host, _, port = address.rpartition(":")
+        self.address = (host or "127.0.0.1", int(port))
+        self.stats = crawler.stats
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler) -> Self:
+        if not (address := crawler.settings.get("LIVE_FEED_ADDRESS")):
+            raise NotConfigured("LIVE_FEED_ADDRESS is not set")
+        extension = cls(crawler, address)
+        crawler.signals.connect(extension.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        return extension
+
+    def item_scraped(self, item: Any, spider: Spider) -> None:
+        proxy = {field: item.get(field) for field in self.fields}
+        try:
+            self.socket.sendto(json.dumps(proxy, separators=(",", ":")).encode(), self.address)
+        except OSError:
+            self.stats.inc_value("live_feed/dropped")
+        else:
+            self.stats.inc_value("live_feed/sent")
+
+    def spider_closed(self, spider: Spider) -> None:
+        self.socket.close()
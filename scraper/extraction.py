@@ -0,0 +1,88 @@
+import functools
+import re
+from collections.abc import Callable, Iterator
+from typing import Any
+
+from lxml import etree
+from scrapy import Selector
+
+PATTERNS = {
+    "ip": r"\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}",
+    "port": r"\d{1,5}",
+    "protocol": r"http|https|socks4|socks5",
+    "country": r"[A-Z]{2}",
+    "anonymity": r"anonymous|elite|transparent",
+}
+
+# one `ip:port` per line, surrounding blanks allowed, any other line is skipped
+PROXY_LINE = re.compile(rb"^[ \t]*(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}):(\d{1,5})[ \t]*\r?$", re.MULTILINE)
+
+
+@functools.cache
+def compile_pattern(pattern: str) -> re.Pattern[str]:
+    """Return a compiled regex for `pattern`, compiled only once per process."""
+    return re.compile(pattern)
+
+
+@functools.cache
+def compile_xpath(xpath: str) -> etree.XPath:
+    """Return a precompiled lxml XPath for `xpath`, compiled only once per process."""
+    return etree.XPath(xpath, smart_strings=False)
+
+
+def to_text(value: Any) -> str:
+    """Convert a single XPath result to text the same way `Selector.get()` does."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, etree._Element):
+        return etree.tostring(value, encoding="unicode", method="html", with_tail=False)  # type: ignore[no-any-return]
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return str(value)
+
+
+def xpath_data(row: Selector, xpath: etree.XPath, many: bool = False) -> str | list[str]:
+    """Evaluate a precompiled `xpath` against the row element without building selectors."""
+    values = xpath(row.root)
+    if not isinstance(values, list):  # scalar results e.g. count() or string()
+        values = [values]
+    if many:
+        return [to_text(v) for v in values]
+    return to_text(values[0]) if values else ""
+
+
+class FieldExtractor:
+    """Precompiled XPath + regex extraction of a single field from a row."""
+
+    __slots__ = ("xpath", "regex", "normalize", "convert", "default")
+
+    def __init__(
+        self,
+        xpath: str,
+        pattern: str,
+        normalize: Callable[[str], str] | None = None,
+        convert: Callable[[str], Any] | None = None,
+        default: Any = "",
+    ) -> None:
+        self.xpath = compile_xpath(xpath) if xpath else None
+        self.regex = compile_pattern(pattern)
+        self.normalize = normalize
+        self.convert = convert
+        self.default = default
+
+    def __call__(self, row: Selector) -> Any:
+        if self.xpath is None:
+            return self.default
+        data: str = xpath_data(row, self.xpath)  # type: ignore[assignment]
+        if self.normalize is not None:
+            data = self.normalize(data)
+        if match := self.regex.search(data):
+            return self.convert(match.group(0)) if self.convert is not None else match.group(0)
+        return self.default
+
+
+def iter_proxy_lines(data: bytes | memoryview) -> Iterator[tuple[str, int]]:
+    """Yield `(ip, port)` of each `ip:port` line in a raw text list, without decoding or splitting it."""
+    for match in PROXY_LINE.finditer(data):
+        ip, port = match.groups()
+        yield ip.decode("ascii"), int(port)
@@ -0,0 +1,84 @@
+"""Captured responses ("fixtures") to replay through the spider callbacks offline, see `benchmarks/parse.py`.
+
+A fixture is `<dir>/<spider>/<key>.json` (url, status, headers, request method and JSON-safe meta
+and cb_kwargs, callback name) with its body in `<key>.body.gz`, the key being a hash of the request.
+"""
+
+import gzip
+import hashlib
+import json
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from scrapy import Request
+from scrapy.http import Headers, Response
+from scrapy.responsetypes import responsetypes
+
+FIXTURE_VERSION = 1
+
+
+class Fixture(NamedTuple):
+    spider: str
+    callback: str
+    response: Response
+    cb_kwargs: dict[str, Any]
+    path: Path
+
+
+def json_safe(values: dict[str, Any]) -> dict[str, Any]:
+    """Return the items of `values` that survive a JSON round trip unchanged, e.g. not callbacks."""
+    safe = {}
+    for key, value in values.items():
+        try:
+            if json.loads(json.dumps(value)) == value:
+                safe[key] = value
+        except (TypeError, ValueError):
+            continue
+    return safe
+
+
+def fixture_key(request: Request) -> str:
+    return hashlib.sha1(b"%s %s\n%s" % (request.method.encode(), request.url.encode(), request.body)).hexdigest()[:16]
+
+
+def save_fixture(directory: str | Path, spider: str, response: Response) -> Path:
+    """Save `response` (and what its request passes to the callback) as a fixture of `spider`."""
+    request = response.request or Request(response.url)
+    path = Path(directory) / spider / f"{fixture_key(request)}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fixture = {
+        "version": FIXTURE_VERSION,
+        "captured_at": int(time.time()),
+        "url": response.url,
+        "status": response.status,
+        "headers": {k.decode("latin-1"): [v.decode("latin-1") for v in vs] for k, vs in response.headers.items()},
+        "method": request.method,
+        "meta": json_safe(request.meta),
+        "cb_kwargs": json_safe(request.cb_kwargs),
+        # replayed through `parse`, which extracts on the caller's thread what `parse_offloaded` extracts in a pool
+        "callback": getattr(request.callback, "__name__", "parse").removesuffix("_offloaded"),
+    }
+    path.with_suffix(".body.gz").write_bytes(gzip.compress(response.body, mtime=0))
+    path.write_text(json.dumps(fixture, indent=2, sort_keys=True))
+    return path
+
+
+def load_fixture(path: Path) -> Fixture:
+    data = json.loads(path.read_text())
+    if data.get("version") != FIXTURE_VERSION:
+        raise ValueError(f"Not a version {FIXTURE_VERSION} fixture: {path}")
+    body = gzip.decompress(path.with_suffix(".body.gz").read_bytes())
+    headers = Headers(data["headers"])
+    request = Request(data["url"], method=data["method"], meta=data["meta"], cb_kwargs=data["cb_kwargs"])
+    cls = responsetypes.from_args(headers=headers, url=data["url"], body=body)
+    response = cls(data["url"], status=data["status"], headers=headers, body=body, request=request)
+    return Fixture(path.parent.name, data["callback"], response, data["cb_kwargs"], path)
+
+
+def load_fixtures(directory: str | Path, spiders: list[str] | None = None) -> Iterator[Fixture]:
+    """Load the fixtures under `directory`, of `spiders` only when given, in path order."""
+    for path in sorted(Path(directory).glob("*/*.json")):
+        if not spiders or path.parent.name in spiders:
+            yield load_fixture(path)
@@ -0,0 +1,259 @@
+"""IPv4 range -> country and ASN index, compiled from CSV range files and memory-mapped by `GeoIndex`.
+
+Layout (little endian, the reader casts the columns in place):
+
+    header   magic "PXGI", version u16, reserved u16, range count u32, reserved u32
+    columns  starts u32[count] (sorted), ends u32[count], asns u32[count], countries 2 bytes[count]
+
+Ranges do not overlap, an ASN of 0 and a country of two NUL bytes are unknown. Opening an index
+maps the file without reading it, a lookup is a binary search over the starts (NumPy's
+`searchsorted` for batches when NumPy is installed):
+
+    python -m scraper.geoip ip2asn-v4.tsv.gz dbip-country-lite.csv.gz -o geoip.bin
+    python -m scraper.geoip --lookup 1.1.1.1 -o geoip.bin
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import itertools
+import mmap
+import re
+import socket
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+from collections.abc import Iterator, Sequence
+from pathlib import Path
+from types import TracebackType
+from typing import IO, Any, NamedTuple, Self
+
+MAGIC = b"PXGI"
+VERSION = 1
+HEADER = struct.Struct("<4sHHII")
+COUNTRY = re.compile(r"[A-Z]{2}")
+ASN = re.compile(r"(?:AS)?(\d+)", re.IGNORECASE)
+SAMPLE_ROWS = 100  # rows read to detect the country and ASN columns of a file
+
+
+class IPRange(NamedTuple):
+    start: int
+    end: int
+    country: str = ""
+    asn: int = 0
+
+
+def to_address(text: str) -> int | None:
+    """Return the IPv4 address of dotted or integer `text`, None if it is neither (e.g. IPv6 or a header)."""
+    text = text.strip()
+    if text.isdigit():
+        return int(text) if int(text) < 1 << 32 else None
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, text), "big")
+    except OSError:
+        return None
+
+
+def open_text(path: Path) -> IO[str]:
+    if path.suffix == ".gz":
+        return io.TextIOWrapper(gzip.open(path), encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+
+def detect_columns(rows: list[list[str]]) -> tuple[int | None, int | None]:
+    """Return the indexes of the country and ASN columns of the sampled `rows`, after the start and end."""
+
+    def best(pattern: re.Pattern[str], skip: int | None) -> int | None:
+        counts: dict[int, int] = {}
+        for row in rows:
+            for column, value in enumerate(row[2:], start=2):
+                if column != skip and pattern.fullmatch(value.strip()):
+                    counts[column] = counts.get(column, 0) + 1
+        return max(counts, key=lambda column: (counts[column], -column)) if counts else None
+
+    country = best(COUNTRY, None)
+    return country, best(ASN, country)
+
+
+def read_ranges(path: Path, country_column: int | None = None, asn_column: int | None = None) -> Iterator[IPRange]:
+    """Yield the IPv4 ranges of a CSV (or TSV, optionally gzipped) file of `start, end, ...` rows.
+
+    Start and end are dotted or integer addresses, rows of other address families and headers are
+    skipped. The country and ASN columns are detected from the first rows unless given.
+    """
+    with open_text(path) as f:
+        first = f.readline()
+        reader = csv.reader(itertools.chain([first], f), delimiter="\t" if "\t" in first else ",")
+        sample = list(itertools.islice(reader, SAMPLE_ROWS))
+        detected = detect_columns([row for row in sample if len(row) > 2 and to_address(row[0]) is not None])
+        country_column = detected[0] if country_column is None else country_column
+        asn_column = detected[1] if asn_column is None else asn_column
+        for row in itertools.chain(sample, reader):
+            if len(row) < 2 or (start := to_address(row[0])) is None or (end := to_address(row[1])) is None:
+                continue
+            country = row[country_column].strip() if country_column is not None and country_column < len(row) else ""
+            asn = ASN.fullmatch(row[asn_column].strip()) if asn_column is not None and asn_column < len(row) else None
+            yield IPRange(start, end, country if COUNTRY.fullmatch(country) else "", int(asn.group(1)) if asn else 0)
+
+
+def disjoint(ranges: list[IPRange]) -> list[IPRange]:
+    """Return `ranges` sorted, the parts of a range overlapping an earlier one cut off."""
+    result: list[IPRange] = []
+    for r in sorted(ranges):
+        if result and r.start <= result[-1].end:
+            r = r._replace(start=result[-1].end + 1)
+        if r.start <= r.end:
+            result.append(r)
+    return result
+
+
+def merge(sources: Sequence[list[IPRange]]) -> list[IPRange]:
+    """Merge the ranges of several files, the country and ASN of an address coming from the first file knowing it.
+
+    E.g. an ASN database with countries, then a country database for the addresses it lacks.
+    """
+    sources = [disjoint(ranges) for ranges in sources]
+    bounds = sorted({b for ranges in sources for r in ranges for b in (r.start, r.end + 1)})
+    positions = [0] * len(sources)
+    merged: list[IPRange] = []
+    for start, after in zip(bounds, bounds[1:], strict=False):
+        country, asn = "", 0
+        for i, ranges in enumerate(sources):
+            while positions[i] < len(ranges) and ranges[positions[i]].end < start:
+                positions[i] += 1
+            if positions[i] < len(ranges) and (r := ranges[positions[i]]).start <= start:
+                country, asn = country or r.country, asn or r.asn
+        if not country and not asn:
+            continue
+        if merged and merged[-1].end + 1 == start and merged[-1][2:] == (country, asn):
+            merged[-1] = merged[-1]._replace(end=after - 1)  # adjacent with the same fields
+        else:
+            merged.append(IPRange(start, after - 1, country, asn))
+    return merged
+
+
+def write_index(path: Path, ranges: list[IPRange]) -> None:
+    """Write the disjoint, sorted `ranges` as an index file at `path`, replacing it atomically."""
+    columns = [array("I", (getattr(r, name) for r in ranges)) for name in ("start", "end", "asn")]
+    if sys.byteorder == "big":
+        for column in columns:
+            column.byteswap()
+    countries = b"".join(r.country.encode("ascii") if r.country else b"\0\0" for r in ranges)
+    tmp = path.with_suffix(f"{path.suffix}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(ranges), 0))
+        for column in columns:
+            f.write(column.tobytes())
+        f.write(countries)
+    tmp.replace(path)
+
+
+class GeoIndex:
+    """Memory-mapped IPv4 range index, see the module docstring for the layout.
+
+    with GeoIndex("geoip.bin") as index:
+        index.lookup("1.1.1.1")  # ("AU", 13335)
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        if sys.byteorder != "little":
+            raise OSError("GeoIndex reads the little endian columns in place")
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.count, _ = HEADER.unpack_from(self.mmap)
+        if magic != MAGIC or version != VERSION:
+            self.mmap.close()
+            raise ValueError(f"Not a version {VERSION} GeoIP index: {path}")
+        view, n = memoryview(self.mmap), self.count
+        self.views = [view[HEADER.size + i * 4 * n : HEADER.size + (i + 1) * 4 * n].cast("I") for i in range(3)]
+        self.starts, self.ends, self.asns = self.views
+        self.countries = view[HEADER.size + 12 * n : HEADER.size + 14 * n].cast("H")  # the 2 ASCII bytes as an int
+        self.views += [self.countries, view]
+        self.names: dict[int, str] = {0: ""}  # country code -> interned str
+        self.arrays: tuple[Any, ...] | None = None  # NumPy views of the columns, see `lookup_many`
+
+    def __len__(self) -> int:
+        return int(self.count)
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info: type[BaseException] | BaseException | TracebackType | None) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.arrays = None
+        for view in reversed(self.views):  # the mapping can only be closed once nothing views it
+            view.release()
+        self.mmap.close()
+
+    def country(self, code: int) -> str:
+        if (name := self.names.get(code)) is None:
+            name = self.names[code] = sys.intern(code.to_bytes(2, "little").decode("ascii"))
+        return name
+
+    def lookup(self, ip: int | str | None) -> tuple[str, int]:
+        """Return the country ("" if unknown) and ASN (0 if unknown) of the IPv4 address `ip`."""
+        address = to_address(ip) if isinstance(ip, str) else ip
+        if address is None:
+            return "", 0
+        index = bisect_right(self.starts, address) - 1
+        if index < 0 or address > self.ends[index]:
+            return "", 0
+        return self.country(self.countries[index]), self.asns[index]
+
+    def lookup_many(self, ips: Sequence[int]) -> list[tuple[str, int]]:
+        """Return the country and ASN of every int address of `ips`, vectorized when NumPy is installed."""
+        try:
+            import numpy as np
+        except ImportError:
+            return [self.lookup(ip) for ip in ips]
+
+        if self.arrays is None:
+            n, offset = self.count, HEADER.size
+            self.arrays = tuple(
+                np.frombuffer(self.mmap, dtype=dtype, count=n, offset=offset + i * 4 * n)
+                for i, dtype in enumerate(("<u4", "<u4", "<u4", "<u2"))
+            )
+        starts, ends, asns, countries = self.arrays
+        addresses = np.asarray(ips, dtype=np.int64)
+        indexes = np.searchsorted(starts, addresses, side="right") - 1
+        clipped = np.maximum(indexes, 0)
+        found = (indexes >= 0) & (addresses <= ends[clipped])
+        codes = np.where(found, countries[clipped], 0)
+        return [
+            (self.country(code), asn)
+            for code, asn in zip(codes.tolist(), np.where(found, asns[clipped], 0).tolist(), strict=True)
+        ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", type=Path, help="CSV range files, earlier ones take precedence")
+    parser.add_argument("-o", "--output", type=Path, default=Path("geoip.bin"))
+    parser.add_argument("--country-column", type=int, help="0-based, detected by default")
+    parser.add_argument("--asn-column", type=int, help="0-based, detected by default")
+    parser.add_argument("--lookup", nargs="+", metavar="IP", help="look addresses up in the index instead")
+    args = parser.parse_args()
+
+    if args.lookup:
+        with GeoIndex(args.output) as index:
+            for ip in args.lookup:
+                country, asn = index.lookup(ip)
+                print(f"{ip}\t{country or '-'}\t{asn or '-'}")
+        return
+    if not args.files:
+        parser.error("give the range files to build the index from, or --lookup")
+    sources = []
+    for path in args.files:
+        sources.append(list(read_ranges(path, args.country_column, args.asn_column)))
+        print(f"{path}: {len(sources[-1])} ranges")
+    ranges = merge(sources)
+    write_index(args.output, ranges)
+    print(f"{args.output}: {len(ranges)} ranges, {args.output.stat().st_size} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import asyncio
+import itertools
+import time
+from typing import TYPE_CHECKING, Any, ClassVar
+from urllib.parse import urlsplit, urlunsplit
+
+from scrapy import Request, Spider
+from scrapy.core.downloader.handlers.http import HTTPDownloadHandler
+from scrapy.crawler import Crawler
+from scrapy.http import Response
+from scrapy.settings import Settings
+from scrapy.utils.defer import deferred_from_coro, deferred_to_future, maybe_deferred_to_future
+from twisted.internet.defer import Deferred, inlineCallbacks
+
+if TYPE_CHECKING:
+    from scrapy_playwright.handler import ScrapyPlaywrightDownloadHandler
+
+JS_HEAP_SIZE = "() => performance.memory ? performance.memory.usedJSHeapSize : null"  # chromium only
+REPLAY_DOWNLOAD_HANDLERS = {
+    "http": "scraper.handlers.ReplayDownloadHandler",
+    "https": "scraper.handlers.ReplayDownloadHandler",
+}
+
+
+def set_download_handlers(settings: Settings, use_playwright: bool) -> None:
+    """Set the download handlers of a spider: replay with `REPLAY_URL`, otherwise Playwright if it renders."""
+    if settings.get("REPLAY_URL"):
+        settings.set("DOWNLOAD_HANDLERS", REPLAY_DOWNLOAD_HANDLERS, priority="spider")
+    elif use_playwright:  # plain HTTP spiders keep Scrapy's default handlers and never load Playwright
+        settings.set("DOWNLOAD_HANDLERS", settings.getdict("PLAYWRIGHT_DOWNLOAD_HANDLERS"), priority="spider")
+
+
+class LazyPlaywrightDownloadHandler(HTTPDownloadHandler):  # type: ignore[misc]
+    """Plain Scrapy HTTP(S) handler that hands requests with `meta["playwright"]` to scrapy-playwright.
+
+    scrapy-playwright is only imported, and its driver only started, on the first such request.
+    One browser (with the warm `PLAYWRIGHT_CONTEXTS` pool) is shared by every crawler in the process
+    and closed with the last one; render time and JS heap size per page are added to the crawl stats.
+    """
+
+    shared: ClassVar["ScrapyPlaywrightDownloadHandler | None"] = None
+    shared_users: ClassVar[int] = 0
+    shared_lock: ClassVar[asyncio.Lock | None] = None
+
+    def __init__(self, settings: Settings, crawler: Crawler) -> None:
+        super().__init__(settings, crawler=crawler)
+        self.crawler = crawler
+        self.playwright: ScrapyPlaywrightDownloadHandler | None = None
+        self.contexts = itertools.cycle(settings.getdict("PLAYWRIGHT_CONTEXTS") or [None])
+        self.report_memory = settings.getbool("PLAYWRIGHT_REPORT_MEMORY", True)
+
+    def download_request(self, request: Request, spider: Spider) -> Deferred[Response]:
+        if request.meta.get("playwright"):
+            return deferred_from_coro(self._download_with_playwright(request, spider))  # type: ignore[no-any-return]
+        return super().download_request(request, spider)  # type: ignore[no-any-return]
+
+    async def _download_with_playwright(self, request: Request, spider: Spider) -> Response:
+        handler = await self.get_playwright_handler()
+        if "playwright_context" not in request.meta and (context := next(self.contexts)):
+            request.meta["playwright_context"] = context  # round robin over the warm contexts
+        heap_size = None
+        if self.report_memory and not request.meta.get("playwright_include_page"):
+            from scrapy_playwright.page import PageMethod
+
+            heap_size = PageMethod("evaluate", JS_HEAP_SIZE)
+            request.meta["playwright_page_methods"] = [*request.meta.get("playwright_page_methods", []), heap_size]
+
+        start = time.monotonic()
+        response = await maybe_deferred_to_future(handler.download_request(request, spider))
+        elapsed = round((time.monotonic() - start) * 1000)
+
+        stats = self.crawler.stats
+        stats.inc_value("playwright/render/count")
+        stats.inc_value("playwright/render/time_ms", elapsed)
+        stats.max_value("playwright/render/time_ms_max", elapsed)
+        if heap_size is not None and isinstance(heap_size.result, int):
+            stats.max_value("playwright/render/js_heap_bytes_max", heap_size.result)
+        return response
+
+    async def get_playwright_handler(self) -> "ScrapyPlaywrightDownloadHandler":
+        cls = type(self)
+        if cls.shared_lock is None:
+            cls.shared_lock = asyncio.Lock()
+        async with cls.shared_lock:
+            if self.playwright is None:
+                if cls.shared is None:
+                    from scrapy_playwright.handler import ScrapyPlaywrightDownloadHandler
+
+                    handler = ScrapyPlaywrightDownloadHandler.from_crawler(self.crawler)
+                    # the engine has already started, so launch the way its engine_started handler would
+                    await deferred_to_future(handler._engine_started())
+                    cls.shared = handler
+                cls.shared_users += 1
+                self.playwright = cls.shared
+        return self.playwright
+
+    @inlineCallbacks
+    def close(self) -> Any:
+        yield super().close()
+        if self.playwright is None:
+            return
+        cls, self.playwright = type(self), None
+        cls.shared_users -= 1
+        if not cls.shared_users and cls.shared is not None:  # the last crawler using the browser closes it
+            handler, cls.shared = cls.shared, None
+            yield handler.close()
+
+
+class ReplayDownloadHandler(HTTPDownloadHandler):  # type: ignore[misc]
+    """Sends every request to the `scraper.replay` server at `REPLAY_URL` instead of the site, see there.
+
+    The server is used as an HTTP proxy for the original URL (HTTPS as plain HTTP, so there is no
+    tunnel), the response keeps the original URL. Rendering requests get the recorded page as is.
+    """
+
+    def __init__(self, settings: Settings, crawler: Crawler) -> None:
+        super().__init__(settings, crawler=crawler)
+        self.replay_url = settings["REPLAY_URL"]
+
+    def download_request(self, request: Request, spider: Spider) -> Deferred[Response]:
+        url = urlunsplit(("http", *urlsplit(request.url)[1:]))
+        replayed = request.replace(url=url, meta={**request.meta, "proxy": self.replay_url})
+        deferred = super().download_request(replayed, spider)
+        deferred.addCallback(self.restore, request, replayed)
+        return deferred  # type: ignore[no-any-return]
+
+    @staticmethod
+    def restore(response: Response, request: Request, replayed: Request) -> Response:
+        """Return `response` as the response to the original `request`, with the latency of the replayed one."""
+        if "download_latency" in replayed.meta:
+            request.meta["download_latency"] = replayed.meta["download_latency"]
+        return response.replace(url=request.url)
@@ -0,0 +1,280 @@
+"""HTTP cache in a single SQLite file, with a total size cap, LRU eviction and pruning in the background.
+
+`SQLiteCacheStorage` replaces the directory tree of small files per request of Scrapy's
+`FilesystemCacheStorage`. The file is shared by the jobs of every scrapyd process (WAL mode, short
+transactions), and `RenderingRequestFingerprinter` keeps rendered responses apart from the plain ones
+of the same URL, so a rendered page is cached like any other.
+"""
+
+import hashlib
+import logging
+import lzma
+import sqlite3
+import time
+import zlib
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, TypeVar
+
+from scrapy import Request, Spider
+from scrapy.http import Headers, Response
+from scrapy.responsetypes import responsetypes
+from scrapy.settings import Settings
+from scrapy.utils.project import data_path
+from scrapy.utils.request import RequestFingerprinter
+from twisted.internet.defer import Deferred
+from twisted.internet.task import LoopingCall
+from twisted.python.failure import Failure
+from w3lib.http import headers_dict_to_raw, headers_raw_to_dict
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE = "responses.db"
+READ_TIMEOUT = 0.1  # seconds a lookup on the reactor waits for a lock, a miss beyond
+WRITE_INTERVAL = 1.0  # seconds between writes of the stored responses
+WRITE_BATCH = 100  # stored responses written at once without waiting for the interval
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    fingerprint BLOB PRIMARY KEY,
+    url TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers BLOB NOT NULL,
+    body BLOB NOT NULL,
+    codec TEXT NOT NULL DEFAULT '',
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+"""
+STORE = """
+INSERT OR REPLACE INTO responses (fingerprint, url, status, headers, body, codec, size, stored_at, accessed_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+TOUCH = "UPDATE responses SET accessed_at = max(accessed_at, ?) WHERE fingerprint = ?"
+# the least recently used responses beyond `max_size` bytes of the most recently used ones
+EVICT = """
+DELETE FROM responses WHERE fingerprint IN (
+    SELECT fingerprint FROM (
+        SELECT fingerprint, sum(size) OVER (ORDER BY accessed_at DESC, fingerprint) AS kept FROM responses
+    ) WHERE kept > ?
+)
+"""
+
+# url, status, raw headers, uncompressed body, codec, stored at
+Row = tuple[str, int, bytes, bytes, str, float]
+T = TypeVar("T")
+
+# codec -> (compress, decompress)
+CODECS: dict[str, tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    "": (bytes, bytes),
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+
+class RenderingRequestFingerprinter(RequestFingerprinter):  # type: ignore[misc]
+    """Scrapy's request fingerprints, but those of requests rendered by Playwright are their own.
+
+    A page whose scripts could not be decoded is requested again to be rendered (see
+    `BaseSpider.render_instead`), the cache must not answer that request with the plain page.
+    """
+
+    def fingerprint(self, request: Request) -> bytes:
+        fingerprint: bytes = super().fingerprint(request)
+        if request.meta.get("playwright"):
+            return hashlib.sha1(fingerprint + b"playwright").digest()
+        return fingerprint
+
+
+def connect(path: Path, timeout: float) -> sqlite3.Connection:
+    """Return a connection waiting at most `timeout` seconds for a lock held by another connection.
+
+    Nothing is read before its first statement.
+    """
+    return sqlite3.connect(path, timeout=timeout, check_same_thread=False, isolation_level=None)
+
+
+def create(connection: sqlite3.Connection) -> None:
+    """Set up the writer's connection and the database, on the writer thread."""
+    connection.execute("PRAGMA synchronous = NORMAL")
+    # only applies to a new database (before the WAL mode), so the pages of pruned responses are freed
+    connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    connection.execute("PRAGMA journal_mode = WAL")  # the jobs of other processes read while one writes
+    connection.executescript(SCHEMA)
+
+
+def write(connection: sqlite3.Connection, pending: dict[bytes, Row], accessed: dict[bytes, float]) -> None:
+    """Compress and store the `pending` responses and record the `accessed` times, in one transaction."""
+    rows = []
+    for fingerprint, (url, status, headers, body, codec, stored_at) in pending.items():
+        body = CODECS[codec][0](body)
+        rows.append((fingerprint, url, status, headers, body, codec, len(headers) + len(body), stored_at, stored_at))
+    with connection:
+        connection.execute("BEGIN IMMEDIATE")
+        connection.executemany(STORE, rows)
+        connection.executemany(TOUCH, [(at, fingerprint) for fingerprint, at in accessed.items()])
+
+
+def prune(connection: sqlite3.Connection, expiration_secs: int, max_size: int, accessed: dict[bytes, float]) -> int:
+    """Record the `accessed` times, delete the expired responses and evict the LRU ones beyond `max_size`.
+
+    Return the number of responses deleted.
+    """
+    with connection:
+        connection.execute("BEGIN IMMEDIATE")
+        connection.executemany(TOUCH, [(at, fingerprint) for fingerprint, at in accessed.items()])
+        deleted = 0
+        if expiration_secs > 0:
+            expired = time.time() - expiration_secs
+            deleted += connection.execute("DELETE FROM responses WHERE stored_at < ?", (expired,)).rowcount
+        if max_size > 0:
+            deleted += connection.execute(EVICT, (max_size,)).rowcount
+    if deleted:
+        connection.execute("PRAGMA incremental_vacuum")
+    return deleted
+
+
+class SQLiteCacheStorage:
+    """Scrapy HTTP cache storage keeping every response in `HTTPCACHE_DIR/responses.db`.
+
+    Only the lookups of `retrieve_response` run on the reactor thread, with a `READ_TIMEOUT` busy
+    timeout: a read blocked longer by another process is a cache miss (`httpcache/busy`). Stored
+    responses are kept in memory, where they are found too, and written by a thread every
+    `WRITE_INTERVAL` seconds or `WRITE_BATCH` responses, in one transaction per batch. Bodies are
+    compressed there with `HTTPCACHE_COMPRESSION` (zlib, lzma or none), unless the server already
+    encoded them. Every `HTTPCACHE_PRUNE_INTERVAL` seconds the same thread records the access times
+    of the cache hits, deletes the responses older than `HTTPCACHE_EXPIRATION_SECS`, then the least
+    recently used ones until the cache holds at most `HTTPCACHE_MAX_SIZE` bytes. When the spider
+    closes, the reactor waits for the last batch to be written.
+    """
+
+    def __init__(self, settings: Settings) -> None:
+        self.path = Path(data_path(settings["HTTPCACHE_DIR"], createdir=True)) / CACHE_FILE
+        self.expiration_secs = settings.getint("HTTPCACHE_EXPIRATION_SECS")
+        self.max_size = settings.getint("HTTPCACHE_MAX_SIZE", 256 * 1024 * 1024)
+        self.prune_interval = settings.getfloat("HTTPCACHE_PRUNE_INTERVAL", 60)
+        self.codec = settings.get("HTTPCACHE_COMPRESSION", "zlib") or ""
+        if self.codec not in CODECS:
+            raise ValueError(f"Unknown HTTPCACHE_COMPRESSION {self.codec!r}, use one of {sorted(CODECS)}")
+        self.reader: sqlite3.Connection | None = None  # used on the reactor thread
+        self.writer: sqlite3.Connection | None = None  # used on the `executor` thread
+        self.executor: ThreadPoolExecutor | None = None
+        self.pending: dict[bytes, Row] = {}  # fingerprint -> response to store, not yet sent to the thread
+        self.accessed: dict[bytes, float] = {}  # fingerprint -> last hit, not yet written
+        self.flusher = LoopingCall(self.flush)
+        self.pruner = LoopingCall(self.prune)
+        self.pruning = False
+
+    def open_spider(self, spider: Spider) -> None:
+        self.fingerprinter = spider.crawler.request_fingerprinter
+        self.stats = spider.crawler.stats
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="httpcache")
+        self.writer = connect(self.path, timeout=30)
+        self.submit(create).addErrback(self.failed, "create")  # lookups before it are misses
+        self.reader = connect(self.path, timeout=READ_TIMEOUT)
+        logger.debug("Using SQLite cache storage in %(path)s", {"path": self.path}, extra={"spider": spider})
+        self.flusher.start(WRITE_INTERVAL, now=False)
+        if self.prune_interval > 0:
+            self.pruner.start(self.prune_interval, now=True)
+
+    def close_spider(self, spider: Spider) -> None:
+        for loop in (self.flusher, self.pruner):
+            if loop.running:
+                loop.stop()
+        if self.executor is None or self.writer is None or self.reader is None:
+            return
+        last = self.executor.submit(write, self.writer, self.pending, self.accessed)
+        self.executor.shutdown()  # after the batches before
+        if (error := last.exception()) is not None:
+            logger.warning("Could not write the HTTP cache %s: %s", self.path, error)
+        self.pending, self.accessed = {}, {}
+        self.reader.close()
+        self.writer.close()
+        self.executor = self.reader = self.writer = None
+
+    def submit(self, function: Callable[..., T], *args: Any) -> Deferred[T]:
+        """Return a Deferred fired on the reactor with `function(writer, *args)`, called on the writer thread."""
+        from twisted.internet import reactor
+
+        if self.executor is None:
+            raise RuntimeError(f"The HTTP cache {self.path} is closed")
+        d: Deferred[T] = Deferred()
+
+        def done(future: Future[T]) -> None:
+            if (error := future.exception()) is not None:
+                d.errback(error)
+            else:
+                d.callback(future.result())
+
+        future = self.executor.submit(function, self.writer, *args)
+        future.add_done_callback(lambda future: reactor.callFromThread(done, future))  # type: ignore[attr-defined]
+        return d
+
+    def flush(self) -> None:
+        if not self.pending or self.executor is None:
+            return
+        pending, self.pending = self.pending, {}
+        self.submit(write, pending, {}).addErrback(self.failed, f"store {len(pending)} responses in")
+
+    def failed(self, failure: Failure, action: str) -> None:
+        logger.warning("Could not %s the HTTP cache %s: %s", action, self.path, failure.getErrorMessage())
+
+    def prune(self) -> None:
+        if self.pruning or self.executor is None:  # the last one is still running
+            return
+        self.pruning = True
+        accessed, self.accessed = self.accessed, {}
+        d = self.submit(prune, self.expiration_secs, self.max_size, accessed)
+        d.addCallbacks(self.pruned, self.prune_failed, errbackArgs=(accessed,))
+
+    def pruned(self, deleted: int) -> None:
+        self.pruning = False
+        if deleted:
+            logger.debug("Pruned %d responses from the HTTP cache", deleted)
+
+    def prune_failed(self, failure: Failure, accessed: dict[bytes, float]) -> None:
+        self.pruning = False
+        self.accessed = {**accessed, **self.accessed}  # written with the next one
+        logger.warning("Could not prune the HTTP cache %s: %s", self.path, failure.getErrorMessage())
+
+    def retrieve_response(self, spider: Spider, request: Request) -> Response | None:
+        """Return the cached response of `request`, None if it is not cached or expired."""
+        if self.reader is None:
+            return None
+        fingerprint = self.fingerprinter.fingerprint(request)
+        if (pending := self.pending.get(fingerprint)) is not None:
+            url, status, raw_headers, body, _, stored_at = pending
+            codec = ""  # compressed when written
+        else:
+            try:
+                row = self.reader.execute(
+                    "SELECT url, status, headers, body, codec, stored_at FROM responses WHERE fingerprint = ?",
+                    (fingerprint,),
+                ).fetchone()
+            except sqlite3.OperationalError as e:  # locked beyond `READ_TIMEOUT`, or not created yet
+                logger.debug("HTTP cache lookup of %(request)s failed: %(error)s", {"request": request, "error": e})
+                self.stats.inc_value("httpcache/busy")
+                return None
+            if row is None:
+                return None
+            url, status, raw_headers, body, codec, stored_at = row
+        now = time.time()
+        if 0 < self.expiration_secs < now - stored_at or codec not in CODECS:
+            return None
+        self.accessed[fingerprint] = now
+        body = CODECS[codec][1](body)
+        headers = Headers(headers_raw_to_dict(raw_headers))
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        return respcls(url=url, headers=headers, status=status, body=body)
+
+    def store_response(self, spider: Spider, request: Request, response: Response) -> None:
+        if self.executor is None:
+            return
+        codec = "" if response.headers.get("Content-Encoding") else self.codec  # compressed by the server
+        headers = headers_dict_to_raw(response.headers) or b""
+        row = (response.url, response.status, headers, response.body, codec, time.time())
+        self.pending[self.fingerprinter.fingerprint(request)] = row
+        if len(self.pending) >= WRITE_BATCH:
+            self.flush()
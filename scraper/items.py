@@ -1,3 +1,9 @@
+import socket
+import sys
+from dataclasses import dataclass, field, fields
+from typing import Any
+
+from itemadapter.adapter import DataclassAdapter, ItemAdapter
 from scrapy.item import Field, Item
 
 
@@ -8,3 +14,99 @@ class ProxyItem(Item):  # type: ignore
     country = Field()
     anonymity = Field()
     source = Field()
+    latency = Field()  # set by ProxyCheckPipeline
+    protocols = Field()  # set by ProxyCheckPipeline
+    asn = Field()  # set by GeoIPPipeline
+
+
+def ip_to_int(ip: Any) -> int | None:
+    """Return the dotted-quad IPv4 `ip` as an int, None if it is not one (e.g. 999.1.1.1 or 010.1.1.1)."""
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+    except (OSError, TypeError):
+        return None
+
+
+def int_to_ip(address: int | None) -> str | None:
+    return None if address is None else socket.inet_ntoa(address.to_bytes(4, "big"))
+
+
+@dataclass(slots=True, repr=False)
+class ProxyRecord:
+    """Compact proxy item: slots instead of a dict, the IPv4 address as an int and interned strings.
+
+    `record.ip` is the int, item-style access (`record["ip"]`, `record.get("ip")`) returns the dotted
+    string like `ProxyItem`, so pipelines handle either. Exporters get the dotted string from the
+    field serializer, protocol, country, anonymity and source are shared strings across records.
+    Assignments as item or `ItemAdapter` field are converted like the constructor arguments.
+    """
+
+    ip: int | None = field(metadata={"serializer": int_to_ip})  # None if the scraped address is not valid IPv4
+    port: int = 0
+    protocol: str = ""
+    country: str = ""
+    anonymity: str = ""
+    source: str = ""
+    latency: float | None = None  # set by ProxyCheckPipeline
+    protocols: list[str] | None = None  # set by ProxyCheckPipeline
+    asn: int | None = None  # set by GeoIPPipeline
+
+    def __post_init__(self) -> None:
+        if not isinstance(self.ip, int):
+            self.ip = ip_to_int(self.ip)
+        self.protocol = sys.intern(self.protocol)
+        self.country = sys.intern(self.country)
+        self.anonymity = sys.intern(self.anonymity)
+        self.source = sys.intern(self.source)
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{name}={self[name]!r}" for name in RECORD_FIELD_NAMES)
+        return f"ProxyRecord({values})"
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in RECORD_FIELDS:
+            raise KeyError(key)
+        value = getattr(self, key)
+        return int_to_ip(value) if key == "ip" else value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in RECORD_FIELDS:
+            raise KeyError(f"ProxyRecord does not support field: {key}")
+        if key == "ip" and not isinstance(value, int):
+            value = ip_to_int(value)
+        elif key in INTERNED_FIELDS and isinstance(value, str):
+            value = sys.intern(value)
+        setattr(self, key, value)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key not in RECORD_FIELDS:
+            return default
+        value = getattr(self, key)
+        return int_to_ip(value) if key == "ip" else value
+
+
+RECORD_FIELD_NAMES = tuple(f.name for f in fields(ProxyRecord))
+RECORD_FIELDS = frozenset(RECORD_FIELD_NAMES)
+INTERNED_FIELDS = frozenset({"protocol", "country", "anonymity", "source"})
+
+
+class ProxyRecordAdapter(DataclassAdapter):
+    """`ItemAdapter` of `ProxyRecord` setting fields through `ProxyRecord.__setitem__`, not `setattr`."""
+
+    @classmethod
+    def is_item_class(cls, item_class: type) -> bool:
+        return issubclass(item_class, ProxyRecord)
+
+    def __setitem__(self, field_name: str, value: Any) -> None:
+        self.item[field_name] = value
+
+
+ItemAdapter.ADAPTER_CLASSES.appendleft(ProxyRecordAdapter)  # type: ignore[attr-defined]
+
+
+def is_valid_proxy(item: Any) -> bool:
+    """Return True if `item` has a valid IPv4 address and a port in 1-65535."""
+    if isinstance(item, ProxyRecord):  # the address was already checked when set
+        return item.ip is not None and 0 < item.port < 65536
+    port = item.get("port")
+    return isinstance(port, int) and 0 < port < 65536 and ip_to_int(item.get("ip")) is not None
@@ -0,0 +1,116 @@
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Any
+
+from scrapyd.config import Config
+from scrapyd.interfaces import IEnvironment
+from scrapyd.launcher import Launcher, ScrapyProcessProtocol
+from scrapyd.utils import get_crawl_args, native_stringify_dict
+from twisted.internet import reactor
+from twisted.python import log
+
+from scraper.prewarm import RUNNER
+
+WORKER = "scraper.prewarm"
+
+
+class WorkerProcessProtocol(ScrapyProcessProtocol):  # type: ignore[misc]
+    """A prewarmed `scraper.prewarm` process, idle until a job is `assign`ed to it."""
+
+    def __init__(self, project: str, launcher: "PrewarmedLauncher") -> None:
+        super().__init__(project, None, None, {}, [])
+        self.launcher = launcher
+        self.assigned = False
+
+    def assign(self, spider: str, job: str, env: dict[str, str], args: list[str]) -> None:
+        """Hand the job to the process, as if scrapyd had spawned it with `args` and `env`."""
+        self.spider, self.job, self.env, self.args = spider, job, env, args
+        self.start_time = datetime.now()
+        self.assigned = True
+        self.transport.write(json.dumps({"args": args, "env": env}).encode() + b"\n")
+        self.transport.closeStdin()
+        self.log("Process started: ")
+
+    def connectionMade(self) -> None:  # noqa: N802
+        self.pid = self.transport.pid  # logged as started once it has a job
+
+    def processEnded(self, status: Any) -> None:  # noqa: N802
+        if self.assigned:
+            super().processEnded(status)
+            return
+        if self in self.launcher.workers:  # replaced with the next job, not in a loop if it cannot start
+            self.launcher.workers.remove(self)
+        log.msg(format="Prewarmed worker exited: project=%(project)r pid=%(pid)r", project=self.project, pid=self.pid)
+
+
+class PrewarmedLauncher(Launcher):  # type: ignore[misc]
+    """Scrapyd launcher handing the jobs of `prewarm_project` to idle, prewarmed processes.
+
+    `prewarm_workers` processes of `scraper.prewarm` wait with the project imported, each job takes
+    one, so a job skips the second or so of imports of a cold start (`benchmarks/launch.py`). An
+    idle process takes about the memory of a running job, so they are only kept while no job runs:
+    the next ones are started once the last running job exits, and a job spawned cold stops the
+    idle ones. Jobs of other projects, or arriving when no process is idle, are spawned cold as
+    usual. In scrapyd.conf:
+
+        launcher        = scraper.launcher.PrewarmedLauncher
+        prewarm_project = scraper
+        prewarm_workers = 1
+    """
+
+    def __init__(self, config: Config, app: Any) -> None:
+        super().__init__(config, app)
+        self.prewarm_project = config.get("prewarm_project", "scraper")
+        self.prewarm_workers = config.getint("prewarm_workers", 1)
+        self.workers: list[WorkerProcessProtocol] = []
+
+    def startService(self) -> None:  # noqa: N802
+        super().startService()
+        self.prewarm()
+        log.msg(
+            format="Prewarming %(workers)d processes of project %(project)r",
+            workers=self.prewarm_workers,
+            project=self.prewarm_project,
+            system="Launcher",
+        )
+
+    def prewarm(self) -> None:
+        """Start processes until `prewarm_workers` are idle, they exit when scrapyd does (end of stdin)."""
+        if self.processes:  # started once the running jobs exit
+            return
+        args = [sys.executable, "-m", WORKER]
+        env = native_stringify_dict({**os.environ, "SCRAPY_PROJECT": self.prewarm_project}, keys_only=False)
+        while len(self.workers) < self.prewarm_workers:
+            worker = WorkerProcessProtocol(self.prewarm_project, self)
+            reactor.spawnProcess(worker, sys.executable, args=args, env=env)  # type: ignore[attr-defined]
+            self.workers.append(worker)
+
+    def release(self) -> None:
+        """Stop the idle processes, making room for a job spawned cold."""
+        workers, self.workers = self.workers, []
+        for worker in workers:
+            worker.transport.closeStdin()
+
+    def _spawn_process(self, message: dict[str, Any], slot: int) -> None:
+        if message["_project"] != self.prewarm_project or self.runner != RUNNER or not self.workers:
+            self.release()
+            super()._spawn_process(message, slot)
+            return
+        # as `Launcher._spawn_process` does
+        environment = self.app.getComponent(IEnvironment)
+        message.setdefault("settings", {})
+        message["settings"].update(environment.get_settings(message))
+        msg = native_stringify_dict(message, keys_only=False)
+        args = [sys.executable, "-m", self.runner, "crawl", *get_crawl_args(msg)]
+        env = native_stringify_dict(environment.get_environment(msg, slot), keys_only=False)
+        worker = self.workers.pop(0)
+        worker.assign(msg["_spider"], msg["_job"], env, args)
+        worker.deferred.addBoth(self._process_finished, slot)
+        self.processes[slot] = worker
+        self.release()  # the others, with more than one `prewarm_workers`
+
+    def _process_finished(self, _: Any, slot: int) -> None:
+        super()._process_finished(_, slot)
+        self.prewarm()
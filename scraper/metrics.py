@@ -0,0 +1,219 @@
+"""Crawl metrics per spider (timing histograms and counters) shared through files and exposed to Prometheus.
+
+Every crawl with `METRICS_DIR` set writes its metrics to `<dir>/<job>.json` (see `MetricsExtension`)
+and on close adds them to `<dir>/totals.json`, the scrapyd `/metrics` resource renders the totals
+plus the running jobs in the Prometheus text format, so the series add up across jobs.
+"""
+
+import contextlib
+import fcntl
+import json
+import os
+import time
+from bisect import bisect_left
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any, NamedTuple
+
+Key = tuple[str, str, str]  # metric, spider, label value
+
+TOTALS_FILE = "totals.json"
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+MICROSECONDS = (0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.01)
+BYTES = (1 << 10, 4 << 10, 16 << 10, 64 << 10, 256 << 10, 1 << 20, 4 << 20, 16 << 20)
+
+
+class MetricSpec(NamedTuple):
+    type: str  # counter, gauge or histogram
+    help: str
+    label: str = ""  # name of the label besides `spider`, if any
+    buckets: tuple[float, ...] = ()
+
+
+METRICS = {
+    "scraper_download_seconds": MetricSpec(
+        "histogram", "Time to the response headers, by handler (http, playwright, flaresolverr).", "kind", SECONDS
+    ),
+    "scraper_response_bytes": MetricSpec("histogram", "Size of the response bodies.", "kind", BYTES),
+    "scraper_extract_seconds": MetricSpec(
+        "histogram",
+        "Time to select the rows of a page (rows) or parse a field of a row (parse_*).",
+        "step",
+        MICROSECONDS,
+    ),
+    "scraper_pipeline_seconds": MetricSpec(
+        "histogram",
+        "Time an item spends in the item pipelines, by outcome (passed, or the reason it was dropped).",
+        "outcome",
+        SECONDS,
+    ),
+    "scraper_rows_total": MetricSpec("counter", "Rows selected from the pages."),
+    "scraper_items_total": MetricSpec("counter", "Items that went through all the item pipelines."),
+    "scraper_items_dropped_total": MetricSpec("counter", "Items dropped before or in the item pipelines.", "reason"),
+    "scraper_items_per_second": MetricSpec("gauge", "Items per second of the running jobs, over the last interval."),
+}
+
+
+class Histogram:
+    """Observation counts per bucket of `bounds` (not cumulative, the last one is +Inf), their sum and count."""
+
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Metrics:
+    """Registry of the histograms, counters and gauges of a crawl, or of several added up."""
+
+    def __init__(self) -> None:
+        self.histograms: dict[Key, Histogram] = {}
+        self.counters: dict[Key, float] = {}
+        self.gauges: dict[Key, float] = {}
+
+    def histogram(self, name: str, spider: str, label: str = "") -> Histogram:
+        """Return the histogram of `name` for `spider` and `label`, to observe values on hot paths."""
+        key = (name, spider, label)
+        if (histogram := self.histograms.get(key)) is None:
+            histogram = self.histograms[key] = Histogram(METRICS[name].buckets)
+        return histogram
+
+    def inc(self, name: str, spider: str, label: str = "", value: float = 1) -> None:
+        key = (name, spider, label)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name: str, spider: str, label: str = "", value: float = 0) -> None:
+        self.gauges[name, spider, label] = value
+
+    def add(self, other: "Metrics") -> None:
+        """Add the histograms, counters and gauges of `other` to these."""
+        for key, histogram in other.histograms.items():
+            mine = self.histogram(*key)
+            if mine.bounds != histogram.bounds:  # the buckets changed since `other` was saved
+                continue
+            mine.counts = [a + b for a, b in zip(mine.counts, histogram.counts, strict=True)]
+            mine.sum += histogram.sum
+        for key, value in other.counters.items():
+            self.inc(*key, value=value)
+        for key, value in other.gauges.items():
+            self.gauges[key] = self.gauges.get(key, 0) + value
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "histograms": [[*key, h.bounds, h.counts, h.sum] for key, h in self.histograms.items()],
+            "counters": [[*key, value] for key, value in self.counters.items()],
+            "gauges": [[*key, value] for key, value in self.gauges.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "Metrics":
+        metrics = cls()
+        for name, spider, label, bounds, counts, total in data.get("histograms", ()):
+            if name in METRICS:
+                histogram = metrics.histograms[name, spider, label] = Histogram(tuple(bounds))
+                histogram.counts, histogram.sum = counts, total
+        metrics.counters = {(n, s, lb): v for n, s, lb, v in data.get("counters", ()) if n in METRICS}
+        metrics.gauges = {(n, s, lb): v for n, s, lb, v in data.get("gauges", ()) if n in METRICS}
+        return metrics
+
+
+def load_metrics(path: Path) -> Metrics:
+    with contextlib.suppress(OSError, ValueError):
+        return Metrics.from_dict(json.loads(path.read_bytes()))
+    return Metrics()
+
+
+def save_metrics(path: Path, metrics: Metrics) -> None:
+    """Replace `path` with `metrics` atomically, readers never see a partly written file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f"{path.suffix}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(metrics.to_dict()))
+    tmp.replace(path)
+
+
+@contextlib.contextmanager
+def locked(directory: Path) -> Iterator[None]:
+    """Hold the lock of the totals of `directory`, for consistent reads while jobs are added to them."""
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / f"{TOTALS_FILE}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def add_to_totals(directory: Path, paths: list[Path]) -> None:
+    """Add the job files at `paths` (without their gauges) to the totals of `directory` and remove them."""
+    totals = load_metrics(directory / TOTALS_FILE)
+    for path in paths:
+        metrics = load_metrics(path)
+        metrics.gauges.clear()
+        totals.add(metrics)
+    save_metrics(directory / TOTALS_FILE, totals)
+    for path in paths:
+        path.unlink(missing_ok=True)
+
+
+def close_job(path: Path, metrics: Metrics) -> None:
+    """Save the final `metrics` of the job file at `path` and move them into the totals."""
+    with locked(path.parent):
+        save_metrics(path, metrics)
+        add_to_totals(path.parent, [path])
+
+
+def collect(directory: str | Path, stale_after: float = 300) -> Metrics:
+    """Return the totals of `directory` plus the metrics of its running jobs.
+
+    Job files not updated for `stale_after` seconds are of jobs that died before closing, they are
+    added to the totals.
+    """
+    directory = Path(directory)
+    with locked(directory):
+        jobs: list[Path] = []
+        stale: list[Path] = []
+        for path in directory.glob("*.json"):
+            with contextlib.suppress(OSError):
+                if path.name != TOTALS_FILE:
+                    (stale if path.stat().st_mtime < time.time() - stale_after else jobs).append(path)
+        if stale:
+            add_to_totals(directory, stale)
+        metrics = load_metrics(directory / TOTALS_FILE)
+        for path in jobs:
+            metrics.add(load_metrics(path))
+    return metrics
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def labels(spider: str, name: str, value: str, *extra: tuple[str, str]) -> str:
+    pairs = [("spider", spider), *([(name, value)] if name else []), *extra]
+    return "{" + ",".join(f'{key}="{escape(text)}"' for key, text in pairs) + "}"
+
+
+def to_prometheus(metrics: Metrics) -> str:
+    """Return `metrics` in the Prometheus text exposition format."""
+    lines = []
+    for name, spec in METRICS.items():
+        lines += [f"# HELP {name} {spec.help}", f"# TYPE {name} {spec.type}"]
+        if spec.type == "histogram":
+            for (metric, spider, label), histogram in sorted(metrics.histograms.items()):
+                if metric != name or not any(histogram.counts):
+                    continue
+                cumulative = 0
+                for bound, count in zip((*histogram.bounds, "+Inf"), histogram.counts, strict=True):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{labels(spider, spec.label, label, ('le', str(bound)))} {cumulative}")
+                lines.append(f"{name}_sum{labels(spider, spec.label, label)} {histogram.sum!r}")
+                lines.append(f"{name}_count{labels(spider, spec.label, label)} {cumulative}")
+        else:
+            values = metrics.counters if spec.type == "counter" else metrics.gauges
+            for (metric, spider, label), value in sorted(values.items()):
+                if metric == name:
+                    lines.append(f"{name}{labels(spider, spec.label, label)} {value!r}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,217 @@
+import asyncio
+import json
+from collections.abc import AsyncIterator, Iterable, Iterator
+from typing import Any, Self
+from urllib.parse import urlsplit
+
+from scrapy import Request, Spider
+from scrapy.crawler import Crawler
+from scrapy.exceptions import NotConfigured
+from scrapy.http import Response
+from scrapy.statscollectors import StatsCollector
+from scrapy.utils.defer import maybe_deferred_to_future
+
+from scraper.clearance import ClearanceCache, ClearanceTypedDict, cookie_header, is_challenge, to_clearance
+from scraper.items import ProxyItem, ProxyRecord, is_valid_proxy
+from scraper.types import FlareSolverrResponseTypedDict, FlareSolverrSolutionTypedDict
+
+proxy_invalid = object()  # signal sent with the item, response and spider of every invalid proxy dropped
+
+
+class FlareSolverrMiddleware:
+    """Cloudflare clearance from FlareSolverr for spiders with `use_flaresolverr`.
+
+    The solve is sent through the engine, so the reactor keeps running while FlareSolverr works.
+    Clearances (cookies + the user agent they were issued to) are cached per domain, on disk when
+    `FLARESOLVERR_CACHE_FILE` is set, and reused by later runs and other processes until they expire.
+    Once the crawl runs, the file is only read and written in threads, around a solve.
+    A response that is still a challenge page drops the clearance it was sent with and is retried
+    with a fresh one, at most `FLARESOLVERR_MAX_RESOLVES` times per request.
+    """
+
+    def __init__(
+        self,
+        crawler: Crawler,
+        url: str,
+        cache: ClearanceCache,
+        ttl: float = 1800,
+        max_timeout: int = 60000,
+        max_resolves: int = 1,
+    ) -> None:
+        self.crawler = crawler
+        self.url = url
+        self.cache = cache
+        self.ttl = ttl
+        self.max_timeout = max_timeout
+        self.max_resolves = max_resolves
+        self.locks: dict[str, asyncio.Lock] = {}
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler) -> Self:
+        settings = crawler.settings
+        if not (url := settings.get("FLARESOLVERR_URL")):
+            raise NotConfigured("FLARESOLVERR_URL is not set")
+        return cls(
+            crawler=crawler,
+            url=url,
+            cache=ClearanceCache(settings.get("FLARESOLVERR_CACHE_FILE")),
+            ttl=settings.getfloat("FLARESOLVERR_CACHE_TTL", 1800),
+            max_timeout=settings.getint("FLARESOLVERR_MAX_TIMEOUT", 60000),
+            max_resolves=settings.getint("FLARESOLVERR_MAX_RESOLVES", 1),
+        )
+
+    def handles(self, request: Request, spider: Spider) -> bool:
+        # the spider whose callback gets the response, which is not the crawling one for the `all` spider
+        owner = getattr(request.callback, "__self__", spider)
+        return getattr(owner, "use_flaresolverr", False) and not request.meta.get("dont_flaresolverr")
+
+    async def process_request(self, request: Request, spider: Spider) -> None:
+        if not self.handles(request, spider):
+            return
+        if clearance := await self.get_clearance(request.url, spider):
+            self.apply(request, clearance)
+
+    async def process_response(self, request: Request, response: Response, spider: Spider) -> Request | Response:
+        if not self.handles(request, spider) or not is_challenge(response):
+            return response
+        self.crawler.stats.inc_value("flaresolverr/challenge")
+        resolves = request.meta.get("flaresolverr_resolves", 0)
+        if resolves >= self.max_resolves:
+            return response
+        stale = request.meta.get("flaresolverr_solved_at", 0.0)
+        if not await self.get_clearance(request.url, spider, stale=stale):
+            return response
+        spider.logger.info("Retrying %s with a new clearance", request)
+        meta = {**request.meta, "flaresolverr_resolves": resolves + 1, "dont_cache": True}
+        return request.replace(meta=meta, dont_filter=True)
+
+    async def get_clearance(self, url: str, spider: Spider, stale: float | None = None) -> ClearanceTypedDict | None:
+        """Return the cached clearance for the domain of `url`, solving a new one if there is none.
+
+        A clearance solved at `stale` is the one a challenge page was returned for, it is replaced.
+        Concurrent requests to the same domain wait for a single solve.
+        """
+        domain = urlsplit(url).hostname or ""
+        clearance = self.cache.get(domain)
+        if clearance is not None and clearance["solved_at"] != stale:
+            return clearance
+        async with self.locks.setdefault(domain, asyncio.Lock()):
+            await maybe_deferred_to_future(self.cache.refresh())
+            clearance = self.cache.get(domain)  # solved by another request (or process) meanwhile
+            if clearance is not None and clearance["solved_at"] != stale:
+                return clearance
+            if stale is not None:
+                await maybe_deferred_to_future(self.cache.delete(domain, solved_at=stale))
+            if (solution := await self.solve_challenge(url, spider)) is None:
+                return None
+            clearance = to_clearance(solution, self.ttl)
+            await maybe_deferred_to_future(self.cache.set(domain, clearance))
+            return clearance
+
+    async def solve_challenge(self, url: str, spider: Spider) -> FlareSolverrSolutionTypedDict | None:
+        request = Request(
+            self.url,
+            method="POST",
+            body=json.dumps({"cmd": "request.get", "url": url, "maxTimeout": self.max_timeout}),
+            headers={"Content-Type": "application/json"},
+            meta={
+                "dont_flaresolverr": True,
+                "dont_cache": True,
+                "dont_obey_robotstxt": True,
+                "download_timeout": self.max_timeout / 1000 + 30,
+            },
+            dont_filter=True,
+        )
+        try:
+            response = await maybe_deferred_to_future(self.crawler.engine.download(request))
+            data: FlareSolverrResponseTypedDict = json.loads(response.body)
+        except Exception as e:
+            spider.logger.error("FlareSolverr error: %r", e)
+            self.crawler.stats.inc_value("flaresolverr/failed")
+            return None
+
+        solution = data.get("solution")
+        if not solution or "cookies" not in solution or "userAgent" not in solution:
+            spider.logger.error("FlareSolverr error: either solution or cookies not found: %s", data)
+            self.crawler.stats.inc_value("flaresolverr/failed")
+            return None
+        spider.logger.info("FlareSolverr solved the challenge of %s", url)
+        self.crawler.stats.inc_value("flaresolverr/solved")
+        return solution
+
+    def apply(self, request: Request, clearance: ClearanceTypedDict) -> None:
+        """Send `request` with the clearance cookies and the user agent they were issued to."""
+        cookies = request.cookies
+        if isinstance(cookies, dict):
+            cookies = [{"name": name, "value": value} for name, value in cookies.items()]
+        names = {c["name"] for c in clearance["cookies"]}
+        request.cookies = [c for c in cookies if c["name"] not in names] + clearance["cookies"]
+        # also set as header, the cookies middleware (when enabled) rebuilds it from `request.cookies`
+        request.headers["Cookie"] = cookie_header(request.cookies)
+        request.headers["User-Agent"] = clearance["user_agent"]
+        request.meta["flaresolverr_solved_at"] = clearance["solved_at"]
+
+
+class ProxyValidationMiddleware:
+    """Drop scraped proxies without a valid IPv4 address and port (1-65535) before the item pipelines.
+
+    Catches what the loose extraction patterns let through, e.g. 999.999.999.999 or the port 0 of a
+    row whose port could not be parsed. Other spider output is passed through unchanged.
+    """
+
+    def __init__(self, crawler: Crawler) -> None:
+        self.crawler = crawler
+        self.stats = crawler.stats
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler) -> Self:
+        if not crawler.settings.getbool("VALIDATION_ENABLED", True):
+            raise NotConfigured("VALIDATION_ENABLED is off")
+        return cls(crawler=crawler)
+
+    def process_spider_output(self, response: Response, result: Iterable[Any], spider: Spider) -> Iterator[Any]:
+        for output in result:
+            if self.is_valid(output, response, spider):
+                yield output
+
+    async def process_spider_output_async(
+        self, response: Response, result: AsyncIterator[Any], spider: Spider
+    ) -> AsyncIterator[Any]:
+        async for output in result:
+            if self.is_valid(output, response, spider):
+                yield output
+
+    def is_valid(self, output: Any, response: Response, spider: Spider) -> bool:
+        if not isinstance(output, (ProxyRecord, ProxyItem)) or is_valid_proxy(output):
+            return True
+        self.stats.inc_value("validation/invalid")
+        self.crawler.signals.send_catch_log(proxy_invalid, item=output, response=response, spider=spider)
+        spider.logger.debug("Dropped invalid proxy %r", output)
+        return False
+
+
+class FixtureCaptureMiddleware:
+    """Save every response a spider callback gets as a fixture in `FIXTURES_CAPTURE_DIR`, see `scraper.fixtures`.
+
+    For `benchmarks/parse.py`, e.g. `scrapy crawl geonode -s FIXTURES_CAPTURE_DIR=benchmarks/fixtures`.
+    """
+
+    def __init__(self, stats: StatsCollector, directory: str) -> None:
+        from scraper.fixtures import save_fixture
+
+        self.stats = stats
+        self.directory = directory
+        self.save_fixture = save_fixture
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler) -> Self:
+        if not (directory := crawler.settings.get("FIXTURES_CAPTURE_DIR")):
+            raise NotConfigured("FIXTURES_CAPTURE_DIR is not set")
+        return cls(stats=crawler.stats, directory=directory)
+
+    def process_spider_input(self, response: Response, spider: Spider) -> None:
+        request = response.request
+        owner = getattr(request.callback, "__self__", spider) if request is not None else spider
+        path = self.save_fixture(self.directory, owner.name, response)
+        self.stats.inc_value("fixtures/captured")
+        spider.logger.debug("Captured %s as %s", response, path)
@@ -0,0 +1,163 @@
+"""Row extraction off the reactor: a response's items are extracted in a thread or process pool.
+
+With `PARSE_EXECUTOR` set, `BaseSpider.parse_offloaded` is the callback of the spiders' requests.
+It prepares the response on the reactor as `parse` does, then `ParseExecutor.stream`s the items of
+`BaseSpider.extract_rows` back to the engine, so downloads, Playwright and FlareSolverr are
+serviced while a large page is parsed:
+
+    "thread"   the extraction generator is advanced `PARSE_CHUNK_SIZE` items at a time in a pool
+               thread, the next chunk being extracted while the engine takes the current one. Only
+               one chunk is ahead of the engine, so a slow pipeline slows the extraction down too.
+               lxml releases the GIL while it parses, the XPath and regex work of the rows does not.
+    "process"  the body is sent to a pool process, which extracts the items with a spider of the
+               same class, created there with the crawl's spider arguments and frozen settings, and
+               sends them back `PARSE_CHUNK_SIZE` at a time through a queue holding one chunk
+               ahead of the engine. At most one page per pool process is sent at once, the others
+               wait on the reactor. Pages are parsed on several cores, the extraction there is not
+               timed by `MetricsExtension` and the spider there keeps no state across pages of
+               another process, e.g. what it learnt from a page (`extract_rows` must not need it).
+
+`PARSE_EXECUTOR_WORKERS` is the pool size, by default the CPUs the process may run on.
+"""
+
+import asyncio
+import functools
+import itertools
+import multiprocessing
+import os
+from collections.abc import AsyncIterator, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from queue import Queue
+from typing import Any
+from weakref import WeakKeyDictionary
+
+from scrapy import Spider, signals
+from scrapy.crawler import Crawler
+from scrapy.http import Response, TextResponse
+from scrapy.settings import Settings
+
+EXECUTORS = ("thread", "process")
+# how a pool process creates the spider of a crawl: its class, id in the crawl's process, arguments and settings
+SpiderSpec = tuple[type[Spider], int, dict[str, Any], dict[str, Any]]
+_executors: "WeakKeyDictionary[Crawler, ParseExecutor | None]" = WeakKeyDictionary()
+_spiders: dict[tuple[type[Spider], int], Spider] = {}  # (class, id in the crawl process) -> spider of a pool process
+
+
+def available_cpus() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def take(iterator: Iterator[Any], n: int) -> list[Any]:
+    return list(itertools.islice(iterator, n))
+
+
+def worker_spider(spidercls: type[Spider], key: int, arguments: dict[str, Any], settings: dict[str, Any]) -> Spider:
+    """Return the spider `key` of this pool process, created on its first page like the crawl's spider."""
+    if (spider := _spiders.get((spidercls, key))) is None:
+        spider = _spiders[(spidercls, key)] = spidercls(**arguments)
+        spider.settings = Settings(settings, priority="cmdline").frozencopy()
+    return spider
+
+
+def extract_in_process(
+    spider: SpiderSpec,
+    method: str,
+    response: tuple[type[Response], str, int, bytes, dict[str, Any]],
+    chunks: "Queue[tuple[list[Any], bool]]",
+    chunk_size: int,
+    **kwargs: Any,
+) -> None:
+    """Put the items `method` of the worker's spider extracts from the `response` sent by `ParseExecutor` on `chunks`.
+
+    They are put as `(items, done)`, `chunk_size` items at a time, the last one done even if the extraction failed.
+    """
+    try:
+        responsecls, url, status, body, response_kwargs = response
+        extract = getattr(worker_spider(*spider), method)
+        iterator = extract(responsecls(url, status=status, body=body, **response_kwargs), **kwargs)
+        while chunk := take(iterator, chunk_size):
+            chunks.put((chunk, False))
+    finally:
+        chunks.put(([], True))
+
+
+class ParseExecutor:
+    """Thread or process pool extracting the items of responses, see the module docstring."""
+
+    def __init__(self, kind: str, workers: int = 0, chunk_size: int = 100) -> None:
+        workers = workers or available_cpus()
+        self.kind = kind
+        self.chunk_size = chunk_size
+        self.pool: Executor
+        if kind == "thread":
+            self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="parse")
+        elif kind == "process":  # not forked from the process running the reactor
+            context = multiprocessing.get_context("spawn")
+            self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            self.manager = context.Manager()  # serves the queues of the chunks
+            self.slots = asyncio.Semaphore(workers)  # pages in the pool, the bodies of the others are not sent yet
+            self.spiders: WeakKeyDictionary[Spider, SpiderSpec] = WeakKeyDictionary()
+        else:
+            raise ValueError(f"Unknown PARSE_EXECUTOR {kind!r}, use one of {list(EXECUTORS)}")
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler) -> "ParseExecutor | None":
+        """Return the executor shared by the spiders of `crawler`, None if `PARSE_EXECUTOR` is not set."""
+        if crawler not in _executors:
+            settings = crawler.settings
+            executor = None
+            if kind := settings.get("PARSE_EXECUTOR"):
+                executor = cls(
+                    kind, settings.getint("PARSE_EXECUTOR_WORKERS"), settings.getint("PARSE_CHUNK_SIZE", 100)
+                )
+                crawler.signals.connect(executor.close, signal=signals.engine_stopped)
+            _executors[crawler] = executor
+        return _executors[crawler]
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        if self.kind == "process":
+            self.manager.shutdown()
+
+    async def stream(self, spider: Spider, method: str, response: Response, **kwargs: Any) -> AsyncIterator[Any]:
+        """Yield the items of `getattr(spider, method)(response, **kwargs)`, extracted in the pool."""
+        if self.kind == "process":
+            async for item in self.stream_from_process(spider, method, response, **kwargs):
+                yield item
+            return
+
+        loop = asyncio.get_running_loop()
+        iterator = getattr(spider, method)(response, **kwargs)
+        pending = loop.run_in_executor(self.pool, take, iterator, self.chunk_size)
+        while chunk := await pending:
+            # the next chunk is extracted while the engine takes this one, the iterator is only ever in one thread
+            pending = loop.run_in_executor(self.pool, take, iterator, self.chunk_size)
+            for item in chunk:
+                yield item
+
+    async def stream_from_process(
+        self, spider: Spider, method: str, response: Response, **kwargs: Any
+    ) -> AsyncIterator[Any]:
+        """`stream` of the process pool, once one of its `slots` is free."""
+        loop = asyncio.get_running_loop()
+        response_kwargs = {"encoding": response.encoding} if isinstance(response, TextResponse) else {}
+        sent = (type(response), response.url, response.status, response.body, response_kwargs)
+        if (created := self.spiders.get(spider)) is None:  # how the pool processes create it
+            settings = spider.settings.copy_to_dict() if hasattr(spider, "settings") else {}
+            created = self.spiders[spider] = (type(spider), id(spider), getattr(spider, "arguments", {}), settings)
+        async with self.slots:
+            chunks = self.manager.Queue(maxsize=1)  # one chunk ahead of the engine
+            call = functools.partial(extract_in_process, created, method, sent, chunks, self.chunk_size, **kwargs)
+            extraction = loop.run_in_executor(self.pool, call)
+            done = False
+            try:
+                while not done:
+                    items, done = await loop.run_in_executor(None, chunks.get)
+                    for item in items:
+                        yield item
+            finally:
+                while not done:  # the engine stopped taking them, the process must not wait on a full queue
+                    _, done = await loop.run_in_executor(None, chunks.get)
+            await extraction  # raises the error of the extraction
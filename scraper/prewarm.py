@@ -0,0 +1,119 @@
+"""Prewarmed scrapyd job process, kept idle by `scraper.launcher.PrewarmedLauncher` until it is handed a job.
+
+    SCRAPY_PROJECT=scraper python -m scraper.prewarm
+
+Like `scrapyd.runner`, the latest egg of the project is activated. Then the Twisted reactor of the
+project settings is installed and Scrapy, the crawl components of the settings and every spider are
+imported, and "ready" is written to stdout. The job is read from stdin, a JSON line of the `args`
+and `env` scrapyd would spawn `scrapyd.runner` with, and crawled in this process, with what a cold
+start spends importing already done. A job it was not warmed for (another project, runner, egg
+version or reactor) is exec'd as the cold process instead, keeping the pid scrapyd knows.
+"""
+
+import json
+import os
+import sys
+import time
+from importlib import import_module
+from typing import Any, NoReturn
+
+from scrapy.settings import Settings
+from scrapy.utils.misc import load_object
+from scrapy.utils.project import get_project_settings
+from scrapy.utils.reactor import install_reactor
+from scrapyd.config import Config
+from scrapyd.eggutils import activate_egg
+
+RUNNER = "scrapyd.runner"
+# settings of component paths (the keys) and of download handlers and feed classes (the values)
+COMPONENT_SETTINGS = ("DOWNLOADER_MIDDLEWARES", "SPIDER_MIDDLEWARES", "EXTENSIONS", "ITEM_PIPELINES", "ADDONS")
+HANDLER_SETTINGS = ("DOWNLOAD_HANDLERS", "FEED_EXPORTERS", "FEED_STORAGES")
+OBJECT_SETTINGS = (
+    "SCHEDULER",
+    "SCHEDULER_PRIORITY_QUEUE",
+    "SCHEDULER_MEMORY_QUEUE",
+    "SCHEDULER_DISK_QUEUE",
+    "DUPEFILTER_CLASS",
+    "DOWNLOADER",
+    "STATS_CLASS",
+    "LOG_FORMATTER",
+    "REQUEST_FINGERPRINTER_CLASS",
+    "HTTPCACHE_STORAGE",
+    "HTTPCACHE_POLICY",
+)
+# imported by the command and the crawler process rather than through a setting
+MODULES = ("scrapy.cmdline", "scrapy.commands.crawl", "scrapy.crawler", "scrapy.core.engine", "scrapy.core.scraper")
+
+
+def egg(project: str) -> tuple[str | None, Any]:
+    """Return the version and open egg file of the latest egg of `project`, (None, None) if it has none."""
+    config = Config()
+    storage = load_object(config.get("eggstorage", "scrapyd.eggstorage.FilesystemEggStorage"))(config)
+    return storage.get(project)  # type: ignore[no-any-return]
+
+
+def warm_up(project: str) -> tuple[str | None, Settings]:
+    """Activate the latest egg of `project` and import what its crawls do, return the egg version and settings."""
+    version, eggfile = egg(project)
+    for name in [name for name in sys.modules if name.partition(".")[0] == __package__]:
+        del sys.modules[name]  # imported again after the egg, from where a cold start would import it
+    if eggfile:
+        activate_egg(eggfile.name)
+        eggfile.close()
+    settings = get_project_settings()
+    if settings.get("TWISTED_REACTOR"):  # the job installs the same one, which Scrapy then finds installed
+        install_reactor(settings["TWISTED_REACTOR"], settings["ASYNCIO_EVENT_LOOP"])
+    paths = [*MODULES, *(settings[name] for name in OBJECT_SETTINGS if isinstance(settings[name], str))]
+    for name in COMPONENT_SETTINGS:
+        paths += [path for path in settings.getwithbase(name) if isinstance(path, str)]
+    for name in HANDLER_SETTINGS:
+        paths += [path for path in settings.getwithbase(name).values() if isinstance(path, str)]
+    for path in paths:
+        try:
+            import_module(path) if path in MODULES else load_object(path)
+        except Exception as e:  # the job reports it, e.g. an optional dependency that is not installed
+            print(f"Not prewarmed: {path}: {e}", file=sys.stderr)
+    load_object(settings["SPIDER_LOADER_CLASS"]).from_settings(settings.frozencopy())  # imports every spider
+    return version, settings
+
+
+def cold(args: list[str], env: dict[str, str], reason: str) -> NoReturn:
+    print(f"Starting the job cold: {reason}", file=sys.stderr, flush=True)
+    os.execve(sys.executable, args, env)
+
+
+def run(job: dict[str, Any], project: str, version: str | None, settings: Settings) -> NoReturn:
+    """Crawl `job` in this process, or exec it cold if the process was not warmed for it."""
+    args, env = job["args"], job["env"]
+    if args[1:3] != ["-m", RUNNER] or env.get("SCRAPY_PROJECT") != project:
+        cold(args, env, f"not a {RUNNER} job of {project}")
+    if (env.get("SCRAPYD_EGG_VERSION") or egg(project)[0]) != version:
+        cold(args, env, f"not egg version {version}")
+    if any(arg.startswith(("TWISTED_REACTOR=", "ASYNCIO_EVENT_LOOP=")) for arg in args):
+        cold(args, env, f"not the {settings['TWISTED_REACTOR']} reactor")
+
+    settings_module = os.environ.get("SCRAPY_SETTINGS_MODULE")  # set by the egg, not in the job's environment
+    os.environ.clear()
+    os.environ.update(env)
+    if settings_module:
+        os.environ.setdefault("SCRAPY_SETTINGS_MODULE", settings_module)
+    from scrapy.cmdline import execute
+
+    sys.argv = [RUNNER, *args[3:]]
+    execute(sys.argv)
+    sys.exit(0)
+
+
+def main() -> None:
+    project = os.environ["SCRAPY_PROJECT"]
+    start = time.perf_counter()
+    version, settings = warm_up(project)
+    print(f"ready: {project} {version or '(no egg)'} in {time.perf_counter() - start:.2f}s", flush=True)
+    line = sys.stdin.readline()
+    if not line:  # scrapyd stopped
+        return
+    run(json.loads(line), project, version, settings)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Recurring crawls scheduled by scrapyd itself, instead of a cron calling `schedule.json`.
+
+In scrapyd.conf, the spiders of `recurring_project` and their intervals (s, m, h or d), each
+optionally with a `priority=` and `render` for the spiders that may start a browser:
+
+    application = scraper.recurring.application
+
+    [recurring]
+    freeproxylist = 15m
+    proxyscrape   = 10m priority=1
+    spysone       = 1h render
+
+A spider is queued once its interval (give or take `recurring_jitter` of it) has passed since
+its last job finished, manual jobs included, and never while a job of it is pending or running.
+A `render` spider also waits for the other `render` spiders, so at most one browser runs. The
+next run is postponed until `recurring_fresh_for` after the last job (the crawls'
+`HTTPCACHE_EXPIRATION_SECS`), as it would only replay the cached pages. The interval doubles
+after every job that scraped nothing (a failing source) or the same proxies as the job before
+(a source whose list has not changed), up to `recurring_backoff_max`, and is back to normal once
+a job scrapes new proxies.
+"""
+
+import hashlib
+import json
+import random
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from scrapyd.app import application as scrapyd_application
+from scrapyd.config import Config
+from scrapyd.interfaces import IJobStorage, ISpiderScheduler
+from twisted.application.service import IServiceCollection, Service
+from twisted.internet.defer import inlineCallbacks
+from twisted.internet.task import LoopingCall
+from twisted.internet.threads import deferToThread
+from twisted.logger import Logger
+
+UNITS = {"": 1, "s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+DURATION = re.compile(r"(\d+(?:\.\d+)?)\s*([smhd]?)", re.IGNORECASE)
+
+logger = Logger()
+
+
+def parse_duration(text: str) -> float:
+    """Return the seconds of `text`, e.g. "90", "15m" or "1.5h"."""
+    if not (match := DURATION.fullmatch(text.strip())):
+        raise ValueError(f"Invalid duration: {text!r}")
+    return float(match.group(1)) * UNITS[match.group(2).lower()]
+
+
+@dataclass
+class Recurrence:
+    """A spider run every `interval` seconds and what the scheduler knows of its last jobs."""
+
+    spider: str
+    interval: float
+    priority: float = 0.0
+    render: bool = False
+    due: float = 0.0  # when it is queued next, unless a job of it is pending or running
+    last_job: str = ""  # the last finished job seen
+    fingerprint: str = ""  # of the proxies of the last finished job
+    failures: int = 0  # jobs in a row that scraped nothing
+    unchanged: int = 0  # jobs in a row that scraped the same proxies as the one before
+
+    @classmethod
+    def parse(cls, spider: str, value: str) -> "Recurrence":
+        """Return the recurrence of a `[recurring]` line, `<interval> [priority=<p>] [render]`."""
+        interval, *options = value.split()
+        recurrence = cls(spider, parse_duration(interval))
+        for option in options:
+            name, _, setting = option.partition("=")
+            if name == "priority" and setting:
+                recurrence.priority = float(setting)
+            elif name == "render" and not setting:
+                recurrence.render = True
+            else:
+                raise ValueError(f"Invalid option of recurring spider {spider!r}: {option!r}")
+        return recurrence
+
+
+def fingerprint_items(path: Path) -> tuple[int, str]:
+    """Return the number of items of a job's items file and a hash of its proxies (ip, port, protocol)."""
+    proxies = set()
+    try:
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(item, dict) and item.get("ip"):
+                    proxies.add(f"{item['ip']}:{item.get('port')}/{item.get('protocol') or ''}")
+    except OSError:
+        return 0, ""
+    return len(proxies), hashlib.sha1("\n".join(sorted(proxies)).encode()).hexdigest() if proxies else ""
+
+
+class RecurringScheduler(Service):
+    """Scrapyd service queueing the `[recurring]` spiders of `recurring_project`, see the module docstring."""
+
+    name = "recurring"
+
+    def __init__(self, config: Config, app: Any) -> None:
+        self.app = app
+        self.project = config.get("recurring_project", "scraper")
+        self.jitter: float = config.getfloat("recurring_jitter", 0.1)
+        self.fresh_for = parse_duration(config.get("recurring_fresh_for", "5m"))
+        self.backoff_max = parse_duration(config.get("recurring_backoff_max", "6h"))
+        self.poll_interval = config.getfloat("poll_interval", 5)
+        items_dir = config.get("items_dir", "")
+        self.items_dir = Path(items_dir) if items_dir and "://" not in items_dir else None
+        self.recurrences = [Recurrence.parse(spider, value) for spider, value in config.items("recurring", ())]
+        now = time.time()
+        for recurrence in self.recurrences:  # spread over the first jitter, not all at once when scrapyd starts
+            recurrence.due = now + random.uniform(0, self.jitter) * recurrence.interval
+        self.ticker = LoopingCall(self.tick)
+
+    def startService(self) -> None:  # noqa: N802
+        super().startService()  # type: ignore[no-untyped-call]
+        if self.recurrences:
+            self.ticker.start(self.poll_interval, now=True)
+            logger.info(
+                "Recurring crawls of project {project!r}: {spiders}",
+                project=self.project,
+                spiders=", ".join(f"{r.spider} every {r.interval:g}s" for r in self.recurrences),
+            )
+
+    def stopService(self) -> None:  # noqa: N802
+        if self.ticker.running:
+            self.ticker.stop()
+        super().stopService()  # type: ignore[no-untyped-call]
+
+    def delay(self, recurrence: Recurrence) -> float:
+        """Return the seconds from a finished job to the next, with the backoff and jitter."""
+        backoff = 1 << min(recurrence.failures + recurrence.unchanged, 16)
+        interval = max(recurrence.interval, min(recurrence.interval * backoff, self.backoff_max))
+        return max(interval * random.uniform(1 - self.jitter, 1 + self.jitter), self.fresh_for)
+
+    @inlineCallbacks
+    def tick(self) -> Any:
+        try:  # an error would stop the ticker
+            yield self.schedule_due()
+        except Exception:
+            logger.failure("Failed to schedule the recurring crawls")
+
+    @inlineCallbacks
+    def schedule_due(self) -> Any:
+        launcher = self.app.getComponent(IServiceCollection).getServiceNamed("launcher")
+        scheduler = self.app.getComponent(ISpiderScheduler)
+        if (queue := scheduler.queues.get(self.project)) is None:
+            return  # not deployed yet
+        busy = {process.spider for process in launcher.processes.values() if process.project == self.project}
+        busy.update(message["name"] for message in queue.list())
+        finished: dict[str, Any] = {}  # spider -> its last finished job
+        for job in self.app.getComponent(IJobStorage).list():
+            if job.project == self.project and (
+                job.spider not in finished or job.end_time > finished[job.spider].end_time
+            ):
+                finished[job.spider] = job
+
+        renders = {r.spider for r in self.recurrences if r.render}
+        now = time.time()
+        for recurrence in self.recurrences:
+            if (job := finished.get(recurrence.spider)) is not None and job.job != recurrence.last_job:
+                recurrence.last_job = job.job
+                yield self.observe(recurrence, job)
+                recurrence.due = job.end_time.timestamp() + self.delay(recurrence)
+            if now < recurrence.due or recurrence.spider in busy or (recurrence.render and busy & renders):
+                continue
+            jobid = uuid.uuid1().hex
+            scheduler.schedule(self.project, recurrence.spider, priority=recurrence.priority, _job=jobid)
+            busy.add(recurrence.spider)
+            recurrence.due = now + self.delay(recurrence)  # in case the job is never seen finishing
+            logger.info("Scheduled recurring job {job} of {spider!r}", job=jobid, spider=recurrence.spider)
+
+    @inlineCallbacks
+    def observe(self, recurrence: Recurrence, job: Any) -> Any:
+        """Count a failure or an unchanged list from the items of the finished `job`."""
+        if self.items_dir is None:
+            return
+        path = self.items_dir / job.project / job.spider / f"{job.job}.jl"
+        items, fingerprint = yield deferToThread(fingerprint_items, path)  # type: ignore[no-untyped-call]
+        recurrence.failures = recurrence.failures + 1 if not items else 0
+        recurrence.unchanged = recurrence.unchanged + 1 if items and fingerprint == recurrence.fingerprint else 0
+        recurrence.fingerprint = fingerprint or recurrence.fingerprint
+        if recurrence.failures or recurrence.unchanged:
+            logger.info(
+                "Backing off {spider!r}: {failures} jobs without items, {unchanged} with the same proxies",
+                spider=recurrence.spider,
+                failures=recurrence.failures,
+                unchanged=recurrence.unchanged,
+            )
+
+
+def application(config: Config) -> Any:
+    """Return scrapyd's application with a `RecurringScheduler`, the `application` of scrapyd.conf."""
+    app = scrapyd_application(config)
+    RecurringScheduler(config, app).setServiceParent(app)  # type: ignore[no-untyped-call]
+    return app
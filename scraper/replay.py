@@ -0,0 +1,208 @@
+"""Local stand-in for the proxy sites, serving captured fixtures (see `scraper.fixtures`) to `REPLAY_URL` crawls.
+
+Crawls with `REPLAY_URL` set send every request to this server through `ReplayDownloadHandler`, as
+an HTTP proxy with the original URL, so spiders, URLs and domains are unchanged. Pages are looked
+up by method and URL (the scheme aside), or by URL alone, e.g. for a POST recorded as a GET. POSTs
+to `/v1` get a FlareSolverr-like solution, for `FLARESOLVERR_URL={REPLAY_URL}/v1`.
+
+    python -m scraper.replay --fixtures benchmarks/fixtures --latency 0.2 --error-rate 0.05 --amplify 20
+    scrapy crawl all -s REPLAY_URL=http://127.0.0.1:8765 -s FLARESOLVERR_URL=http://127.0.0.1:8765/v1
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import NamedTuple
+from urllib.parse import urlsplit
+
+from scraper.agents import USER_AGENTS
+from scraper.fixtures import Fixture, load_fixtures
+
+IPV4 = re.compile(rb"\b(\d{1,3})\.(\d{1,3})\.(\d{1,3})\.(\d{1,3})\b")
+TABLE_ROW = re.compile(rb"<tr\b.*?</tr>", re.DOTALL | re.IGNORECASE)
+PROXY_LINE = re.compile(rb"^[^\n]*\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}:\d{1,5}[^\n]*\n?", re.MULTILINE)
+# recorded headers that no longer describe the served body
+STALE_HEADERS = {"content-length", "content-encoding", "transfer-encoding", "connection", "date"}
+SOLUTION = {
+    "status": "ok",
+    "message": "Challenge solved!",
+    "solution": {
+        "cookies": [{"name": "cf_clearance", "value": "replay", "domain": "", "path": "/"}],
+        "userAgent": USER_AGENTS[0],
+    },
+}
+
+
+class Page(NamedTuple):
+    status: int
+    headers: list[tuple[str, str]]
+    body: bytes
+
+
+def url_key(url: str) -> str:
+    """Return `url` without its scheme, requests are replayed over plain HTTP."""
+    parts = urlsplit(url)
+    return f"{parts.netloc}{parts.path or '/'}{'?' if parts.query else ''}{parts.query}"
+
+
+def shift_ips(data: bytes, copy: int) -> bytes:
+    """Return `data` with the IPv4 addresses changed for the `copy`-th copy, so copies are not duplicates."""
+
+    def shift(match: re.Match[bytes]) -> bytes:
+        a, b, c, d = (int(octet) for octet in match.groups())
+        number = ((a << 24) | (b << 16) | (c << 8) | d) + copy * 7919  # a prime step spreads the copies
+        return b"%d.%d.%d.%d" % (number >> 24 & 0xFF, number >> 16 & 0xFF, number >> 8 & 0xFF, number & 0xFF)
+
+    return IPV4.sub(shift, data)
+
+
+def amplify(body: bytes, factor: int) -> bytes:
+    """Repeat every proxy row (table rows, or `ip:port` lines) of `body` `factor` times in total."""
+    if factor <= 1:
+        return body
+    rows = TABLE_ROW if b"<tr" in body[:1_000_000].lower() else PROXY_LINE
+
+    def repeat(match: re.Match[bytes]) -> bytes:
+        row = match.group(0)
+        if not IPV4.search(row):
+            return row
+        copies = [shift_ips(row, copy) for copy in range(1, factor)]
+        if not row.endswith(b"\n") and rows is PROXY_LINE:  # the last line of a list
+            return b"\n".join([row, *copies])
+        return row + b"".join(copies)
+
+    return rows.sub(repeat, body)
+
+
+def to_page(fixture: Fixture, factor: int) -> Page:
+    response = fixture.response
+    headers = [
+        (key.decode("latin-1"), value.decode("latin-1"))
+        for key, values in response.headers.items()
+        if key.decode("latin-1").lower() not in STALE_HEADERS
+        for value in values
+    ]
+    return Page(response.status, headers, amplify(response.body, factor))
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """Serves `fixtures` after `latency` seconds on average, failing with a 503 at `error_rate`."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        fixtures: list[Fixture],
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        factor: int = 1,
+        seed: int | None = None,
+    ) -> None:
+        super().__init__(address, ReplayHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.pages: dict[tuple[str, str], Page] = {}
+        for fixture in fixtures:
+            page = to_page(fixture, factor)
+            key = url_key(fixture.response.url)
+            self.pages[fixture.response.request.method if fixture.response.request else "GET", key] = page
+            self.pages.setdefault(("", key), page)  # any method
+        self.counts: Counter[str] = Counter()
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def find(self, method: str, url: str) -> Page | None:
+        key = url_key(url)
+        return self.pages.get((method, key)) or self.pages.get(("", key))
+
+    def count(self, what: str) -> None:
+        with self.lock:
+            self.counts[what] += 1
+
+    def delay(self) -> float:
+        with self.lock:
+            return self.random.uniform(0, 2 * self.latency) if self.latency else 0.0
+
+    def fails(self) -> bool:
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    server: ReplayServer
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:  # noqa: N802
+        self.replay()
+
+    def do_POST(self) -> None:  # noqa: N802
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if urlsplit(self.path).path == "/v1":  # FlareSolverr
+            self.server.count("flaresolverr")
+            self.send(Page(200, [("Content-Type", "application/json")], json.dumps(SOLUTION).encode()))
+        else:
+            self.replay()
+
+    def replay(self) -> None:
+        # as a proxy the request line holds the full URL, otherwise rebuild it from the Host header
+        url = self.path if "://" in self.path else f"http://{self.headers.get('Host', '')}{self.path}"
+        time.sleep(self.server.delay())
+        if self.server.fails():
+            self.server.count("error")
+            self.send(Page(503, [("Content-Type", "text/plain")], b"Replayed error"))
+        elif (page := self.server.find(self.command, url)) is None:
+            self.server.count("missing")
+            self.send(Page(404, [("Content-Type", "text/plain")], b"No fixture for " + url.encode()))
+        else:
+            self.server.count("served")
+            self.send(page)
+
+    def send(self, page: Page) -> None:
+        self.send_response(page.status)
+        for key, value in page.headers:
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(page.body)))
+        self.end_headers()
+        self.wfile.write(page.body)
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", type=Path, default=Path("benchmarks/fixtures"))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="mean seconds before each response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 503")
+    parser.add_argument("--amplify", type=int, default=1, help="serve every proxy row this many times")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    fixtures = list(load_fixtures(args.fixtures))
+    server = ReplayServer((args.host, args.port), fixtures, args.latency, args.error_rate, args.amplify, args.seed)
+    print(f"Replaying {len(fixtures)} fixtures of {args.fixtures} on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(dict(server.counts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""Proxy quality across jobs: rolling statistics per proxy and yield per source, in one SQLite file.
+
+Each job adds what it observed once it closes (see `ProxyScoreExtension`): every proxy scraped is
+seen, and checked alive or dead when the proxy check ran. Per proxy (ip, port, protocol) the file
+keeps the seen, check and success counts, an EWMA of the check outcomes (`reliability`) and of the
+latency, and the first, last seen and last success times. The score is a stored column,
+
+    score = reliability * checks / (checks + 1) / (1 + latency)
+
+so a proxy with a history beats one lucky check, and the proxies that ever worked are indexed by
+score per protocol and country: the best are read from the top of an index rather than sorted
+from all of them. Per source
+(`ProxyItem.source`) the file keeps the items, checked and alive counts and an EWMA of the share of
+checked proxies alive per job.
+
+    python -m scraper.scores scores.db --best 20 --protocol socks5 --country US
+    python -m scraper.scores scores.db --sources
+"""
+
+import argparse
+import sqlite3
+import time
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Self
+
+from scraper.dedup import pack_proxy
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS proxy_scores (
+    proxy INTEGER PRIMARY KEY,  -- `pack_proxy(ip, port, protocol)`
+    ip TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    protocol TEXT NOT NULL DEFAULT '',
+    country TEXT NOT NULL DEFAULT '',
+    source TEXT NOT NULL DEFAULT '',
+    seen INTEGER NOT NULL,
+    checks INTEGER NOT NULL,
+    successes INTEGER NOT NULL,
+    reliability REAL,
+    latency REAL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    last_success REAL,
+    score REAL GENERATED ALWAYS AS (
+        coalesce(reliability, 0) * checks / (checks + 1.0) / (1 + coalesce(latency, 0))
+    ) STORED
+);
+-- only proxies that ever worked are ranked, most are never alive and their updates skip the indexes
+CREATE INDEX IF NOT EXISTS proxy_scores_protocol_country ON proxy_scores (protocol, country, score DESC)
+WHERE score > 0;
+CREATE INDEX IF NOT EXISTS proxy_scores_protocol ON proxy_scores (protocol, score DESC) WHERE score > 0;
+CREATE INDEX IF NOT EXISTS proxy_scores_country ON proxy_scores (country, score DESC) WHERE score > 0;
+CREATE INDEX IF NOT EXISTS proxy_scores_score ON proxy_scores (score DESC) WHERE score > 0;
+CREATE TABLE IF NOT EXISTS source_scores (
+    source TEXT PRIMARY KEY,
+    jobs INTEGER NOT NULL,
+    items INTEGER NOT NULL,
+    checked INTEGER NOT NULL,
+    alive INTEGER NOT NULL,
+    alive_rate REAL,
+    last_job REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+# ?1 packed proxy, ?2 ip, ?3 port, ?4 protocol, ?5 country, ?6 source, ?7 checked, ?8 alive, ?9 latency, ?10 now,
+# ?11 EWMA alpha
+UPDATE_PROXY = """
+INSERT INTO proxy_scores (
+    proxy, ip, port, protocol, country, source, seen, checks, successes, reliability, latency, first_seen,
+    last_seen, last_success
+)
+VALUES (?1, ?2, ?3, ?4, ?5, ?6, 1, ?7, ?8, CASE WHEN ?7 THEN ?8 END, ?9, ?10, ?10, CASE WHEN ?8 THEN ?10 END)
+ON CONFLICT (proxy) DO UPDATE SET
+    country = coalesce(nullif(excluded.country, ''), country),
+    source = excluded.source,
+    seen = seen + 1,
+    checks = checks + excluded.checks,
+    successes = successes + excluded.successes,
+    reliability = CASE WHEN ?7 THEN ?11 * ?8 + (1 - ?11) * coalesce(reliability, ?8) ELSE reliability END,
+    latency = CASE WHEN ?9 IS NULL THEN latency ELSE ?11 * ?9 + (1 - ?11) * coalesce(latency, ?9) END,
+    last_seen = excluded.last_seen,
+    last_success = coalesce(excluded.last_success, last_success)
+"""
+# ?1 source, ?2 items, ?3 checked, ?4 alive, ?5 alive share of the job, ?6 now, ?7 EWMA alpha
+UPDATE_SOURCE = """
+INSERT INTO source_scores (source, jobs, items, checked, alive, alive_rate, last_job)
+VALUES (?1, 1, ?2, ?3, ?4, ?5, ?6)
+ON CONFLICT (source) DO UPDATE SET
+    jobs = jobs + 1,
+    items = items + excluded.items,
+    checked = checked + excluded.checked,
+    alive = alive + excluded.alive,
+    alive_rate = CASE WHEN ?5 IS NULL THEN alive_rate ELSE ?7 * ?5 + (1 - ?7) * coalesce(alive_rate, ?5) END,
+    last_job = excluded.last_job
+"""
+PROXY_COLUMNS = (
+    "ip, port, protocol, country, source, seen, checks, successes, reliability, latency, last_seen, last_success, score"
+)
+
+
+class Observations:
+    """What a job saw of its proxies and sources, one outcome per proxy (the last one)."""
+
+    def __init__(self) -> None:
+        # packed proxy -> ip, port, protocol, country, source, alive, latency
+        self.proxies: dict[int, tuple[str, int, str, str, str, bool | None, float | None]] = {}
+        self.sources: dict[str, list[int]] = {}  # source -> [items, checked, alive]
+
+    def __len__(self) -> int:
+        return len(self.proxies)
+
+    def add(self, item: Any, alive: bool | None = None) -> None:
+        """Add a scraped `item`, alive (or not) if it was checked, by default as the check left it.
+
+        The check sets `protocols` to those working, empty if none did, and leaves it unset if it
+        did not run. Alive proxies are seen under each working protocol.
+        """
+        ip, port = item.get("ip"), item.get("port")
+        protocols = item.get("protocols")
+        if alive is None and protocols is not None:
+            alive = bool(protocols)
+        country, source, latency = item.get("country") or "", item.get("source") or "", item.get("latency")
+        for protocol in protocols if alive and protocols else [item.get("protocol") or ""]:
+            try:
+                key = pack_proxy(ip, port, protocol)
+            except (OSError, ValueError):
+                return  # not a valid IPv4 proxy
+            self.proxies[key] = (ip, port, protocol, country, source, alive, latency if alive else None)
+        counts = self.sources.setdefault(source, [0, 0, 0])
+        counts[0] += 1
+        if alive is not None:
+            counts[1] += 1
+            counts[2] += alive
+
+
+class ScoreBook:
+    """SQLite file of proxy and source scores, see the module docstring.
+
+    Not thread safe, use it from one thread at a time.
+    """
+
+    def __init__(self, path: str | Path, alpha: float = 0.3) -> None:
+        self.path = Path(path)
+        self.alpha = alpha  # EWMA weight of the latest job
+        self.connection: sqlite3.Connection | None = None
+
+    def __enter__(self) -> Self:
+        self.open()
+        return self
+
+    def __exit__(self, *exc_info: type[BaseException] | BaseException | TracebackType | None) -> None:
+        self.close()
+
+    def open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode = WAL")  # readers do not wait for a job's update
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.execute("PRAGMA cache_size = -65536")  # KiB, the indexes a job's update walks stay cached
+        self.connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def update(self, observations: Observations, now: float | None = None) -> None:
+        """Add the `observations` of a job in a single transaction."""
+        if self.connection is None:
+            raise RuntimeError("ScoreBook is not open")
+        now, alpha = now or time.time(), self.alpha
+        with self.connection:
+            self.connection.executemany(
+                UPDATE_PROXY,
+                (  # in key order, so the upserts walk the table rather than jump around it
+                    (key, ip, port, protocol, country, source, alive is not None, bool(alive), latency, now, alpha)
+                    for key, (ip, port, protocol, country, source, alive, latency) in sorted(
+                        observations.proxies.items()
+                    )
+                ),
+            )
+            self.connection.executemany(
+                UPDATE_SOURCE,
+                (
+                    (source, items, checked, alive, alive / checked if checked else None, now, alpha)
+                    for source, (items, checked, alive) in observations.sources.items()
+                ),
+            )
+
+    def best(self, n: int = 20, protocol: str = "", country: str = "", max_age: float = 0) -> list[dict[str, Any]]:
+        """Return the `n` best proxies, of `protocol` and in `country` if given, best first.
+
+        With `max_age` (seconds), only proxies last seen working since then.
+        """
+        if self.connection is None:
+            raise RuntimeError("ScoreBook is not open")
+        where = ["score > 0"]  # also what the partial indexes cover
+        params: list[Any] = []
+        if protocol:
+            where.append("protocol = ?")
+            params.append(protocol)
+        if country:
+            where.append("country = ?")
+            params.append(country.upper())
+        if max_age > 0:
+            where.append("last_success >= ?")
+            params.append(time.time() - max_age)
+        cursor = self.connection.execute(
+            f"SELECT {PROXY_COLUMNS} FROM proxy_scores WHERE {' AND '.join(where)} ORDER BY score DESC LIMIT ?",
+            (*params, n),
+        )
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row, strict=True)) for row in cursor]
+
+    def sources(self) -> list[dict[str, Any]]:
+        """Return the sources, the highest share of alive proxies first."""
+        if self.connection is None:
+            raise RuntimeError("ScoreBook is not open")
+        cursor = self.connection.execute("SELECT * FROM source_scores ORDER BY alive_rate DESC, alive DESC")
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row, strict=True)) for row in cursor]
+
+
+def update_scores(path: str | Path, observations: Observations, alpha: float = 0.3) -> int:
+    """Add the `observations` of a job to the scores at `path`, return the number of proxies updated."""
+    with ScoreBook(path, alpha) as book:
+        book.update(observations)
+    return len(observations)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", type=Path, help="the SCORES_FILE of the crawls")
+    parser.add_argument("--best", type=int, default=20, metavar="N")
+    parser.add_argument("--protocol", default="")
+    parser.add_argument("--country", default="")
+    parser.add_argument("--max-age", type=float, default=0, help="seconds since the last success")
+    parser.add_argument("--sources", action="store_true", help="list the sources instead")
+    args = parser.parse_args()
+
+    if not args.file.is_file():
+        parser.error(f"{args.file} does not exist")
+    with ScoreBook(args.file) as book:
+        if args.sources:
+            for source in book.sources():
+                rate = "-" if source["alive_rate"] is None else f"{source['alive_rate']:.2f}"
+                alive = f"{source['alive']}/{source['checked']}"
+                print(f"{source['source']:<16}{rate:>6}{alive:>16}{source['jobs']:>6} jobs")
+            return
+        for proxy in book.best(args.best, args.protocol, args.country, args.max_age):
+            latency = "-" if proxy["latency"] is None else f"{proxy['latency']:.3f}s"
+            print(
+                f"{proxy['protocol'] or '-'}://{proxy['ip']}:{proxy['port']}\t{proxy['country'] or '-'}\t"
+                f"{proxy['score']:.3f}\t{proxy['successes']}/{proxy['checks']}\t{latency}\t{proxy['source']}"
+            )
+
+
+if __name__ == "__main__":
+    main()
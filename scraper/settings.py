@@ -12,6 +12,7 @@ BOT_NAME = "scraper"
 
 SPIDER_MODULES = ["scraper.spiders"]
 NEWSPIDER_MODULE = "scraper.spiders"
+COMMANDS_MODULE = "scraper.commands"
 
 
 # Crawl responsibly by identifying yourself (and your website) on the user-agent
@@ -49,33 +50,105 @@ COOKIES_ENABLED = False
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-# SPIDER_MIDDLEWARES = {
-#     "scraper.middlewares.ScraperSpiderMiddleware": 100,
-# }
+SPIDER_MIDDLEWARES = {
+    "scraper.middlewares.FixtureCaptureMiddleware": 50,
+    "scraper.middlewares.ProxyValidationMiddleware": 100,
+}
+
+# Save the responses the spiders parse as fixtures for `benchmarks/parse.py`, e.g. benchmarks/fixtures
+FIXTURES_CAPTURE_DIR = os.getenv("FIXTURES_CAPTURE_DIR")
+# Download from a `python -m scraper.replay` server of fixtures instead of the sites, e.g. http://127.0.0.1:8765
+REPLAY_URL = os.getenv("REPLAY_URL")
+
+# Drop scraped proxies with an invalid IPv4 address or port before the item pipelines
+VALIDATION_ENABLED = True
+
+# Extract the rows of the pages in a "thread" or "process" pool instead of on the reactor, see `scraper.offload`
+PARSE_EXECUTOR = ""
+PARSE_EXECUTOR_WORKERS = 0  # 0 for the CPUs available
+PARSE_CHUNK_SIZE = 100  # items extracted ahead of the engine per page
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-# DOWNLOADER_MIDDLEWARES = {
-#     "scrapy.downloadermiddlewares.httpcompression.HttpCompressionMiddleware": 810,
-# }
+DOWNLOADER_MIDDLEWARES = {
+    # before the cookies middleware (700), after decompression (590) for responses
+    "scraper.middlewares.FlareSolverrMiddleware": 560,
+}
 
 # https://github.com/scrapy-plugins/scrapy-playwright#activation
-DOWNLOAD_HANDLERS = {
-    "http": "scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler",
-    "https": "scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler",
+# Only applied to spiders with `use_playwright` or `deobfuscate` (and not replaying), see `set_download_handlers`
+PLAYWRIGHT_DOWNLOAD_HANDLERS = {
+    "http": "scraper.handlers.LazyPlaywrightDownloadHandler",
+    "https": "scraper.handlers.LazyPlaywrightDownloadHandler",
 }
+PLAYWRIGHT_LAUNCH_OPTIONS = {"args": ["--disable-gpu", "--disable-dev-shm-usage"]}
+# a small pool of warm browser contexts, requests are spread over them in round robin
+PLAYWRIGHT_CONTEXT_POOL_SIZE = 2
+PLAYWRIGHT_CONTEXTS = {f"lean-{i}": {"service_workers": "block"} for i in range(PLAYWRIGHT_CONTEXT_POOL_SIZE)}
+PLAYWRIGHT_REPORT_MEMORY = True  # JS heap size per rendered page in the crawl stats
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-# EXTENSIONS = {
-#     "scrapy.extensions.telnet.TelnetConsole": None,
-# }
+EXTENSIONS = {
+    # "scrapy.extensions.telnet.TelnetConsole": None,
+    "scrapy.extensions.throttle.AutoThrottle": None,
+    "scraper.extensions.SlotAutoThrottle": 0,  # AutoThrottle keeping the `DOWNLOAD_SLOTS` settings
+    "scraper.extensions.MetricsExtension": 500,
+    "scraper.extensions.ProxyScoreExtension": 510,
+    "scraper.extensions.LiveFeedExtension": 520,
+}
+
+# Per-spider timings and counters for the scrapyd `/metrics` endpoint, the `metrics_dir` of scrapyd.conf
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_FLUSH_INTERVAL = 15  # seconds between writes of the running job's metrics
+METRICS_FIELD_SAMPLE_RATE = 0.1  # share of the pages whose field parsers are timed, every call costs ~5% of a parse
+
+# Proxy quality across jobs (reliability and latency per proxy, yield per source), see `python -m scraper.scores`
+SCORES_FILE = os.getenv("SCORES_FILE")  # e.g. /var/lib/scrapyd/scores.db
+SCORES_EWMA_ALPHA = 0.3  # weight of the latest job in the rolling reliability, latency and alive share
+
+# Push every proxy passed on by the pipelines to the scrapyd `/live` feed as it is scraped
+LIVE_FEED_ADDRESS = os.getenv("LIVE_FEED_ADDRESS")  # e.g. 127.0.0.1:6801, the `live_feed_port` of scrapyd.conf
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-# ITEM_PIPELINES = {
-#     "scraper.pipelines.ProxyPipeline": 300,
-# }
+ITEM_PIPELINES = {
+    "scraper.pipelines.MetricsPipeline": 100,  # only with `METRICS_DIR`
+    "scraper.pipelines.DedupPipeline": 200,
+    "scraper.pipelines.GeoIPPipeline": 250,
+    "scraper.pipelines.ProxyCheckPipeline": 300,
+    "scraper.pipelines.StorePipeline": 400,
+}
+
+# Deduplication of proxies across the spiders of a run, and across runs when persisted
+DEDUP_ENABLED = True
+DEDUP_BACKEND = "bloom"  # "bloom" (compact, ~0.1% false positives) or "set" (exact, 8+ bytes per proxy)
+DEDUP_CAPACITY = 1_000_000  # bloom only, the persisted filter is reset once this many proxies were added
+DEDUP_ERROR_RATE = 0.001  # bloom only
+DEDUP_PERSIST_FILE = os.getenv("DEDUP_PERSIST_FILE")  # e.g. /var/lib/scrapyd/dedup.bin
+DEDUP_PASS_SEEN = False  # pass on the proxies of earlier runs (counted as `dedup/seen_before`) instead of dropping them
+
+# Country and ASN of the proxies from a local IPv4 range index, built with `python -m scraper.geoip`
+GEOIP_FILE = os.getenv("GEOIP_FILE")  # e.g. /var/lib/scrapyd/geoip.bin
+GEOIP_OVERWRITE = False  # replace the scraped countries too, not only the missing ones
+
+# Proxy liveness checks through a judge endpoint that echoes the request back, off unless set to 1 or true
+PROXY_CHECK_ENABLED = os.getenv("PROXY_CHECK_ENABLED") or "false"
+PROXY_CHECK_JUDGE_URL = os.getenv("PROXY_CHECK_JUDGE_URL") or "http://httpbin.org/get"
+PROXY_CHECK_JUDGE_URL_HTTPS = os.getenv("PROXY_CHECK_JUDGE_URL_HTTPS") or "https://httpbin.org/get"
+PROXY_CHECK_ORIGIN_IP = os.getenv("PROXY_CHECK_ORIGIN_IP")  # detected through the judge if not set
+PROXY_CHECK_PROTOCOLS = ["http", "https", "socks4", "socks5"]
+PROXY_CHECK_CONCURRENCY = 100  # proxies checked at once, each with its protocols probed concurrently
+PROXY_CHECK_CONCURRENCY_PER_HOST = 2  # probes of a proxy at once
+PROXY_CHECK_CONNECT_TIMEOUT = 3
+PROXY_CHECK_TIMEOUT = 8
+PROXY_CHECK_DROP_DEAD = True
+
+# Persistent SQLite store of every proxy seen, upserted in batches by ip/port/protocol, off unless set to 1 or true
+STORE_ENABLED = os.getenv("STORE_ENABLED") or "false"
+STORE_FILE = os.getenv("STORE_FILE")  # e.g. /var/lib/scrapyd/proxies.db, by default in the project's .scrapy dir
+STORE_FLUSH_SIZE = 1000  # items per transaction
+STORE_FLUSH_INTERVAL = 5  # seconds, items waiting longer are written even if the batch is not full
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
@@ -96,11 +169,16 @@ HTTPCACHE_ENABLED = True
 HTTPCACHE_EXPIRATION_SECS = 5 * 60  # 5 minutes
 HTTPCACHE_DIR = "httpcache"
 HTTPCACHE_IGNORE_HTTP_CODES: list[int] = []
-HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
-HTTPCACHE_GZIP = True
+# one SQLite file shared by the jobs of every process, instead of a directory tree of files per request
+HTTPCACHE_STORAGE = "scraper.httpcache.SQLiteCacheStorage"
+HTTPCACHE_COMPRESSION = "zlib"  # zlib, lzma or "" (none), bodies the server compressed are kept as they are
+HTTPCACHE_MAX_SIZE = 256 * 1024 * 1024  # bytes, the least recently used responses are evicted beyond it
+HTTPCACHE_PRUNE_INTERVAL = 60  # seconds between evictions of the expired and LRU responses
 
 # Set settings whose default value is deprecated to a future-proof value
 REQUEST_FINGERPRINTER_IMPLEMENTATION = "2.7"
+# rendered requests are cached apart from the plain ones of the same URL
+REQUEST_FINGERPRINTER_CLASS = "scraper.httpcache.RenderingRequestFingerprinter"
 TWISTED_REACTOR = "twisted.internet.asyncioreactor.AsyncioSelectorReactor"
 
 # https://docs.scrapy.org/en/latest/topics/feed-exports.html
@@ -115,7 +193,21 @@ TWISTED_REACTOR = "twisted.internet.asyncioreactor.AsyncioSelectorReactor"
 #             "export_empty_fields": True,
 #         },
 #     },
+#     # packed binary snapshot, read with `scraper.snapshot.ProxySnapshot`, replaced once complete
+#     "atomic:proxies.bin": {"format": "proxysnap"},
 # }
 FEED_EXPORT_ENCODING = "utf-8"
+FEED_EXPORTERS = {"proxysnap": "scraper.exporters.SnapshotItemExporter"}
+# `atomic:` feed URIs are local files replaced once complete, other feeds (e.g. scrapyd's items) are left as they are
+FEED_STORAGES = {"atomic": "scraper.exporters.AtomicFileFeedStorage"}
 
 FLARESOLVERR_URL = os.getenv("FLARESOLVERR_URL")
+# clearances are shared by domain across spiders, and across runs and processes when cached to a file
+FLARESOLVERR_CACHE_FILE = os.getenv("FLARESOLVERR_CACHE_FILE")  # e.g. /var/lib/scrapyd/clearance.json
+FLARESOLVERR_CACHE_TTL = 30 * 60  # 30 minutes, or until a clearance cookie expires
+FLARESOLVERR_MAX_TIMEOUT = 60000  # milliseconds FlareSolverr may take to solve a challenge
+FLARESOLVERR_MAX_RESOLVES = 1  # new clearances per request still answered with a challenge page
+
+# Per-domain download slots with their own "concurrency", "delay" or "randomize_delay"
+# the pages of the geonode proxy list API downloaded at once, started a quarter second apart
+DOWNLOAD_SLOTS = {"proxylist.geonode.com": {"concurrency": 4, "delay": 0.25}}
@@ -0,0 +1,186 @@
+"""Packed binary proxy snapshots, written by `SnapshotItemExporter` and read with `ProxySnapshot`.
+
+Layout (little endian):
+
+    header   magic "PXSN", version u16, string table count u16, record count u32, records offset u32
+    tables   per table (protocol, anonymity, country, source): count u16, then per string: length u8 + utf-8
+    records  at `records offset` (8-byte aligned), 12 bytes each:
+             ip u32, port u16, protocol u8, anonymity u8, country u8, source u8, latency ms u16
+
+String codes index their table, code 0 is always "" (unknown), a latency of 0xFFFF is unknown.
+"""
+
+import mmap
+import operator
+import socket
+import struct
+from collections.abc import Iterator
+from pathlib import Path
+from types import TracebackType
+from typing import Any, NamedTuple, Self
+
+MAGIC = b"PXSN"
+VERSION = 1
+HEADER = struct.Struct("<4sHHII")
+RECORD = struct.Struct("<IHBBBBH")
+TABLES = ("protocol", "anonymity", "country", "source")
+NO_LATENCY = 0xFFFF
+# NumPy dtype of a record, for zero-copy structured array views
+DTYPE = {
+    "names": ["ip", "port", "protocol", "anonymity", "country", "source", "latency_ms"],
+    "formats": ["<u4", "<u2", "u1", "u1", "u1", "u1", "<u2"],
+    "offsets": [0, 4, 6, 7, 8, 9, 10],
+    "itemsize": RECORD.size,
+}
+
+
+class SnapshotRecord(NamedTuple):
+    ip: str
+    port: int
+    protocol: str
+    anonymity: str
+    country: str
+    source: str
+    latency: float | None  # seconds
+
+
+class SnapshotWriter:
+    """Packs proxies into records and string tables, `to_bytes` returns the whole snapshot."""
+
+    def __init__(self) -> None:
+        self.tables: dict[str, dict[str, int]] = {table: {"": 0} for table in TABLES}
+        self.records = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.records) // RECORD.size
+
+    def code(self, table: str, value: str) -> int:
+        codes = self.tables[table]
+        if (code := codes.get(value)) is None:
+            if len(codes) > 0xFF:
+                raise ValueError(f"Too many distinct {table} values")
+            code = codes[value] = len(codes)
+        return code
+
+    def add(
+        self,
+        ip: str | int,
+        port: int,
+        protocol: str = "",
+        anonymity: str = "",
+        country: str = "",
+        source: str = "",
+        latency: float | None = None,
+    ) -> None:
+        """Add a proxy, raises OSError for an IP that is not IPv4 and struct.error for an invalid port."""
+        self.records += RECORD.pack(
+            ip if isinstance(ip, int) else int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big"),
+            port,
+            self.code("protocol", protocol),
+            self.code("anonymity", anonymity),
+            self.code("country", country),
+            self.code("source", source),
+            NO_LATENCY if latency is None else min(round(latency * 1000), NO_LATENCY - 1),
+        )
+
+    def to_bytes(self) -> bytes:
+        tables = bytearray()
+        for table in TABLES:
+            values = list(self.tables[table])  # in code order
+            tables += struct.pack("<H", len(values))
+            for value in values:
+                data = value.encode()[:0xFF]
+                tables += struct.pack("<B", len(data)) + data
+        offset = -(-(HEADER.size + len(tables)) // 8) * 8
+        header = HEADER.pack(MAGIC, VERSION, len(TABLES), len(self), offset)
+        return header + tables + bytes(offset - HEADER.size - len(tables)) + self.records
+
+
+class ProxySnapshot:
+    """Memory-mapped snapshot file, records are only decoded when iterated.
+
+    with ProxySnapshot("proxies.bin") as snapshot:
+        for proxy in snapshot.filter(protocol="socks5", country="US"):
+            ...
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, table_count, self.count, self.offset = HEADER.unpack_from(self.mmap)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a version {VERSION} proxy snapshot: {path}")
+        self.tables: dict[str, list[str]] = {}
+        position = HEADER.size
+        for table in TABLES[:table_count]:
+            (count,) = struct.unpack_from("<H", self.mmap, position)
+            position += 2
+            values = []
+            for _ in range(count):
+                length = self.mmap[position]
+                values.append(self.mmap[position + 1 : position + 1 + length].decode())
+                position += 1 + length
+            self.tables[table] = values
+        self.codes = {
+            table: {value: code for code, value in enumerate(values)} for table, values in self.tables.items()
+        }
+
+    def __len__(self) -> int:
+        return int(self.count)
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info: type[BaseException] | BaseException | TracebackType | None) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.mmap.close()
+
+    @property
+    def buffer(self) -> memoryview:
+        """The records, without copying them out of the mapped file."""
+        return memoryview(self.mmap)[self.offset : self.offset + self.count * RECORD.size]
+
+    def __iter__(self) -> Iterator[SnapshotRecord]:
+        return self.filter()
+
+    def filter(
+        self, protocol: str = "", anonymity: str = "", country: str = "", source: str = ""
+    ) -> Iterator[SnapshotRecord]:
+        """Iterate the proxies matching all non-empty filters, only matching records are decoded."""
+        indexes, codes = [], []
+        filters = (protocol.lower(), anonymity.lower(), country.upper(), source)
+        for index, (table, value) in enumerate(zip(TABLES, filters), start=2):
+            if value:
+                if (code := self.codes[table].get(value)) is None:
+                    return  # not in this snapshot
+                indexes.append(index)
+                codes.append(code)
+        # compares the codes of a record with a single call, e.g. (record[2], record[4]) == (3, 1)
+        select = operator.itemgetter(*indexes) if indexes else None
+        wanted = codes[0] if len(codes) == 1 else tuple(codes)
+        protocols, anonymities, countries, sources = (self.tables[table] for table in TABLES)
+        with self.buffer as buffer:
+            for record in RECORD.iter_unpack(buffer):
+                if select is None or select(record) == wanted:
+                    ip, port, p, a, c, s, latency = record
+                    yield SnapshotRecord(
+                        socket.inet_ntoa(ip.to_bytes(4, "big")),
+                        port,
+                        protocols[p],
+                        anonymities[a],
+                        countries[c],
+                        sources[s],
+                        None if latency == NO_LATENCY else latency / 1000,
+                    )
+
+    def array(self) -> Any:
+        """Return the records as a NumPy structured array viewing the mapped file (requires NumPy).
+
+        String fields hold codes, `self.codes` maps values to them, e.g.
+        `records[records["protocol"] == snapshot.codes["protocol"]["socks5"]]`.
+        """
+        import numpy as np
+
+        return np.frombuffer(self.mmap, dtype=np.dtype(DTYPE), count=self.count, offset=self.offset)
@@ -0,0 +1,53 @@
+from collections.abc import Generator, Iterator
+from typing import Any, Self
+
+import scrapy
+from scrapy.crawler import Crawler
+from scrapy.utils.misc import load_object
+
+from scraper.handlers import set_download_handlers
+
+
+class AllSpider(scrapy.Spider):  # type: ignore
+    """Runs every spider of the project, or those of the `spiders` argument, in this single crawl.
+
+        scrapy crawl all [-a spiders=freeproxylist,proxyscrape]   (or `scrapy crawlall`, or scheduled in scrapyd)
+
+    The spiders share one engine, so one downloader (HTTP cache, Playwright browser), one set of
+    pipelines (dedup, proxy check, store) and one feed of their merged items. Each spider still
+    parses its own responses, as the callbacks of its requests are its own methods. Other spider
+    arguments are passed to every spider.
+    """
+
+    name = "all"
+
+    def __init__(self, *args: Any, spiders: list[scrapy.Spider] | None = None, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.spiders: list[scrapy.Spider] = spiders or []
+        domains: list[list[str] | None] = [getattr(spider, "allowed_domains", None) for spider in self.spiders]
+        # the offsite middlewares only check the domains when every spider restricts them
+        self.allowed_domains = None if None in domains else sorted({d for ds in domains for d in ds or ()})
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler, *args: Any, **kwargs: Any) -> Self:
+        settings = crawler.settings
+        loader = load_object(settings["SPIDER_LOADER_CLASS"]).from_settings(settings.frozencopy())
+        names = kwargs.pop("spiders", "")
+        names = [n.strip() for n in names.split(",") if n.strip()] if names else sorted(loader.list())
+        spiders = [loader.load(name).from_crawler(crawler, **kwargs) for name in names if name != cls.name]
+        # settings are applied after the spider is created, see `BaseSpider.update_settings`
+        renders = any(
+            getattr(spider, "use_playwright", False) or getattr(spider, "deobfuscate", False) for spider in spiders
+        )
+        set_download_handlers(settings, renders)
+        return super().from_crawler(crawler, *args, spiders=spiders, **kwargs)  # type: ignore[no-any-return]
+
+    def start_requests(self) -> Generator[scrapy.Request, Any, None]:
+        """Take the start requests of the spiders in turn, so every source starts right away."""
+        queue: list[Iterator[scrapy.Request]] = [iter(spider.start_requests()) for spider in self.spiders]
+        while queue:
+            for requests in list(queue):
+                try:
+                    yield next(requests)
+                except StopIteration:
+                    queue.remove(requests)
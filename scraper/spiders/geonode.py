@@ -1,9 +1,28 @@
+import json
+import math
+from collections.abc import Generator
+from typing import Any
+from urllib.parse import urlencode
+
+import scrapy
+from scrapy.http import Response, TextResponse
+
 from scraper.base import BaseSpider
 from scraper.types import ElementPathsTypedDict
 
 
 class ProxyScrapeSpider(BaseSpider):
-    """
+    """https://proxylist.geonode.com/api/proxy-list, the JSON API behind the free proxy list page:
+        {
+            "data": [
+                {"ip": "47.112.157.97", "port": "8060", "protocols": ["socks5"], "country": "CN",
+                 "anonymityLevel": "elite", ...},
+                ... ... ...
+            ],
+            "total": 6123, "page": 1, "limit": 500
+        }
+
+    or the rendered page with `-a api=false`, only its first table page:
     <tbody
         <tr>
             <td ...><span ...>47.112.157.97</span></td>
@@ -22,7 +41,71 @@ class ProxyScrapeSpider(BaseSpider):
     name = "geonode"
     allowed_domains = ["geonode.com"]
     start_urls = ["https://geonode.com/free-proxy-list"]
-    use_playwright = True
+    use_playwright = False  # set for the rendered page, `-a api=false`
+
+    api_url = "https://proxylist.geonode.com/api/proxy-list"
+    page_size = 500  # the largest `limit` the API accepts
+
+    def __init__(self, name: str = None, api: str | bool = True, **kwargs: Any) -> None:  # type: ignore[assignment]
+        super().__init__(name=name, **kwargs)
+        self.use_api = str(api).lower() not in ("0", "false", "no", "off")
+        self.use_playwright = not self.use_api
+
+    def start_requests(self) -> Generator[scrapy.Request, Any, None]:
+        if not self.use_api:
+            yield from super().start_requests()
+            return
+        yield self.api_request(1, callback=self.parse_first_page)
+
+    def api_request(self, page: int, **kwargs: Any) -> scrapy.Request:
+        params = {"limit": self.page_size, "page": page, "sort_by": "lastChecked", "sort_type": "desc"}
+        return scrapy.Request(
+            f"{self.api_url}?{urlencode(params)}",
+            callback=kwargs.pop("callback", self.parse_api),
+            headers={**self.get_headers(), "Accept": "application/json"},
+            cookies=self.get_cookies(),
+            dont_filter=True,
+            **kwargs,
+        )
+
+    def parse_first_page(self, response: TextResponse, **kwargs: Any) -> Generator[Any, Any, None]:
+        """Parse the first page of the API and request the others, `total` being the number of proxies.
+
+        The other pages are downloaded from the slot of the API host, as many at once as its
+        `DOWNLOAD_SLOTS` concurrency allows.
+        """
+        data = self.load(response)
+        yield from self.parse_api(response, data=data)
+        pages = math.ceil(int(data.get("total") or 0) / self.page_size)
+        self.logger.info("Requesting the %d other pages of the API", max(pages - 1, 0))
+        for page in range(2, pages + 1):
+            yield self.api_request(page)
+
+    def parse_api(
+        self, response: TextResponse, data: dict[str, Any] | None = None, **kwargs: Any
+    ) -> Generator[Any, Any, None]:
+        """Map the proxies of a page of the API to items, one per protocol of a proxy."""
+        item_class = self.item_class
+        for proxy in (data if data is not None else self.load(response)).get("data") or ():
+            port = str(proxy.get("port") or "")
+            fields = {
+                "ip": str(proxy.get("ip") or ""),
+                "port": int(port) if port.isdigit() else 0,  # dropped by `ProxyValidationMiddleware`
+                "country": str(proxy.get("country") or "").upper(),
+                "anonymity": str(proxy.get("anonymityLevel") or "").lower(),
+            }
+            for protocol in proxy.get("protocols") or [""]:
+                yield item_class(**fields, protocol=str(protocol).lower(), source=self.name)
+
+    def load(self, response: Response) -> dict[str, Any]:
+        try:
+            data = json.loads(response.body)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            self.logger.error("Not a page of the proxy list API: %s", response)
+            return {}
+        return data
 
     def set_element_paths(self) -> ElementPathsTypedDict:
         return {
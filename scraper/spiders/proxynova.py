@@ -43,7 +43,7 @@ class ProxyNovaSpider(BaseSpider):
     name = "proxynova"
     allowed_domains = ["proxynova.com"]
     start_urls = ["https://www.proxynova.com/proxy-server-list/elite-proxies/"]
-    use_playwright = True
+    deobfuscate = True  # the IP addresses are written by a script
 
     def set_element_paths(self) -> ElementPathsTypedDict:
         return {
@@ -60,7 +60,7 @@ class ProxyNovaSpider(BaseSpider):
             ip_list = self.get_data(row, "./td[1]/abbr/text()", many=True)
         else:  # if there is no <abbr> tag
             ip_list = self.get_data(row, "./td[1]/text()", many=True)
-        ip = ip_list[-1] if len(ip_list) > 1 else ip_list[0]
+        ip = ip_list[-1] if ip_list else ""  # an empty cell is dropped by `ProxyValidationMiddleware`
         return self.match_data(ip, r"\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}")
 
     def parse_port(self, row: Selector) -> int:
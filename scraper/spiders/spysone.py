@@ -48,7 +48,7 @@ class ProxyScrapeSpider(BaseSpider):
     allowed_domains = ["spys.one"]
     start_urls = ["https://spys.one/en/anonymous-proxy-list/"]
     use_flaresolverr = True
-    use_playwright = True
+    deobfuscate = True  # the ports are XOR'd from the variables of a packed script
 
     def get_callback(self) -> tuple[Callable, dict[str, Any] | None]:  # type: ignore[type-arg]
         return self.prepare, {"cookies": self.cookies, "headers": self.headers, "meta": self.meta}
@@ -61,7 +61,7 @@ class ProxyScrapeSpider(BaseSpider):
             response,
             formdata=formdata,
             method="POST",
-            callback=self.parse,
+            callback=self.get_parse_callback(),
             **kwargs,  # cookies, headers and meta
         )
 
@@ -79,7 +79,8 @@ class ProxyScrapeSpider(BaseSpider):
         return response.xpath(xpath or self.paths["rows"])[1:]  # drop the first row
 
     def parse_port(self, row: Selector) -> int:
-        port = self.get_data(row, self.paths["port"], many=True)[-1]  # get the last element
+        ports = self.get_data(row, self.paths["port"], many=True)
+        port = ports[-1] if ports else ""  # get the last element, none in an empty cell
         port_match = self.match_data(port, r"\d{1,5}")
         return int(port_match) if port_match else 0  # return 0 if no port is found
 
@@ -0,0 +1,83 @@
+import sqlite3
+import time
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS proxies (
+    ip TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    protocol TEXT NOT NULL DEFAULT '',
+    country TEXT NOT NULL DEFAULT '',
+    anonymity TEXT NOT NULL DEFAULT '',
+    source TEXT NOT NULL DEFAULT '',
+    latency REAL,
+    first_seen INTEGER NOT NULL,
+    last_seen INTEGER NOT NULL,
+    PRIMARY KEY (ip, port, protocol)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS proxies_protocol ON proxies (protocol);
+CREATE INDEX IF NOT EXISTS proxies_country ON proxies (country);
+CREATE INDEX IF NOT EXISTS proxies_anonymity ON proxies (anonymity);
+"""
+
+# first_seen is kept, empty country/anonymity from a source that does not list them do not erase known ones
+UPSERT = """
+INSERT INTO proxies (ip, port, protocol, country, anonymity, source, latency, first_seen, last_seen)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (ip, port, protocol) DO UPDATE SET
+    country = coalesce(nullif(excluded.country, ''), country),
+    anonymity = coalesce(nullif(excluded.anonymity, ''), anonymity),
+    source = excluded.source,
+    latency = coalesce(excluded.latency, latency),
+    last_seen = excluded.last_seen
+"""
+
+Row = tuple[str, int, str, str, str, str, float | None, int, int]
+
+
+def to_row(item: Any, seen: int | None = None) -> Row:
+    """Return the `proxies` row of a ProxyItem, seen now unless `seen` is given."""
+    seen = seen or int(time.time())
+    return (
+        item["ip"],
+        item["port"],
+        item.get("protocol") or "",
+        item.get("country") or "",
+        item.get("anonymity") or "",
+        item.get("source") or "",
+        item.get("latency"),
+        seen,
+        seen,
+    )
+
+
+class ProxyStore:
+    """SQLite table of every proxy seen, keyed on ip/port/protocol with first and last seen times.
+
+    Not thread safe, use it from one thread at a time.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.connection: sqlite3.Connection | None = None
+
+    def open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode = WAL")  # readers do not wait for the crawl writing
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def upsert(self, rows: Iterable[Row]) -> None:
+        """Insert or update `rows` in a single transaction."""
+        if self.connection is None:
+            raise RuntimeError("ProxyStore is not open")
+        with self.connection:
+            self.connection.executemany(UPSERT, rows)
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
@@ -1,4 +1,4 @@
-from typing import TypedDict
+from typing import Any, NotRequired, TypedDict
 
 
 class FlareSolverrSolutionTypedDict(TypedDict):
@@ -27,6 +27,10 @@ class RequestMetaTypedDict(TypedDict):
     """TypedDict for request meta."""
 
     playwright: bool
+    playwright_context: NotRequired[str]
+    playwright_page_init_callback: NotRequired[Any]
+    playwright_page_goto_kwargs: NotRequired[dict[str, Any]]
+    playwright_page_methods: NotRequired[list[Any]]
 
 
 class ElementPathsTypedDict(TypedDict):
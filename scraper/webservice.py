@@ -0,0 +1,405 @@
+import itertools
+import json
+import random
+import time
+from bisect import bisect_left, insort
+from collections import deque
+from operator import itemgetter
+from pathlib import Path
+from typing import Any
+
+from scrapyd.config import Config
+from scrapyd.webservice import WsResource
+from twisted.internet import reactor
+from twisted.internet.defer import inlineCallbacks
+from twisted.internet.protocol import DatagramProtocol
+from twisted.internet.task import LoopingCall
+from twisted.internet.threads import deferToThread
+from twisted.logger import Logger
+from twisted.web.resource import Resource
+from twisted.web.server import NOT_DONE_YET
+
+from scraper.metrics import collect, to_prometheus
+
+Key = tuple[str, int, str]  # ip, port, protocol
+
+FIELDS = ("ip", "port", "protocol", "country", "anonymity", "latency", "source")
+INDEXED_FIELDS = ("protocol", "country", "anonymity")
+RANK = itemgetter("rank")  # the sort key of a proxy: no latency last, then the latency and when it was added
+MAX_LIMIT = 10_000
+PROMETHEUS_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = Logger()
+
+
+class ProxyIndex:
+    """Proxy pool keyed on ip/port/protocol, the latest item of a proxy replaces the earlier ones.
+
+    The proxies are kept fastest first as they are added and removed, in one list and in a list per
+    protocol, country and anonymity. Queries are answered from immutable `PoolSnapshot`s, so the
+    index can be updated on another thread; a snapshot copies the lists changed since the previous
+    one and shares the others with it.
+    """
+
+    def __init__(self) -> None:
+        self.proxies: dict[Key, dict[str, Any]] = {}
+        self.order: list[dict[str, Any]] = []
+        self.indexes: dict[str, dict[str, list[dict[str, Any]]]] = {field: {} for field in INDEXED_FIELDS}
+        self.changed: set[tuple[str, str]] = set()  # the lists changed since the last snapshot, ("", "") the order
+        self.last = PoolSnapshot()
+        self.added = itertools.count()  # proxies as fast as each other stay in the order they were added
+
+    def __len__(self) -> int:
+        return len(self.proxies)
+
+    def add(self, item: dict[str, Any], seen: float) -> None:
+        """Add or replace a proxy from a scraped item, `seen` at that time."""
+        key: Key = (item["ip"], item["port"], item.get("protocol") or "")
+        proxy = {field: item.get(field) or "" for field in FIELDS}
+        latency = item.get("latency")
+        # a proxy is found under every protocol the proxy check saw working, not only the listed one
+        proxy.update(latency=latency, protocols={key[2], *(item.get("protocols") or ())}, seen=seen)
+        proxy["rank"] = (latency is None, latency or 0, next(self.added))
+        if (earlier := self.proxies.get(key)) is not None:
+            self.remove(earlier)
+        self.proxies[key] = proxy
+        for field, value in self.lists(proxy):
+            insort(self.indexes[field].setdefault(value, []) if field else self.order, proxy, key=RANK)
+            self.changed.add((field, value))
+
+    def remove(self, proxy: dict[str, Any]) -> None:
+        for field, value in self.lists(proxy):
+            proxies = self.indexes[field][value] if field else self.order
+            del proxies[bisect_left(proxies, proxy["rank"], key=RANK)]
+            if field and not proxies:
+                del self.indexes[field][value]
+            self.changed.add((field, value))
+
+    def prune(self, before: float) -> int:
+        """Remove the proxies last seen before `before`, return how many."""
+        stale = [key for key, proxy in self.proxies.items() if proxy["seen"] < before]
+        for key in stale:
+            self.remove(self.proxies.pop(key))
+        return len(stale)
+
+    def snapshot(self) -> "PoolSnapshot":
+        order = list(self.order) if ("", "") in self.changed else self.last.order
+        indexes = {
+            field: {
+                value: list(proxies) if (field, value) in self.changed else self.last.indexes[field][value]
+                for value, proxies in index.items()
+            }
+            for field, index in self.indexes.items()
+        }
+        self.changed.clear()
+        self.last = PoolSnapshot(order, indexes)
+        return self.last
+
+    @staticmethod
+    def lists(proxy: dict[str, Any]) -> list[tuple[str, str]]:
+        """Return the field and value of the lists `proxy` is in, ("", "") for the order of all proxies."""
+        return [
+            ("", ""),
+            *(("protocol", protocol) for protocol in proxy["protocols"]),
+            ("country", proxy["country"]),
+            ("anonymity", proxy["anonymity"]),
+        ]
+
+
+class PoolSnapshot:
+    """Immutable copy of a `ProxyIndex`, its proxies fastest first and indexed by protocol, country and anonymity.
+
+    Each index lists the proxies of a value fastest first, a proxy under every protocol it has. A
+    query takes the shortest list of its filters and keeps the proxies matching the other filters.
+    """
+
+    def __init__(
+        self,
+        order: list[dict[str, Any]] | None = None,
+        indexes: dict[str, dict[str, list[dict[str, Any]]]] | None = None,
+    ) -> None:
+        self.order = order or []
+        self.indexes = indexes or {field: {} for field in INDEXED_FIELDS}
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def query(self, protocol: str = "", country: str = "", anonymity: str = "") -> list[dict[str, Any]]:
+        """Return the proxies matching all non-empty filters, fastest first."""
+        filters = {"protocol": protocol.lower(), "country": country.upper(), "anonymity": anonymity.lower()}
+        filters = {field: value for field, value in filters.items() if value}
+        if not filters:
+            return self.order
+        field = min(filters, key=lambda f: len(self.indexes[f].get(filters[f], ())))
+        proxies = self.indexes[field].get(filters.pop(field), [])
+        if not filters:
+            return proxies
+        protocol = filters.pop("protocol", "")
+        return [
+            proxy
+            for proxy in proxies
+            if (not protocol or protocol in proxy["protocols"])
+            and all(proxy[field] == value for field, value in filters.items())
+        ]
+
+
+class ItemsReader:
+    """Reads the scrapyd job items files (JSON lines) incrementally, only the lines added since the last read."""
+
+    def __init__(self, items_dir: str) -> None:
+        self.items_dir = Path(items_dir)
+        self.offsets: dict[Path, int] = {}
+
+    def read(self) -> list[tuple[dict[str, Any], float]]:
+        """Return the new `(item, seen)` of every items file, seen being the file's modification time."""
+        items = []
+        for path in self.items_dir.glob("*/*/*.jl"):
+            try:
+                stat = path.stat()
+                if stat.st_size <= self.offsets.get(path, 0):
+                    continue
+                with open(path, "rb") as f:
+                    f.seek(self.offsets.get(path, 0))
+                    data = f.read(stat.st_size - self.offsets.get(path, 0))
+            except OSError:
+                continue
+            complete = data.rfind(b"\n") + 1  # a running job may be writing the last line
+            self.offsets[path] = self.offsets.get(path, 0) + complete
+            for line in data[:complete].splitlines():
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(item, dict) and item.get("ip") and isinstance(item.get("port"), int):
+                    items.append((item, stat.st_mtime))
+        self.offsets = {path: offset for path, offset in self.offsets.items() if path.exists()}
+        return items
+
+
+class ProxyPool(WsResource):  # type: ignore[misc]
+    """`/proxies.json` - filtered proxies from the job items, served from snapshots of a `ProxyIndex`.
+
+    Query arguments: protocol, country, anonymity, limit (1 to `MAX_LIMIT`, default 100), offset, random (sample
+    instead of the fastest first) and format=text for plain `ip:port` lines. The items files are
+    read on a thread every `poll_interval`, only what was added since the last read, and proxies
+    not seen for `proxies_max_age` seconds are dropped from the pool.
+    """
+
+    def __init__(self, root: Any) -> None:
+        super().__init__(root)
+        config = Config()
+        items_dir = config.get("items_dir", "")
+        self.reader = ItemsReader(items_dir) if items_dir and "://" not in items_dir else None
+        self.max_age = config.getint("proxies_max_age", 24 * 60 * 60)
+        self.index = ProxyIndex()  # only used on the refresh thread
+        self.pool = PoolSnapshot()
+        self.refresher = LoopingCall(self.refresh)
+        self.refresher.start(config.getfloat("poll_interval", 5), now=True)
+
+    @inlineCallbacks
+    def refresh(self) -> Any:
+        if self.reader is None:
+            return
+        try:  # an error would stop the refresher
+            snapshot = yield deferToThread(self.update)  # type: ignore[no-untyped-call]
+            if snapshot is not None:
+                self.pool = snapshot
+        except Exception:
+            logger.failure("Failed to refresh the proxy pool")
+
+    def update(self) -> PoolSnapshot | None:
+        """Add the new items to the index, return a new snapshot if the pool changed."""
+        items = self.reader.read() if self.reader is not None else []
+        for item, seen in items:
+            self.index.add(item, seen)
+        pruned = self.index.prune(time.time() - self.max_age)
+        return self.index.snapshot() if items or pruned else None
+
+    def render_GET(self, txrequest: Any) -> dict[str, Any] | str:  # noqa: N802
+        args = {key.decode(): values[0].decode() for key, values in txrequest.args.items()}
+        try:
+            limit = min(max(int(args.get("limit", 100)), 1), MAX_LIMIT)
+            offset = max(int(args.get("offset", 0)), 0)
+        except ValueError:
+            txrequest.setResponseCode(400)
+            message = f"limit and offset must be integers, got {args.get('limit')!r} and {args.get('offset')!r}"
+            return {"node_name": self.root.nodename, "status": "error", "message": message}
+        pool = self.pool
+        proxies = pool.query(args.get("protocol", ""), args.get("country", ""), args.get("anonymity", ""))
+        if args.get("random", "").lower() in ("1", "true", "yes"):
+            page = random.sample(proxies, min(limit, len(proxies)))
+        else:
+            page = proxies[offset : offset + limit]
+
+        if args.get("format") == "text":
+            return "".join(f"{p['ip']}:{p['port']}\n" for p in page)
+        page = [{field: p[field] for field in FIELDS} for p in page]
+        return {"node_name": self.root.nodename, "status": "ok", "total": len(proxies), "proxies": page}
+
+    def render_object(self, obj: Any, txrequest: Any) -> str:
+        if not isinstance(obj, str):
+            return super().render_object(obj, txrequest)  # type: ignore[no-any-return]
+        return render_text(obj, txrequest)
+
+
+class PrometheusMetrics(Resource):
+    """`/metrics` - the crawl metrics of all jobs in the Prometheus text format, see `scraper.metrics`.
+
+    Reads the totals of the finished jobs and the files of the running ones in `metrics_dir`, which
+    the crawls write to as their `METRICS_DIR`. Files of jobs not updated for `metrics_stale_after`
+    seconds are added to the totals. The files are read on a thread, as it waits for the lock of the
+    totals while jobs are closing.
+    """
+
+    isLeaf = True  # noqa: N815
+
+    def __init__(self, root: Any) -> None:
+        super().__init__()  # type: ignore[no-untyped-call]
+        self.root = root
+        config = Config()
+        self.directory = config.get("metrics_dir", "")
+        self.stale_after = config.getfloat("metrics_stale_after", 300)
+
+    def render_GET(self, txrequest: Any) -> bytes | int:  # noqa: N802
+        if not self.directory:
+            return render_text("", txrequest, PROMETHEUS_TYPE).encode()
+        closed: list[Any] = []  # the client went away before the metrics were read
+        txrequest.notifyFinish().addErrback(closed.append)
+        d = deferToThread(self.render_metrics)  # type: ignore[no-untyped-call]
+        d.addCallbacks(self.send, self.failed, callbackArgs=(txrequest, closed), errbackArgs=(txrequest, closed))
+        return NOT_DONE_YET
+
+    def render_metrics(self) -> str:
+        return to_prometheus(collect(self.directory, self.stale_after))
+
+    def send(self, text: str, txrequest: Any, closed: list[Any]) -> None:
+        if not closed:
+            txrequest.write(render_text(text, txrequest, PROMETHEUS_TYPE).encode())
+            txrequest.finish()
+
+    def failed(self, failure: Any, txrequest: Any, closed: list[Any]) -> None:
+        logger.failure("Failed to read the metrics", failure)
+        if not closed:
+            txrequest.setResponseCode(500)
+            txrequest.write(render_text(f"{failure.getErrorMessage()}\n", txrequest).encode())
+            txrequest.finish()
+
+
+class Subscriber:
+    """A client of `/live`, the push producer of its response: events wait while the client is slow.
+
+    Up to `size` events wait, the oldest is dropped when another arrives, and the client is sent
+    the number dropped (a `dropped` event) before the events that are left.
+    """
+
+    def __init__(self, txrequest: Any, size: int, protocol: str = "", country: str = "", anonymity: str = "") -> None:
+        self.txrequest = txrequest
+        self.protocol, self.country, self.anonymity = protocol.lower(), country.upper(), anonymity.lower()
+        self.events: deque[bytes] = deque(maxlen=size)
+        self.dropped = 0
+        self.paused = False
+
+    def matches(self, proxy: dict[str, Any]) -> bool:
+        """Return whether `proxy` matches the non-empty filters, as `PoolSnapshot.query` does."""
+        if self.protocol and self.protocol not in {proxy.get("protocol"), *(proxy.get("protocols") or ())}:
+            return False
+        if self.country and self.country != (proxy.get("country") or "").upper():
+            return False
+        return not self.anonymity or self.anonymity == (proxy.get("anonymity") or "").lower()
+
+    def send(self, event: bytes) -> None:
+        if len(self.events) == self.events.maxlen:
+            self.dropped += 1
+        self.events.append(event)
+        self.flush()
+
+    def flush(self) -> None:
+        if self.dropped and not self.paused:
+            self.txrequest.write(b"event: dropped\ndata: %d\n\n" % self.dropped)
+            self.dropped = 0
+        while self.events and not self.paused:  # a write may pause the producer
+            self.txrequest.write(self.events.popleft())
+
+    def pauseProducing(self) -> None:  # noqa: N802
+        self.paused = True
+
+    def resumeProducing(self) -> None:  # noqa: N802
+        self.paused = False
+        self.flush()
+
+    def stopProducing(self) -> None:  # noqa: N802
+        self.paused = True
+        self.events.clear()
+
+
+class FeedReceiver(DatagramProtocol):
+    """Receives the proxies the crawls' `LiveFeedExtension` send, one JSON object per datagram."""
+
+    def __init__(self, feed: "LiveFeed") -> None:
+        self.feed = feed
+
+    def datagramReceived(self, datagram: bytes, addr: Any) -> None:  # noqa: N802
+        try:
+            proxy = json.loads(datagram)
+        except ValueError:
+            return
+        if isinstance(proxy, dict) and proxy.get("ip") and b"\n" not in datagram:
+            self.feed.publish(proxy, datagram)
+
+
+class LiveFeed(Resource):
+    """`/live` - a Server-Sent Events stream of the proxies of the running jobs, as they pass the pipelines.
+
+    Query arguments: protocol, country and anonymity, as for `/proxies.json`. Every proxy is a
+    `proxy` event of its JSON; events are only sent to a client as fast as it reads them, at most
+    `live_feed_buffer` wait for a slow client (the oldest are dropped), so a subscriber never holds
+    up scrapyd or the crawls. The crawls send the proxies to `live_feed_port` on the loopback
+    interface, see `LiveFeedExtension`.
+    """
+
+    isLeaf = True  # noqa: N815
+
+    def __init__(self, root: Any) -> None:
+        super().__init__()  # type: ignore[no-untyped-call]
+        self.root = root
+        config = Config()
+        self.buffer = config.getint("live_feed_buffer", 1000)
+        self.subscribers: set[Subscriber] = set()
+        if port := config.getint("live_feed_port", 0):
+            reactor.listenUDP(port, FeedReceiver(self), interface="127.0.0.1")  # type: ignore[attr-defined]
+        self.keepalive = LoopingCall(self.ping)  # idle connections are kept open by proxies in between
+        self.keepalive.start(15, now=False)
+
+    def render_GET(self, txrequest: Any) -> int:  # noqa: N802
+        args = {key.decode(): values[0].decode() for key, values in txrequest.args.items()}
+        filters = {name: args.get(name, "") for name in ("protocol", "country", "anonymity")}
+        subscriber = Subscriber(txrequest, self.buffer, **filters)
+        txrequest.setHeader("Content-Type", "text/event-stream; charset=utf-8")
+        txrequest.setHeader("Cache-Control", "no-cache")
+        txrequest.setHeader("X-Accel-Buffering", "no")
+        txrequest.registerProducer(subscriber, True)
+        txrequest.write(b": connected\n\n")  # sends the headers
+        self.subscribers.add(subscriber)
+        txrequest.notifyFinish().addBoth(self.unsubscribe, subscriber)
+        return NOT_DONE_YET
+
+    def unsubscribe(self, result: Any, subscriber: Subscriber) -> None:
+        self.subscribers.discard(subscriber)
+
+    def publish(self, proxy: dict[str, Any], data: bytes) -> None:
+        """Send `proxy` (and its JSON `data`) to the subscribers it matches."""
+        event = b"event: proxy\ndata: %s\n\n" % data.strip()
+        for subscriber in list(self.subscribers):  # a write may end a request
+            if subscriber.matches(proxy):
+                subscriber.send(event)
+
+    def ping(self) -> None:
+        for subscriber in list(self.subscribers):
+            if not subscriber.paused:
+                subscriber.txrequest.write(b": ping\n\n")
+
+
+def render_text(text: str, txrequest: Any, content_type: str = "text/plain; charset=utf-8") -> str:
+    txrequest.setHeader("Content-Type", content_type)
+    txrequest.setHeader("Content-Length", str(len(text.encode())))
+    return text